@@ -0,0 +1,98 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+BATCHING_DEFAULTS = {
+    "enabled": True,
+    "max_batch_size": 4,  # Prompts generated together in one padded batch
+    "max_wait_ms": 20,  # How long the first prompt of a batch waits for others to join
+}
+
+
+@dataclass
+class GenerationRequest:
+    prompt: Any
+    max_new_tokens: int
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class BatchScheduler:
+    """Collects concurrent generation requests into batches for one padded ``generate`` call.
+
+    A batch closes when ``max_batch_size`` prompts are waiting or ``max_wait_ms`` after its first
+    prompt arrived. ``generate_batch(prompts, max_new_tokens)`` runs on the scheduler thread and
+    returns one completion per prompt, each cut to its own ``max_new_tokens``.
+    """
+
+    def __init__(self, generate_batch: Callable[[List[str], List[int]], List[str]], max_batch_size: int = 4, max_wait_ms: float = 20):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self._requests: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.total_wait_s = 0.0
+        self.max_wait_seen_s = 0.0
+        self._thread = threading.Thread(target=self._loop, name="generation-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: Any, max_new_tokens: int) -> Future:
+        request = GenerationRequest(prompt, max_new_tokens)
+        self._requests.put(request)
+        return request.future
+
+    def generate(self, prompt: Any, max_new_tokens: int) -> str:
+        """Blocking; returns the completion (without the prompt)."""
+        return self.submit(prompt, max_new_tokens).result()
+
+    def _collect(self) -> List[GenerationRequest]:
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+                for request in batch:
+                    wait_s = started - request.enqueued_at
+                    self.total_wait_s += wait_s
+                    self.max_wait_seen_s = max(self.max_wait_seen_s, wait_s)
+            try:
+                outputs = self.generate_batch([r.prompt for r in batch], [r.max_new_tokens for r in batch])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, output in zip(batch, outputs):
+                request.future.set_result(output)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "avgBatchSize": self.requests / self.batches if self.batches else 0.0,
+                "batchSizes": dict(self.batch_sizes),
+                "avgQueueWaitMs": 1000 * self.total_wait_s / self.requests if self.requests else 0.0,
+                "maxQueueWaitMs": 1000 * self.max_wait_seen_s,
+                "queued": self._requests.qsize(),
+            }
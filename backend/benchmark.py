@@ -0,0 +1,232 @@
+"""Stage-level benchmark of the check-order pipeline.
+
+Run from backend/:
+
+    python benchmark.py --sizes 10,1000,100000 --output bench.json [--api]
+
+Every history size runs in its own process (so peak RSS is per size), in a scratch directory
+with a synthetic spend history, against the test-mode generator (the deterministic stub, or
+the tiny model with --backend tiny). The output JSON records the commit it ran on, so results
+can be compared across commits.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import yaml
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_CONFIG = os.path.join(os.path.dirname(BACKEND_DIR), "rag-solution", "config.yaml")
+SYNTHETIC_ITEMS = [
+    ("Milk", "Grocery", True, 3.50), ("Eggs", "Grocery", True, 2.99), ("Bread", "Grocery", True, 2.50),
+    ("Apples", "Grocery", True, 3.80), ("Rice", "Grocery", True, 8.99), ("T-Shirt", "Clothing", False, 19.99),
+    ("Jeans", "Clothing", False, 49.99), ("Sneakers", "Clothing", False, 89.00), ("Headphones", "Electronics", False, 120.00),
+    ("USB Cable", "Electronics", False, 9.99), ("Laptop", "Electronics", False, 999.99), ("Movie Ticket", "Entertainment", False, 15.00),
+    ("Concert Ticket", "Entertainment", False, 75.00), ("Video Game", "Entertainment", False, 59.99), ("Toothpaste", "Personal Care", True, 4.25),
+    ("Shampoo", "Personal Care", True, 7.49), ("Coffee", "Beverage", True, 4.50), ("Orange Juice", "Beverage", True, 3.99),
+]
+ORDERS = [
+    [{"name": "Wireless Mouse", "price": 25.99, "quantity": 1}, {"name": "Mechanical Keyboard", "price": 79.50, "quantity": 1}],
+    [{"name": "Running Shoes", "price": 95.00, "quantity": 1}],
+    [{"name": "Oat Milk", "price": 4.20, "quantity": 2}, {"name": "Chocolate", "price": 3.10, "quantity": 3}, {"name": "Sparkling Water", "price": 1.20, "quantity": 6}],
+]
+MONTHLY_LIMIT = 1000.0
+
+
+def write_history(path: str, size: int, seed: int = 0):
+    """Writes ``size`` spend records in the txt folder's line format."""
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        for i in range(1, size + 1):
+            name, category, essential, price = rng.choice(SYNTHETIC_ITEMS)
+            bought_on = (start + datetime.timedelta(minutes=rng.randrange(60 * 24 * 480))).strftime("%Y-%m-%d %I:%M%p")
+            f.write(f"{i}. {name} - {'Essential' if essential else 'Non-Essential'} - ${price:.2f} x{rng.randint(1, 4)} "
+                    f"- Bought on {bought_on} - Category: {category}\n")
+
+
+def make_config(workdir: str, backend: str) -> str:
+    """The repo config in test mode, with storage and caches kept inside ``workdir``."""
+    with open(REPO_CONFIG, "r") as f:
+        config = yaml.safe_load(f) or {}
+    config["test_mode"] = True
+    config.setdefault("llm", {})["test_backend"] = backend
+    config["storage"] = {**(config.get("storage") or {}), "backend": "sqlite", "sqlite_file": os.path.join(workdir, "spending.db")}
+    # Measure the LLM path every call: no cached answers, and no rules stage (it decides on the stored budget, not the request's)
+    config["check_order_cache"] = {**(config.get("check_order_cache") or {}), "enabled": False}
+    config["check_order_rules"] = {**(config.get("check_order_rules") or {}), "enabled": False}
+    config["model_server"] = {**(config.get("model_server") or {}), "url": None, "socket": None}
+    config_file = os.path.join(workdir, "config.yaml")
+    with open(config_file, "w") as f:
+        yaml.safe_dump(config, f)
+    return config_file
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {"mean": sum(values) / len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "max": max(values)}
+
+
+def order_request(order: List[Dict[str, Any]]) -> Dict[str, Any]:
+    amount = round(sum(item["price"] * item["quantity"] for item in order), 2)
+    # The API checks orders against its stored budget; currentSpending only feeds bench_prompt_llm's context
+    return {"orderAmount": amount, "currentSpending": 0.85 * MONTHLY_LIMIT - amount,
+            "monthlyLimit": MONTHLY_LIMIT, "itemsInOrder": order}
+
+
+def bench_prompt_llm(llm, runs: int) -> Dict[str, Any]:
+    totals, stages, prompt_tokens = [], {}, []
+    for call in range(runs * len(ORDERS)):
+        request = order_request(ORDERS[call % len(ORDERS)])
+        context = f"Montly spend limit is: {MONTHLY_LIMIT}, spending so far this month is: {request['currentSpending']:.2f}"
+        started = time.perf_counter()
+        llm.prompt_llm(incoming_order=request["itemsInOrder"], additional_context=context)
+        totals.append(1000 * (time.perf_counter() - started))
+        for stage, seconds in llm.last_timings.items():
+            stages.setdefault(stage, []).append(1000 * seconds)
+        prompt_tokens.append(llm.count_tokens(llm.last_prompt))
+    return {
+        "calls": len(totals),
+        "totalMs": summarize(totals),
+        "stagesMs": {stage: summarize(values) for stage, values in stages.items()},
+        "promptTokens": summarize(prompt_tokens),
+    }
+
+
+def bench_api(llm, runs: int) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+    import fastAPI.main as api
+
+    api.model_loader.model, api.model_loader.state = llm, "ready"
+    api.store.set_limit(MONTHLY_LIMIT)
+    client = TestClient(api.app)
+    check_order, stream_total, stream_first_token = [], [], []
+    calls = runs * len(ORDERS)
+    for call in range(calls):
+        request = order_request(ORDERS[call % len(ORDERS)])
+        started = time.perf_counter()
+        client.post("/spending/check-order", json=request).raise_for_status()
+        check_order.append(1000 * (time.perf_counter() - started))
+        started, first_token = time.perf_counter(), None
+        with client.stream("POST", "/spending/check-order/stream", json=request) as response:
+            for line in response.iter_lines():
+                if first_token is None and line.startswith("event:"):
+                    first_token = 1000 * (time.perf_counter() - started)
+        stream_total.append(1000 * (time.perf_counter() - started))
+        stream_first_token.append(first_token or stream_total[-1])
+    # Every timed call must have been answered by the LLM (blocking and streamed), or the numbers measure something else
+    answered_by = client.get("/spending/check-order/stats").json()["answeredBy"]
+    if answered_by != {"llm": 2 * calls}:
+        raise RuntimeError(f"Expected all {2 * calls} check-orders to reach the LLM, got {answered_by}")
+    started = time.perf_counter()
+    client.get("/spending/monthly?summary=true").raise_for_status()
+    return {
+        "answeredBy": answered_by,
+        "checkOrderMs": summarize(check_order),
+        "streamTotalMs": summarize(stream_total),
+        "streamFirstEventMs": summarize(stream_first_token),
+        "monthlySummaryMs": 1000 * (time.perf_counter() - started),
+    }
+
+
+def run_worker(size: int, runs: int, backend: str, api: bool) -> Dict[str, Any]:
+    """Benchmarks one history size in this process (called in a fresh subprocess per size)."""
+    workdir = tempfile.mkdtemp(prefix="spend-bench-")
+    try:
+        write_history(os.path.join(workdir, "spend-folder-txt", "history.txt"), size)
+        shutil.copytree(os.path.join(BACKEND_DIR, "spend-folder-json"), os.path.join(workdir, "spend-folder-json"))  # Categorizer labels
+        os.environ["SPENDING_CONFIG_FILE"] = make_config(workdir, backend)
+        os.environ["SPEND_DATA_DIR"] = os.path.join(workdir, "data")
+        os.chdir(workdir)
+        sys.path.insert(0, BACKEND_DIR)
+        from fastAPI import models
+        # SQLite storage seeds itself from the JSON data file (and may reset it); use a scratch one, not the repo's
+        models.DATA_DIR = os.path.join(workdir, "data")
+        models.DATA_FILE = os.path.join(models.DATA_DIR, "spending_data.json")
+        from fastAPI.config import load_config
+        from fastAPI.model_loader import memory_usage_mb
+        from retrieve_context import LLMPrompt
+
+        started = time.perf_counter()
+        llm = LLMPrompt(
+            spend_sources=[os.path.join(workdir, "spend-folder-txt"), os.path.join(workdir, "spend-folder-json")],
+            config=load_config()
+        )
+        result = {
+            "historyRecords": size,
+            "indexedRecords": len(llm.spend_index),
+            "loadMs": {"total": 1000 * (time.perf_counter() - started), **{stage: 1000 * s for stage, s in llm.load_timings.items()}},
+            "promptLlm": bench_prompt_llm(llm, runs),
+        }
+        if api:
+            result["api"] = bench_api(llm, runs)
+        result["peakRssMb"] = memory_usage_mb()["peakRssMb"]
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-level benchmark of the check-order pipeline.")
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000", help="Comma-separated history sizes")
+    parser.add_argument("--runs", type=int, default=3, help="Passes over the sample orders per size")
+    parser.add_argument("--backend", choices=["stub", "tiny"], default="stub", help="Test-mode generator")
+    parser.add_argument("--api", action="store_true", help="Also time the FastAPI check-order endpoints")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--worker-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_size is not None:
+        result = run_worker(args.worker_size, args.runs, args.backend, args.api)
+        print("BENCHMARK_RESULT " + json.dumps(result))
+        return
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        command = [sys.executable, os.path.abspath(__file__), "--worker-size", str(size), "--runs", str(args.runs), "--backend", args.backend]
+        if args.api:
+            command.append("--api")
+        output = subprocess.run(command, capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines() if line.startswith("BENCHMARK_RESULT ")]
+        if output.returncode != 0 or not lines:
+            print(f"History size {size} failed:\n{output.stderr[-2000:]}")
+            results.append({"historyRecords": size, "error": output.stderr[-2000:]})
+            continue
+        result = json.loads(lines[-1][len("BENCHMARK_RESULT "):])
+        print(f"{size} records: prompt_llm p50 {result['promptLlm']['totalMs']['p50']:.1f} ms, "
+              f"{result['promptLlm']['promptTokens']['mean']:.0f} prompt tokens, peak RSS {result['peakRssMb']:.0f} MB")
+        results.append(result)
+    report = {
+        "commit": git_commit(),
+        "createdAt": datetime.datetime.now().isoformat(timespec="seconds"),
+        "backend": args.backend,
+        "runs": args.runs,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+CATEGORIZER_DEFAULTS = {
+    "enabled": True,
+    "confidence_threshold": 0.45,  # Cosine similarity below which the LLM categorizes the order instead
+    "labeled_sources": ["spend-folder-json"],  # Labeled purchases the category prototypes are built from
+}
+
+
+def unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class ItemCategorizer:
+    """Assigns item names to categories by cosine similarity to per-category prototype vectors.
+
+    A category's prototype is the mean embedding of its name and of every labeled item name
+    in it. Results are memoized per normalized item name.
+    """
+
+    def __init__(self, categories: List[str], labeled_items: Iterable[Tuple[str, str]],
+                 encode_fn: Callable[[List[str]], np.ndarray], confidence_threshold: float = 0.45):
+        self.categories = list(categories)
+        self.encode_fn = encode_fn
+        self.confidence_threshold = confidence_threshold
+        self.memo: Dict[str, Tuple[str, float]] = {}
+        examples = defaultdict(list)
+        for category in self.categories:
+            examples[category].append(category)
+        for name, category in labeled_items:
+            if category in examples:
+                examples[category].append(name)
+        prototypes = [unit_rows(self.encode_fn(examples[category])).mean(axis=0) for category in self.categories]
+        self.prototypes = unit_rows(np.stack(prototypes))
+
+    def classify(self, names: List[str]) -> List[Tuple[str, float]]:
+        """Returns (best category, cosine similarity) per name, embedding all unseen names in one batch."""
+        keys = [normalize_text(name) for name in names]
+        unseen = [key for key in dict.fromkeys(keys) if key not in self.memo]
+        if unseen:
+            scores = unit_rows(self.encode_fn(unseen)) @ self.prototypes.T
+            for key, row in zip(unseen, scores):
+                best = int(np.argmax(row))
+                self.memo[key] = (self.categories[best], float(row[best]))
+        return [self.memo[key] for key in keys]
+
+    def categorize(self, names: List[str]) -> Optional[List[str]]:
+        """Categories for all names, or None if any of them is below the confidence threshold."""
+        results = self.classify(names)
+        if any(score < self.confidence_threshold for _, score in results):
+            return None
+        return [category for category, _ in results]
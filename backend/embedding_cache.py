@@ -0,0 +1,133 @@
+import hashlib
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+KEY_LINE = re.compile(rb"[0-9a-f]{64}\n")  # A complete keys.txt line: a sha256 hex digest
+
+
+def normalize_text(text: str) -> str:
+    # The MiniLM embedders are uncased, so case and spacing never change the vector
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """Content-hash -> vector cache in an append-only, memory-mapped float32 file.
+
+    ``vectors.f32`` holds one ``dim``-float row per cached text. ``keys.txt`` lists the hash
+    of each row in order, so a key's line number is its row offset. Rows are appended and
+    fsync'd before their keys, so a crash can leave trailing rows without keys or a torn last
+    key line; on load both files are cut back to the last row that has a complete key.
+    """
+
+    def __init__(self, cache_dir: str, dim: int, encode_fn: Callable[[List[str]], np.ndarray], batch_size: int = 64):
+        self.cache_dir = cache_dir
+        self.dim = dim
+        self.encode_fn = encode_fn
+        self.batch_size = batch_size
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.keys_path = os.path.join(cache_dir, "keys.txt")
+        self.offsets: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * 4
+
+    def _read_keys(self) -> List[bytes]:
+        """Returns the complete key lines of ``keys.txt`` (newline included), up to the first torn or invalid one."""
+        try:
+            with open(self.keys_path, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        keys = []
+        for line in lines:
+            if not KEY_LINE.fullmatch(line):
+                break
+            keys.append(line)
+        return keys
+
+    def _load(self):
+        key_lines = self._read_keys()
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        rows = min(len(key_lines), vectors_size // self.row_bytes)
+        key_lines = key_lines[:rows]
+        # Cut both files back to the complete rows, so appends stay aligned with their keys
+        if self._truncate(sum(len(line) for line in key_lines), rows * self.row_bytes):
+            print(f"Embedding cache: dropped entries after row {rows} left by an interrupted write.")
+        self.offsets = {line.decode("ascii").strip(): row for row, line in enumerate(key_lines)}
+        self._map(rows)
+
+    def _truncate(self, keys_size: int, vectors_size: int) -> bool:
+        """Cuts the key and vector files to the given sizes. Returns True if either was longer."""
+        truncated = False
+        for path, size in ((self.keys_path, keys_size), (self.vectors_path, vectors_size)):
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+                truncated = True
+        return truncated
+
+    def _map(self, rows: int):
+        self._vectors = np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(rows, self.dim)) if rows else None
+
+    @staticmethod
+    def _append_file(path: str, data: bytes):
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _append(self, keys: List[str], vectors: np.ndarray):
+        rows = len(self.offsets)
+        keys_size = os.path.getsize(self.keys_path) if os.path.exists(self.keys_path) else 0
+        try:
+            # Rows first, then their keys, each fsync'd: a key is never on disk before its row
+            self._append_file(self.vectors_path, np.ascontiguousarray(vectors, dtype="float32").tobytes())
+            self._append_file(self.keys_path, "".join(f"{key}\n" for key in keys).encode("ascii"))
+        except BaseException:
+            # A partial write would shift every later row against its key
+            self._truncate(keys_size, rows * self.row_bytes)
+            raise
+        for row, key in enumerate(keys, rows):
+            self.offsets[key] = row
+        self._map(len(self.offsets))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Returns an (n, dim) float32 array; only texts not seen before are encoded, in batches."""
+        normalized = [normalize_text(text) for text in texts]
+        keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in normalized]
+        with self._lock:
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, normalized):
+                if key not in self.offsets and key not in missing:
+                    missing[key] = text
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+            missing_keys = list(missing)
+            for start in range(0, len(missing_keys), self.batch_size):
+                batch = missing_keys[start:start + self.batch_size]
+                self._append(batch, self.encode_fn([missing[key] for key in batch]))
+            if not keys:
+                return np.zeros((0, self.dim), dtype="float32")
+            return np.array(self._vectors[[self.offsets[key] for key in keys]])
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.offsets),
+        }
+
+    def __len__(self) -> int:
+        return len(self.offsets)
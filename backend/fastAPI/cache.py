@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+
+# --- Constants ---
+CACHE_DEFAULTS = {
+    "enabled": True,
+    "max_entries": 256,  # In-memory LRU size
+    "ttl_s": 900,  # Entries older than this are treated as misses
+    "spending_bucket": 25.0,  # Spending within the same bucket of this many dollars shares cache entries
+    "disk_dir": None,  # Directory for the optional on-disk tier (survives restarts); null disables it
+}
+
+
+def make_key(items: List[Dict[str, Any]], order_amount: float, current_spending: float, monthly_limit: float, spending_bucket: float) -> str:
+    """Returns a canonical hash of an order and the budget state it is checked against.
+
+    Items are normalized (name case/whitespace, price to cents, quantity) and sorted, so the
+    same cart hashes the same regardless of item order.
+    """
+    normalized_items = sorted(
+        (
+            " ".join(str(item.get("name", "")).lower().split()),
+            round(float(item.get("price") or 0), 2),
+            int(item.get("quantity") or 1),
+        )
+        for item in items
+    )
+    key_data = {
+        "items": normalized_items,
+        "amount": round(order_amount, 2),
+        "spending_bucket": math.floor(current_spending / spending_bucket) if spending_bucket > 0 else round(current_spending, 2),
+        "limit": round(monthly_limit, 2),
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of check-order responses with an optional on-disk tier.
+
+    Memory misses fall through to the disk tier (one JSON file per key), and disk hits are
+    promoted back into memory.
+
+    Every ``clear()`` starts a new generation. A response computed against the budget before a
+    clear is put with the generation read before that budget, and dropped.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_s: float = 900, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created_at, value)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[tuple]:
+        try:
+            with open(self._disk_path(key), "r") as f:
+                entry = json.load(f)
+            return entry["created_at"], entry["value"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    def _write_disk(self, key: str, created_at: float, value: Any):
+        tmp_path = f"{self._disk_path(key)}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"created_at": created_at, "value": value}, f)
+            os.replace(tmp_path, self._disk_path(key))
+        except IOError as e:
+            print(f"Warning: Could not write check-order cache entry: {e}")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_s:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            generation = self._generation
+        if self.disk_dir:
+            entry = self._read_disk(key)
+            if entry is not None and now - entry[0] <= self.ttl_s:
+                with self._lock:
+                    if generation != self._generation:  # Cleared while reading; the entry may be stale
+                        self.misses += 1
+                        return None
+                    self._store(key, entry)
+                    self.disk_hits += 1
+                return entry[1]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def generation(self) -> int:
+        """Read it before the budget a response is computed against, and pass it to ``put``."""
+        return self._generation
+
+    def put(self, key: str, value: Any, generation: Optional[int] = None):
+        """Stores a response; one computed before the latest ``clear()`` (an older ``generation``) is dropped."""
+        entry = (time.time(), value)
+        # The disk write holds the lock too, so a clear can't remove the files between the check and the write
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._store(key, entry)
+            if self.disk_dir:
+                self._write_disk(key, *entry)
+
+    def clear(self):
+        """Drops every entry from both tiers (called whenever spending or the limit changes). Blocking file I/O."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            if self.disk_dir:
+                for file_name in os.listdir(self.disk_dir):
+                    if file_name.endswith(".json"):
+                        try:
+                            os.remove(os.path.join(self.disk_dir, file_name))
+                        except FileNotFoundError:
+                            pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,29 @@
+from typing import Any, Dict, Optional
+import os
+
+import yaml
+
+# --- Constants ---
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONFIG_FILE = os.environ.get("SPENDING_CONFIG_FILE", os.path.join(REPO_ROOT, "rag-solution", "config.yaml"))
+
+_config: Optional[Dict[str, Any]] = None
+
+# --- Config Loading ---
+
+def load_config() -> Dict[str, Any]:
+    """Loads (once) and returns the shared YAML config. Missing or empty files yield an empty config."""
+    global _config
+    if _config is None:
+        try:
+            with open(CONFIG_FILE, "r") as f:
+                _config = yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            print(f"Config file '{CONFIG_FILE}' not found. Using defaults.")
+            _config = {}
+    return _config
+
+def get_section(name: str, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns a config section merged over its defaults."""
+    section = load_config().get(name) or {}
+    return {**defaults, **section}
@@ -0,0 +1,156 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+import asyncio
+import threading
+import time
+import uuid
+
+# --- Constants ---
+INFERENCE_DEFAULTS = {
+    "max_workers": 4,  # Concurrent jobs; generation runs on the batch scheduler's thread, so this fills its batches
+    "max_queue": 8,  # Jobs queued or running before new submissions are rejected
+    "timeout_s": 120,  # How long the synchronous /spending/check-order waits for its job
+    "job_ttl_s": 600,  # How long finished jobs stay available for polling
+}
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue already holds ``max_queue`` jobs."""
+
+
+class InferenceTimeout(Exception):
+    """Raised when a job didn't finish in time. The job keeps running and can still be polled."""
+
+    def __init__(self, job: "InferenceJob"):
+        super().__init__(f"Inference job {job.id} did not finish in time.")
+        self.job = job
+
+
+@dataclass
+class _StreamError:
+    error: Exception
+
+
+@dataclass
+class InferenceJob:
+    id: str
+    status: str = "queued"  # queued -> running -> done | failed
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    future: Optional[Future] = None
+
+
+class InferenceWorker:
+    """Runs blocking LLM calls on a dedicated thread pool so the event loop stays responsive.
+
+    Every call becomes a job that can be polled by id. The number of queued plus running
+    jobs is bounded; beyond ``max_queue`` submissions fail fast with ``InferenceQueueFull``.
+    """
+
+    def __init__(self, max_workers: int = 1, max_queue: int = 8, job_ttl_s: float = 600):
+        self.max_queue = max_queue
+        self.job_ttl_s = job_ttl_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._jobs: Dict[str, InferenceJob] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _expire_jobs(self):
+        cutoff = time.time() - self.job_ttl_s
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _run(self, job: InferenceJob, func: Callable, args, kwargs):
+        job.status = "running"
+        try:
+            job.result = func(*args, **kwargs)
+            job.status = "done"
+            return job.result
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            raise
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+
+    def submit(self, func: Callable, *args, **kwargs) -> InferenceJob:
+        """Queues ``func(*args, **kwargs)`` and returns its job immediately."""
+        with self._lock:
+            self._expire_jobs()
+            if self._pending >= self.max_queue:
+                raise InferenceQueueFull(f"Inference queue is full ({self.max_queue} jobs).")
+            self._pending += 1
+            job = InferenceJob(id=uuid.uuid4().hex)
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def completed(self, result: Any) -> InferenceJob:
+        """Registers an already-finished job (for answers that didn't need inference) so it can be polled like any other."""
+        job = InferenceJob(id=uuid.uuid4().hex, status="done", result=result, finished_at=time.time())
+        job.future = Future()
+        job.future.set_result(result)
+        with self._lock:
+            self._expire_jobs()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[InferenceJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def wait(self, job: InferenceJob, timeout: Optional[float] = None) -> Any:
+        """Awaits a job's result, raising ``InferenceTimeout`` (without cancelling the job) after ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeout(job)
+
+    async def stream(self, func: Callable[..., Iterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """Runs a blocking generator function as a job and yields its items on the event loop.
+
+        If the consumer stops early (e.g. the client disconnected), the job stops pulling
+        items from the generator at the next item.
+        """
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        end = object()
+        stopped = threading.Event()
+
+        def produce():
+            try:
+                for item in func(*args, **kwargs):
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, item)
+            except Exception as e:
+                # Hand the error to the consumer ahead of the end marker; the job is marked failed after this returns
+                loop.call_soon_threadsafe(items.put_nowait, _StreamError(e))
+                raise
+            finally:
+                loop.call_soon_threadsafe(items.put_nowait, end)
+
+        self.submit(produce)
+        try:
+            while True:
+                item = await items.get()
+                if item is end:
+                    break
+                if isinstance(item, _StreamError):
+                    raise item.error
+                yield item
+        finally:
+            stopped.set()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
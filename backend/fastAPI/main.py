@@ -1,22 +1,127 @@
-from fastapi import FastAPI, HTTPException, Body, Depends
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Body, Depends, Query
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional, Tuple
 from contextlib import asynccontextmanager
+from collections import Counter
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import datetime
+import json
 import os
-#from retrieve_context import prompt_llm
-from retrieve_context import LLMPrompt
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import models and data handling functions
 from . import models
+from .cache import CACHE_DEFAULTS, ResponseCache, make_key
+from .config import get_section
+from .inference import INFERENCE_DEFAULTS, InferenceJob, InferenceQueueFull, InferenceTimeout, InferenceWorker
+from .model_client import MODEL_SERVER_DEFAULTS, ModelClient, server_configured
+from .model_loader import ModelLoader, load_local_model
+from .rules import RULES_DEFAULTS, evaluate as evaluate_rules
+from .storage import get_storage
+
+model_server_settings = get_section("model_server", MODEL_SERVER_DEFAULTS)
+
+def create_model(on_progress):
+    """Returns the LLM, or a client of the shared model server if one is configured (slow). Runs on a background thread."""
+    if not server_configured(model_server_settings):
+        return load_local_model(on_progress)
+    client = ModelClient(
+        url=model_server_settings["url"],
+        socket_path=model_server_settings["socket"],
+        timeout_s=model_server_settings["timeout_s"],
+        pool_size=model_server_settings["pool_size"]
+    )
+    client.wait_until_ready(on_progress, poll_s=model_server_settings["ready_poll_s"])
+    return client
+
+model_loader = ModelLoader(create_model) # Loaded in the background at startup, see lifespan()
+store = get_storage() # JSON (snapshot + write-ahead log) or SQLite, selected in rag-solution/config.yaml
+write_lock = asyncio.Lock() # Serializes read-modify-write sequences across concurrent requests
+inference_settings = get_section("inference", INFERENCE_DEFAULTS)
+inference_worker = InferenceWorker( # LLM calls run here so cheap endpoints stay responsive
+    max_workers=inference_settings["max_workers"],
+    max_queue=inference_settings["max_queue"],
+    job_ttl_s=inference_settings["job_ttl_s"]
+)
+rules_settings = get_section("check_order_rules", RULES_DEFAULTS)
+check_order_sources = Counter() # Which stage answered each check-order ('rules', 'cache' or 'llm')
+cache_settings = get_section("check_order_cache", CACHE_DEFAULTS)
+response_cache = ResponseCache( # Cleared by every write that changes spending or the limit
+    max_entries=cache_settings["max_entries"],
+    ttl_s=cache_settings["ttl_s"],
+    disk_dir=cache_settings["disk_dir"] and os.path.join(models.DATA_DIR, cache_settings["disk_dir"])
+)
+
+THINK_END_TAG = "</think>" # Closes the reasoning block DeepSeek-R1 models write before their advice
+purchase_sync = {"task": None, "pending": False, "full": True, "cursor": None} # cursor: storage position of the last sync
+model_warmup = {"task": None}
+
+def schedule_purchase_sync(full: bool = False):
+    """Brings the model's spend index in step with storage in the background (after purchases change).
+
+    Only purchases recorded since the last sync are sent, so a sync costs as much as the new
+    purchases. A ``full`` sync (the first one, and after a reset) sends every stored purchase so
+    removed ones leave the index. Calls made while a sync runs are coalesced into one more sync.
+    Before the model is ready this does nothing; a full sync runs once it finishes loading.
+    """
+    purchase_sync["full"] = purchase_sync["full"] or full
+    if not model_loader.ready:
+        return
+    purchase_sync["pending"] = True
+    if purchase_sync["task"] is None or purchase_sync["task"].done():
+        purchase_sync["task"] = asyncio.create_task(run_purchase_sync())
+
+async def run_purchase_sync():
+    while purchase_sync["pending"]:
+        purchase_sync["pending"] = False
+        full = purchase_sync["full"] or purchase_sync["cursor"] is None
+        purchase_sync["full"] = False
+        try:
+            purchases, cursor = await run_in_threadpool(store.iter_purchases, None if full else purchase_sync["cursor"])
+            if purchases or full:
+                await run_in_threadpool(model_loader.model.ingest_purchases, purchases, full)
+            purchase_sync["cursor"] = cursor
+        except Exception as e:
+            # The cursor stays put, so the next sync retries these purchases
+            purchase_sync["full"] = purchase_sync["full"] or full
+            print(f"Warning: Could not sync purchases into the spend index: {e}")
+
+async def load_model():
+    await asyncio.get_running_loop().run_in_executor(None, model_loader.load)
+    schedule_purchase_sync(full=True) # Includes purchases recorded while the model was loading
+
+async def cancel_task(task: Optional[asyncio.Task]):
+    """Cancels a background task and waits for it, logging (not raising) its failure."""
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        print(f"Warning: Background task failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the model up in the background so the server binds (and cheap endpoints answer) right away.
+    # The task is kept so it isn't garbage-collected mid-load and can be cancelled on shutdown
+    model_warmup["task"] = asyncio.create_task(load_model())
+    yield
+    await cancel_task(model_warmup["task"])
+    await cancel_task(purchase_sync["task"])
+    inference_worker.shutdown()
+    if isinstance(model_loader.model, ModelClient):
+        model_loader.model.close()
+    store.close()
 
-model = LLMPrompt()
 app = FastAPI(
     title="Monthly Spending Tracker API",
     description="API to track monthly spending, set limits, and check orders using JSON file storage.",
-    version="1.1.0" # Bump version
+    version="1.1.0", # Bump version
+    lifespan=lifespan
 )
 
 # --- CORS Middleware Configuration ---
@@ -36,38 +141,47 @@ app.add_middleware(
 
 # --- Helper Function for Month Rollover & Data Initialization ---
 
-def check_and_prepare_data() -> dict:
-    """Loads data, checks if the month has changed, resets if necessary, and ensures current month data exists."""
-    data = models.load_data()
+def current_period() -> Tuple[int, int]:
+    """Returns the current (year, month) for reads. Reads never write; a missing month reads as empty."""
     now = datetime.datetime.now()
-    current_month_str = str(now.month)
-
-    # Check if saved month is different from current month
-    if data.get("current_month") != now.month:
-        print(f"New month detected ({now.strftime('%B')}). Resetting monthly data if needed.")
-        data["current_month"] = now.month
-        # If data for the new month doesn't exist, create it
-        if current_month_str not in data["monthly_data"]:
-             data["monthly_data"][current_month_str] = {
-                 "current_spending": 0.00,
-                 "items_purchased": []
-             }
-        models.save_data(data) # Save the updated month and potentially new month structure
-
-    # Ensure current month data exists even if month didn't change (e.g., initial run)
-    elif current_month_str not in data["monthly_data"]:
-        print(f"Initializing data structure for current month ({now.strftime('%B')}).")
-        data["monthly_data"][current_month_str] = {
-            "current_spending": 0.00,
-            "items_purchased": []
-        }
-        models.save_data(data)
+    return now.year, now.month
+
+def check_and_prepare_data() -> Tuple[int, int]:
+    """Checks if the month has changed and ensures current month data exists. Returns (year, month).
 
-    return data # Return the potentially updated data
+    Writes the rollover, so it is only called from write paths (under the write lock).
+    """
+    now = datetime.datetime.now()
+    previous_month = store.current_month
+    if store.ensure_month(now.year, now.month):
+        if previous_month != now.month:
+            print(f"New month detected ({now.strftime('%B')}). Resetting monthly data if needed.")
+        else:
+            print(f"Initializing data structure for current month ({now.strftime('%B')}).")
+    return now.year, now.month
+
+async def run_write(func, *args):
+    """Runs a storage write under the write lock, in the threadpool so fsync (and the cache clear) don't block the event loop."""
+    async with write_lock:
+        return await run_in_threadpool(func, *args)
+
+async def run_read(func, *args):
+    """Runs storage reads in the threadpool, so SQLite queries don't block the event loop."""
+    return await run_in_threadpool(func, *args)
+
+def to_stored_items(items: List[models.RecordPurchaseItem]) -> List[dict]:
+    """Converts Pydantic purchase items to the dicts kept in storage."""
+    stored_items = []
+    for item in items:
+        stored_item = {"name": item.name, "price": item.price}
+        if item.category:
+            stored_item["category"] = item.category
+        stored_items.append(stored_item)
+    return stored_items
 
 
 # --- API Endpoints ---
-# No dependency needed now, check_and_prepare_data called in each endpoint
+# Reads use current_period(); writes call check_and_prepare_data() under the write lock
 
 
 
@@ -77,45 +191,277 @@ def check_and_prepare_data() -> dict:
     summary="Get Current Monthly Spending Data",
     tags=["Spending"]
 )
-async def get_monthly_spending():
-    """Retrieves the spending limit, current total spending, and itemized list for the current calendar month."""
-    data = check_and_prepare_data()
-    current_month_str = str(data["current_month"])
-    month_data = data["monthly_data"].get(current_month_str, {"current_spending": 0.0, "items_purchased": []})
+async def get_monthly_spending(summary: bool = Query(False, description="Return only totals, without the item list.")):
+    """Retrieves the spending limit, current total spending, and itemized list for the current calendar month.
 
-    return {
-        "limit": data["monthly_limit"],
-        "currentSpending": round(month_data["current_spending"], 2),
-        "items": month_data["items_purchased"]
-    }
+    With `summary=true` only the running totals (overall, per category and item count) are returned,
+    which costs the same regardless of how many items the month has.
+    """
+    def read():
+        current_year, current_month = current_period()
+        month_summary = store.get_summary(current_year, current_month)
+        response = {
+            "limit": store.monthly_limit,
+            "currentSpending": month_summary["spending_cents"] / 100,
+            "items": [],
+            "itemCount": month_summary["item_count"],
+            "categoryTotals": {category: cents / 100 for category, cents in month_summary["category_cents"].items()}
+        }
+        if not summary:
+            response["items"] = store.get_month(current_year, current_month)["items_purchased"]
+        return response
 
-@app.post(
-    "/spending/check-order",
-    response_model=models.CheckOrderResponse,
-    summary="Check Potential Order Spending",
+    return await run_read(read)
+
+@app.get(
+    "/spending/monthly/items",
+    response_model=models.MonthlyItemsResponse,
+    summary="Page Through Current Month's Purchased Items",
     tags=["Spending"]
 )
-async def check_order_spending(order_request: models.CheckOrderRequest = Body(...)):
-    """Checks if adding a specific amount would exceed the monthly spending limit."""
-    data = check_and_prepare_data()
-    current_month_str = str(data["current_month"])
-    month_data = data["monthly_data"].get(current_month_str, {"current_spending": 0.0, "items_purchased": []})
-    monthly_limit = data.get("monthly_limit", 5000)
-    items_purchased = month_data["items_purchased"]
-    additional_context = f"Montly spend limit is: {monthly_limit}, you have already purchased items under the key: <previous_spending_data>"
-    # potential_spending = month_data["current_spending"] + order_request.orderAmount
-    reponse_analysis = model.prompt_llm(incoming_order=items_purchased, additional_context=additional_context)
+async def get_monthly_items(
+    cursor: Optional[str] = Query(None, description="Cursor returned by the previous page."),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of items to return.")
+):
+    """Returns the current month's purchased items in pages, oldest first."""
+    current_year, current_month = current_period()
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    items, next_cursor = await run_read(store.get_items, current_year, current_month, cursor, limit)
+    return {"items": items, "nextCursor": next_cursor}
+
+# --- Check-Order Inference (runs on the inference worker, off the event loop) ---
+
+def require_model():
+    """Returns the loaded model, or raises 503 while it is still warming up (or failed to load)."""
+    if model_loader.ready:
+        return model_loader.model
+    if model_loader.state == "failed":
+        raise HTTPException(status_code=503, detail=f"Model failed to load: {model_loader.error}")
+    raise HTTPException(
+        status_code=503,
+        detail="Model is warming up, please retry shortly. See /readyz for progress.",
+        headers={"Retry-After": "10"}
+    )
+
+def analyze_order(incoming_order: list, additional_context: str, cache_key: Optional[str] = None, cache_generation: Optional[int] = None) -> dict:
+    """Runs the LLM analysis (blocking), caches it and converts it to a CheckOrderResponse dict."""
+    model = model_loader.model
+    return analysis_to_response(model.prompt_llm(incoming_order=incoming_order, additional_context=additional_context), cache_key, cache_generation)
+
+def strip_reasoning(answer: str) -> str:
+    """Returns the advice after the model's <think>...</think> block (the whole answer if there is none)."""
+    advice = answer.split(THINK_END_TAG)[-1].strip()
+    return advice or answer.strip()
+
+def analysis_to_response(reponse_analysis: dict, cache_key: Optional[str] = None, cache_generation: Optional[int] = None) -> dict:
+    """Converts an LLM analysis to a CheckOrderResponse dict and caches it.
+
+    Every LLM answer passes through here (blocking, job and streamed), so all of them, and the
+    cache they share, hold the advice without the reasoning block. ``cache_generation`` is the
+    cache's generation from before the budget was read; if spending or the limit changed since,
+    the answer is not cached.
+    """
     if reponse_analysis["status"].lower() == "success":
-        return {
+        check_order_sources["llm"] += 1
+        response = {
             "status": "success",
-            "message": f"{reponse_analysis['message']}"
+            "message": strip_reasoning(f"{reponse_analysis['message']}"),
+            "source": "llm"
         }
+        if cache_key is not None:
+            response_cache.put(cache_key, response, cache_generation)
+        return response
     else:
         return {
             "status": "failed",
             "message": "Girlfriend is not available"
         }
-        
+
+def budget_state() -> Tuple[float, float]:
+    """Returns the stored (spending so far this month, monthly limit); check-orders never trust the client's copy."""
+    current_year, current_month = current_period()
+    return store.get_summary(current_year, current_month)["spending_cents"] / 100, store.monthly_limit
+
+def decide_by_rules(order_request: models.CheckOrderRequest, budget: Tuple[float, float]) -> Optional[dict]:
+    """Answers arithmetically clear orders from the rules stage. Returns None if the LLM should decide."""
+    current_spending, monthly_limit = budget
+    decision = evaluate_rules(
+        order_request.orderAmount,
+        current_spending,
+        monthly_limit,
+        order_request.itemsInOrder,
+        rules_settings
+    )
+    if decision is None:
+        return None
+    check_order_sources["rules"] += 1
+    return {"status": "success", "message": decision.message, "source": "rules"}
+
+def cached_check_order(order_request: models.CheckOrderRequest, budget: Tuple[float, float]) -> Tuple[Optional[str], Optional[dict]]:
+    """Returns the order's cache key and its cached response (None on a miss or when caching is off)."""
+    if not cache_settings["enabled"]:
+        return None, None
+    current_spending, monthly_limit = budget
+    cache_key = make_key(
+        order_request.itemsInOrder,
+        order_request.orderAmount,
+        current_spending,
+        monthly_limit,
+        cache_settings["spending_bucket"]
+    )
+    cached_response = response_cache.get(cache_key)
+    if cached_response is not None:
+        check_order_sources["cache"] += 1
+        cached_response = {**cached_response, "source": "cache"}
+    return cache_key, cached_response
+
+def prepare_check_order(order_request: models.CheckOrderRequest, budget: Tuple[float, float]) -> Tuple[list, str]:
+    """Gathers the budget state the LLM analysis needs for an order."""
+    current_spending, monthly_limit = budget
+    additional_context = (
+        f"Montly spend limit is: {monthly_limit}, spending so far this month is: {current_spending:.2f}, "
+        f"this order costs: {order_request.orderAmount:.2f}. You have already purchased items under the key: <previous_spending_data>"
+    )
+    return order_request.itemsInOrder, additional_context
+
+async def submit_check_order(order_request: models.CheckOrderRequest) -> InferenceJob:
+    """Queues the analysis of an order (or records the rules' answer as a finished job).
+
+    Raises 503 if the queue is full or the model is still warming up (rules and cache answers still work then).
+    """
+    cache_generation = response_cache.generation # Read before the budget, see analysis_to_response
+    budget = await run_read(budget_state)
+    rules_response = decide_by_rules(order_request, budget)
+    if rules_response is not None:
+        return inference_worker.completed(rules_response)
+    cache_key, cached_response = cached_check_order(order_request, budget)
+    if cached_response is not None:
+        return inference_worker.completed(cached_response)
+    require_model()
+    incoming_order, additional_context = prepare_check_order(order_request, budget)
+    try:
+        return inference_worker.submit(analyze_order, incoming_order, additional_context, cache_key, cache_generation)
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def job_to_response(job: InferenceJob) -> dict:
+    return {"jobId": job.id, "status": job.status, "result": job.result, "error": job.error}
+
+@app.post(
+    "/spending/check-order",
+    response_model=models.CheckOrderResponse,
+    summary="Check Potential Order Spending",
+    tags=["Spending"]
+)
+async def check_order_spending(order_request: models.CheckOrderRequest = Body(...)):
+    """Checks if adding a specific amount would exceed the monthly spending limit.
+
+    Clear cases (comfortably under or over the limit) are answered by the rules stage;
+    the rest go to the LLM. Synchronous wrapper around the job API: waits up to the configured
+    timeout and answers 504 (with the job id to poll) if the analysis takes longer.
+    """
+    job = await submit_check_order(order_request)
+    try:
+        return await inference_worker.wait(job, inference_settings["timeout_s"])
+    except InferenceTimeout:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Analysis is still running. Poll /spending/check-order/jobs/{job.id} for the result."
+        )
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post(
+    "/spending/check-order/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+    summary="Stream the Order Check Analysis",
+    tags=["Spending"]
+)
+async def stream_check_order(order_request: models.CheckOrderRequest = Body(...)):
+    """Streams the analysis as Server-Sent Events while it is generated.
+
+    Emits `token` events (`{"text": ...}`) with the advice as it is produced (the model's
+    reasoning block is not sent), then one terminal `message` event with the same body as
+    `/spending/check-order`, or an `error` event.
+    """
+    cache_generation = response_cache.generation # Read before the budget, see analysis_to_response
+    budget = await run_read(budget_state)
+    ready_response = decide_by_rules(order_request, budget)
+    cache_key = None
+    if ready_response is None:
+        cache_key, ready_response = cached_check_order(order_request, budget)
+    incoming_order, additional_context = prepare_check_order(order_request, budget)
+    if ready_response is None:
+        model = require_model()
+        if inference_worker.pending >= inference_worker.max_queue:
+            raise HTTPException(status_code=503, detail="Inference queue is full.")
+
+    async def events():
+        if ready_response is not None:
+            yield sse_event("message", ready_response)
+            return
+        try:
+            async for event, data in inference_worker.stream(model.prompt_llm_stream, incoming_order, additional_context):
+                if event == "token":
+                    yield sse_event("token", {"text": data})
+                else:
+                    yield sse_event("message", analysis_to_response(data, cache_key, cache_generation))
+        except Exception as e:  # The generator's own error, re-raised by the worker; the client gets a terminal event either way
+            yield sse_event("error", {"message": str(e) or type(e).__name__})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post(
+    "/spending/check-order/jobs",
+    response_model=models.CheckOrderJobResponse,
+    status_code=202,
+    summary="Submit an Order Check Job",
+    tags=["Spending"]
+)
+async def submit_check_order_job(order_request: models.CheckOrderRequest = Body(...)):
+    """Queues the order analysis and returns a job id immediately. Poll the job for the result."""
+    return job_to_response(await submit_check_order(order_request))
+
+@app.get(
+    "/spending/check-order/jobs/{job_id}",
+    response_model=models.CheckOrderJobResponse,
+    summary="Get an Order Check Job's Status and Result",
+    tags=["Spending"]
+)
+async def get_check_order_job(job_id: str):
+    """Returns the job's status (`queued`, `running`, `done` or `failed`) and, once done, its result."""
+    job = inference_worker.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired).")
+    return job_to_response(job)
+
+@app.get(
+    "/spending/check-order/stats",
+    response_model=models.CheckOrderStatsResponse,
+    summary="Get Check-Order Answer Source Statistics",
+    tags=["Spending"]
+)
+async def get_check_order_stats():
+    """Reports how many check-orders each stage answered since startup, the share kept off the LLM,
+    cache counters and generation batching metrics."""
+    total = sum(check_order_sources.values())
+    batching = None
+    if model_loader.ready:
+        try:
+            batching = await run_in_threadpool(model_loader.model.batching_stats)
+        except Exception as e:
+            print(f"Warning: Could not read batching stats: {e}")
+    return {
+        "answeredBy": dict(check_order_sources),
+        "total": total,
+        "llmOffloadRate": (total - check_order_sources["llm"]) / total if total else 0.0,
+        "cache": response_cache.stats(),
+        "batching": batching
+    }
+
 @app.post(
     "/spending/record-purchase",
     response_model=models.RecordPurchaseResponse,
@@ -123,32 +469,51 @@ async def check_order_spending(order_request: models.CheckOrderRequest = Body(..
     tags=["Spending"]
 )
 async def record_purchase(purchase: models.RecordPurchaseRequest = Body(...)):
-    """Adds a new spending record based on a completed purchase to the current month's total and saves to JSON.
+    """Adds a new spending record based on a completed purchase to the current month's total and stores it.
     
     Receives the total order amount and a list of items.
     Updates the monthly spending by the total order amount.
     Adds individual items to the purchased list for the month.
     """
-    data = check_and_prepare_data()
-    current_month_str = str(data["current_month"])
-    month_data = data["monthly_data"].get(current_month_str)
+    def write():
+        current_year, current_month = check_and_prepare_data()
+        # A single write covers both the items and the total spending update
+        new_spending = store.record_purchase(current_year, current_month, to_stored_items(purchase.itemsInOrder), purchase.orderAmount)
+        response_cache.clear() # Cached advice was based on the old spending
+        return new_spending
+
+    new_spending = await run_write(write)
+    schedule_purchase_sync()
+
+    # Return the new response format
+    return {"message": f"Purchase recorded successfully. New spending: ${new_spending:.2f}"}
 
-    # Ensure month_data exists (should be guaranteed by check_and_prepare_data)
-    if month_data is None:
-         raise HTTPException(status_code=500, detail="Internal error: Monthly data structure missing.")
+@app.post(
+    "/spending/record-purchases",
+    response_model=models.RecordPurchasesResponse,
+    summary="Record Several Completed Purchases",
+    tags=["Spending"]
+)
+async def record_purchases(batch: models.RecordPurchasesRequest = Body(...)):
+    """Records a batch of completed purchases (e.g. orders queued by the extension) in a single write.
 
-    # Add individual items from the request to the stored list
-    for item in purchase.itemsInOrder:
-        # Convert Pydantic model item to dict for JSON storage
-        month_data["items_purchased"].append({"name": item.name, "price": item.price})
-        # Optionally add timestamp or other details from the request item if needed
+    Either all orders are recorded or none are.
+    """
+    def write():
+        current_year, current_month = check_and_prepare_data()
+        orders = [(to_stored_items(order.itemsInOrder), order.orderAmount) for order in batch.orders]
+        new_spending = store.record_purchases(current_year, current_month, orders)
+        response_cache.clear() # Cached advice was based on the old spending
+        return new_spending
 
-    # Update the total spending by the orderAmount from the request
-    month_data["current_spending"] += purchase.orderAmount
-    models.save_data(data) # Save changes
+    new_spending = await run_write(write)
+    schedule_purchase_sync()
 
-    # Return the new response format
-    return {"message": f"Purchase recorded successfully. New spending: ${month_data['current_spending']:.2f}"}
+    return {
+        "message": f"{len(batch.orders)} purchase(s) recorded successfully. New spending: ${new_spending:.2f}",
+        "recorded": len(batch.orders),
+        "currentSpending": round(new_spending, 2)
+    }
 
 @app.put(
     "/spending/limit",
@@ -157,12 +522,15 @@ async def record_purchase(purchase: models.RecordPurchaseRequest = Body(...)):
     tags=["Spending"]
 )
 async def update_spending_limit(limit_update: models.UpdateLimitRequest = Body(...)):
-    """Sets or updates the monthly spending limit and saves to JSON."""
-    data = models.load_data() # Load current data
-    data["monthly_limit"] = limit_update.limit
-    models.save_data(data) # Save the updated limit
+    """Sets or updates the monthly spending limit in the configured storage."""
+    def write():
+        store.set_limit(limit_update.limit)
+        response_cache.clear() # Cached advice was based on the old limit
+        return store.monthly_limit
+
+    new_limit = await run_write(write)
     return {
-        "limit": data["monthly_limit"],
+        "limit": new_limit,
         "message": "Spending limit updated successfully."
     }
 
@@ -179,23 +547,19 @@ async def reset_monthly_spending():
     
     Does not change the monthly limit.
     """
-    data = check_and_prepare_data() # Ensures data is loaded and month is correct
-    current_month_str = str(data["current_month"])
-    month_data = data["monthly_data"].get(current_month_str)
+    def write():
+        current_year, current_month = check_and_prepare_data() # Ensures month is correct
+        # Reset spending and items for the current month
+        store.reset_month(current_year, current_month)
+        response_cache.clear() # Cached advice was based on the old spending
+        return current_month, store.get_summary(current_year, current_month)["spending_cents"] / 100
 
-    if month_data is None:
-        # This shouldn't happen if check_and_prepare_data works, but handle defensively
-        raise HTTPException(status_code=500, detail="Internal error: Monthly data structure missing for reset.")
-
-    # Reset spending and items for the current month
-    month_data["current_spending"] = 0.00
-    month_data["items_purchased"] = []
-    
-    models.save_data(data) # Save the changes
+    current_month, current_spending = await run_write(write)
+    schedule_purchase_sync(full=True) # The month's purchases are gone from storage
 
     return {
-        "message": f"Spending for month {current_month_str} reset successfully.",
-        "currentSpending": month_data["current_spending"] # Should be 0.0
+        "message": f"Spending for month {current_month} reset successfully.",
+        "currentSpending": current_spending # Should be 0.0
     }
 
 
@@ -265,12 +629,28 @@ async def get_alert_audio():
         raise HTTPException(status_code=404, detail="Alert audio file not found.")
     return FileResponse(alert_file_abs_path, media_type="audio/wav", filename="alert.wav")
 
+# --- Health Endpoints ---
+
+@app.get("/healthz", summary="Liveness Probe", tags=["Health"])
+async def healthz():
+    """Answers as long as the API process is serving requests (the model may still be loading)."""
+    return {"status": "ok"}
+
+@app.get(
+    "/readyz",
+    responses={503: {"description": "Model is still loading or failed to load"}},
+    summary="Readiness Probe",
+    tags=["Health"]
+)
+async def readyz():
+    """Reports model load progress and memory use; 200 once the model can serve check-orders, 503 before."""
+    status = model_loader.status()
+    return JSONResponse(status_code=200 if model_loader.ready else 503, content=status)
+
 # --- Root endpoint for basic check ---
 @app.get("/", include_in_schema=False)
 async def root():
-    # Perform initial check on root access too, ensuring file exists
-    check_and_prepare_data()
-    return {"message": "Spending Tracker API is running (using JSON storage). Visit /docs for API documentation."}
+    return {"message": "Spending Tracker API is running (using pluggable JSON/SQLite storage). Visit /docs for API documentation."}
 
 # --- Run with Uvicorn (example command) ---
 # uvicorn backend.fastAPI.main:app --reload --port 8000
@@ -0,0 +1,83 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import json
+import time
+
+import httpx
+
+# --- Constants ---
+MODEL_SERVER_DEFAULTS = {
+    "url": None,  # e.g. http://127.0.0.1:8001; with `socket` set only the path part matters
+    "socket": None,  # Unix socket path of the model server (preferred over TCP on one host)
+    "timeout_s": 300,  # Per-request timeout of the API workers' client
+    "pool_size": 8,  # Keep-alive connections per API worker
+    "max_workers": 4,  # Server side: prompts run concurrently, feeding batches of up to generation_batching.max_batch_size
+    "max_queue": 32,  # Server side: prompts queued or running before it answers 503
+    "ready_poll_s": 2.0,  # How often API workers poll the server's /readyz while it loads
+}
+
+
+def server_configured(settings: Dict[str, Any]) -> bool:
+    return bool(settings["url"] or settings["socket"])
+
+
+class ModelClient:
+    """Thin, pooled HTTP client for the shared model server.
+
+    Exposes the same ``prompt_llm`` / ``prompt_llm_stream`` interface as ``LLMPrompt``, so the
+    API can use either one. ``httpx.Client`` is thread-safe and shared by the inference threads.
+    """
+
+    def __init__(self, url: Optional[str] = None, socket_path: Optional[str] = None, timeout_s: float = 300, pool_size: int = 8):
+        transport = httpx.HTTPTransport(uds=socket_path) if socket_path else None
+        self._client = httpx.Client(
+            base_url=url or "http://model-server",
+            transport=transport,
+            timeout=timeout_s,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def wait_until_ready(self, on_progress: Callable[[str], None], poll_s: float = 2.0):
+        """Blocks until the server reports its model ready; raises RuntimeError if it failed to load."""
+        while True:
+            try:
+                response = self._client.get("/readyz")
+                status = response.json()
+            except (httpx.TransportError, json.JSONDecodeError):
+                on_progress("waiting for the model server")
+            else:
+                if response.status_code == 200:
+                    return
+                if status.get("state") == "failed":
+                    raise RuntimeError(f"Model server failed to load the model: {status.get('error')}")
+                on_progress(f"model server: {status.get('stage') or status.get('state')}")
+            time.sleep(poll_s)
+
+    def prompt_llm(self, incoming_order: List[Dict[str, Any]], additional_context: str = "") -> Dict[str, Any]:
+        response = self._client.post("/prompt", json={"incomingOrder": incoming_order, "additionalContext": additional_context})
+        response.raise_for_status()
+        return response.json()
+
+    def prompt_llm_stream(self, incoming_order: List[Dict[str, Any]], additional_context: str = "") -> Iterator[Tuple[str, Any]]:
+        request = {"incomingOrder": incoming_order, "additionalContext": additional_context}
+        with self._client.stream("POST", "/prompt/stream", json=request) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    event = json.loads(line)
+                    if event["event"] == "error":
+                        raise RuntimeError(f"Model server failed mid-stream: {event['data']['message']}")
+                    yield event["event"], event["data"]
+
+    def ingest_purchases(self, purchases: List[Tuple[str, Dict[str, Any]]], complete: bool = True) -> Tuple[int, int]:
+        response = self._client.post("/purchases", json={"purchases": purchases, "complete": complete})
+        response.raise_for_status()
+        result = response.json()
+        return result["added"], result["removed"]
+
+    def batching_stats(self) -> Optional[Dict[str, Any]]:
+        response = self._client.get("/stats")
+        response.raise_for_status()
+        return response.json()["batching"]
+
+    def close(self):
+        self._client.close()
@@ -0,0 +1,80 @@
+from typing import Any, Callable, Dict, Optional
+import resource
+import time
+
+from .config import load_config
+
+
+def memory_usage_mb() -> Dict[str, Optional[float]]:
+    """Returns the process's current and peak resident memory in MB (current is Linux-only)."""
+    usage = {"rssMb": None, "peakRssMb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    usage["rssMb"] = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    usage["peakRssMb"] = int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return usage
+
+
+def load_local_model(on_progress: Callable[[str], None]):
+    """Imports and builds the LLM in this process (slow)."""
+    on_progress("importing inference libraries")
+    from retrieve_context import LLMPrompt
+    return LLMPrompt(on_progress=on_progress, config=load_config())
+
+
+class ModelLoader:
+    """Builds the LLM on a background thread and tracks its progress for the readiness probe.
+
+    ``factory`` is called with an ``on_progress(stage)`` callback and returns the model.
+    """
+
+    def __init__(self, factory: Callable[[Callable[[str], None]], Any]):
+        self._factory = factory
+        self.model = None
+        self.state = "pending"  # pending -> loading -> ready | failed
+        self.stage: Optional[str] = None
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def _set_stage(self, stage: str):
+        self.stage = stage
+        print(f"Model warm-up: {stage}")
+
+    def load(self):
+        """Blocking; run it in an executor."""
+        self.state = "loading"
+        self.started_at = time.time()
+        try:
+            self.model = self._factory(self._set_stage)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"Error loading model: {e}")
+            return
+        self.state = "ready"
+        self.stage = "ready"
+        self.ready_at = time.time()
+        print(f"Model ready after {self.ready_at - self.started_at:.1f}s.")
+
+    def status(self) -> Dict[str, Any]:
+        if self.started_at is None:
+            elapsed = None
+        else:
+            elapsed = (self.ready_at or time.time()) - self.started_at
+        return {
+            "state": self.state,
+            "stage": self.stage,
+            "error": self.error,
+            "loadSeconds": elapsed,
+            "memory": memory_usage_mb(),
+        }
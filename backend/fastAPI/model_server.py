@@ -0,0 +1,83 @@
+"""Shared model server: owns the single copy of the LLM for all API worker processes.
+
+Run it once next to the API, e.g. from backend/:
+
+    uvicorn fastAPI.model_server:app --uds /tmp/spending-model.sock
+
+and point ``model_server.socket`` (or ``model_server.url``) in rag-solution/config.yaml at it.
+"""
+from fastapi import FastAPI, HTTPException, Body
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
+
+from . import models
+from .config import get_section
+from .inference import InferenceQueueFull, InferenceWorker
+from .model_client import MODEL_SERVER_DEFAULTS
+from .model_loader import ModelLoader, load_local_model
+
+settings = get_section("model_server", MODEL_SERVER_DEFAULTS)
+model_loader = ModelLoader(load_local_model)
+inference_worker = InferenceWorker( # Several workers let concurrent prompts share generation batches
+    max_workers=settings["max_workers"],
+    max_queue=settings["max_queue"]
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    asyncio.get_running_loop().run_in_executor(None, model_loader.load)
+    yield
+    inference_worker.shutdown()
+
+app = FastAPI(title="Spending Tracker Model Server", lifespan=lifespan)
+
+def require_model():
+    if not model_loader.ready:
+        raise HTTPException(status_code=503, detail=f"Model is not ready ({model_loader.state}).", headers={"Retry-After": "10"})
+    return model_loader.model
+
+@app.get("/readyz")
+async def readyz():
+    return JSONResponse(status_code=200 if model_loader.ready else 503, content=model_loader.status())
+
+@app.get("/stats")
+async def stats():
+    """Generation batching metrics (batch sizes, queue wait)."""
+    return {"batching": model_loader.model.batching_stats() if model_loader.ready else None}
+
+@app.post("/prompt")
+async def prompt(request: models.ModelPromptRequest = Body(...)):
+    """Runs ``LLMPrompt.prompt_llm`` and returns its result."""
+    model = require_model()
+    try:
+        job = inference_worker.submit(model.prompt_llm, incoming_order=request.incomingOrder, additional_context=request.additionalContext)
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return await inference_worker.wait(job)
+
+@app.post("/purchases")
+async def ingest_purchases(request: models.ModelPurchasesRequest = Body(...)):
+    """Runs ``LLMPrompt.ingest_purchases``: adds newly recorded purchases, or with ``complete`` syncs to exactly these."""
+    model = require_model()
+    added, removed = await run_in_threadpool(model.ingest_purchases, request.purchases, request.complete)
+    return {"added": added, "removed": removed}
+
+@app.post("/prompt/stream")
+async def prompt_stream(request: models.ModelPromptRequest = Body(...)):
+    """Streams ``LLMPrompt.prompt_llm_stream`` as newline-delimited JSON (`{"event": ..., "data": ...}`)."""
+    model = require_model()
+    if inference_worker.pending >= inference_worker.max_queue:
+        raise HTTPException(status_code=503, detail="Inference queue is full.")
+
+    async def lines():
+        try:
+            async for event, data in inference_worker.stream(model.prompt_llm_stream, request.incomingOrder, request.additionalContext):
+                yield json.dumps({"event": event, "data": data}) + "\n"
+        except Exception as e:
+            # The status line is already sent; the client raises on this event
+            yield json.dumps({"event": "error", "data": {"message": str(e) or type(e).__name__}}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import json
 import os
 import datetime
@@ -25,50 +25,89 @@ def get_default_data() -> Dict[str, Any]:
         }
     }
 
-def load_data() -> Dict[str, Any]:
+def read_data_file() -> Dict[str, Any]:
     """Loads spending data from the JSON file. Creates default if not found."""
     os.makedirs(DATA_DIR, exist_ok=True)
     if not os.path.exists(DATA_FILE):
         print(f"Data file '{DATA_FILE}' not found. Creating default.")
         data = get_default_data()
-        save_data(data)
+        write_data_file(data)
         return data
     try:
         with open(DATA_FILE, 'r') as f:
             data = json.load(f)
-            # Basic validation/migration if needed in future
-            if 'monthly_data' not in data or 'current_month' not in data or 'monthly_limit' not in data:
-                 print("Data file seems incomplete or corrupted. Resetting to default.")
-                 data = get_default_data()
-                 save_data(data)
-            return data
+        # Basic validation/migration if needed in future
+        if 'monthly_data' not in data or 'current_month' not in data or 'monthly_limit' not in data:
+            print("Data file seems incomplete or corrupted. Resetting to default.")
+            return _reset_corrupt_data_file()
+        return data
     except (json.JSONDecodeError, IOError) as e:
         print(f"Error loading data file '{DATA_FILE}': {e}. Resetting to default.")
-        data = get_default_data()
-        save_data(data)
-        return data
+        return _reset_corrupt_data_file()
 
-def save_data(data: Dict[str, Any]):
-    """Saves spending data to the JSON file."""
+def _reset_corrupt_data_file() -> Dict[str, Any]:
+    """Moves an unreadable data file aside (so nothing is silently lost) and writes the default data."""
+    corrupt_file = f"{DATA_FILE}.corrupt-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+    try:
+        os.replace(DATA_FILE, corrupt_file)
+        print(f"Preserved the unreadable data file as '{corrupt_file}'.")
+    except OSError as e:
+        print(f"Warning: Could not preserve the unreadable data file: {e}")
+    data = get_default_data()
+    write_data_file(data)
+    return data
+
+def write_data_file(data: Dict[str, Any]) -> bool:
+    """Atomically saves spending data to the JSON file. Returns False if the write failed.
+
+    The data is written and fsync'd to a temporary file which then replaces the data file,
+    so readers (and crashes) only ever see the old or the new complete document.
+    """
     os.makedirs(DATA_DIR, exist_ok=True)
+    tmp_file = f"{DATA_FILE}.tmp"
     try:
-        with open(DATA_FILE, 'w') as f:
+        with open(tmp_file, 'w') as f:
             json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, DATA_FILE)
+        return True
     except IOError as e:
         print(f"Error saving data file '{DATA_FILE}': {e}")
+        return False
+
+def load_data() -> Dict[str, Any]:
+    """Returns the full spending data document from the configured storage backend."""
+    from .storage import get_storage
+    return get_storage().snapshot()
+
+def save_data(data: Dict[str, Any]):
+    """Replaces the stored spending data with the given document via the configured storage backend."""
+    from .storage import get_storage
+    get_storage().replace(data)
 
 # --- Request Models ---
 
 class CheckOrderRequest(BaseModel):
     orderAmount: float = Field(..., gt=0, description="The amount of the potential order.")
-    currentSpending: float = Field(..., ge=0, description="The current total spending for the month.")
-    monthlyLimit: float = Field(..., ge=0, description="The monthly spending limit.")
+    currentSpending: float = Field(..., ge=0, description="The client's view of this month's spending (the server decides with its stored total).")
+    monthlyLimit: float = Field(..., ge=0, description="The client's view of the monthly limit (the server decides with its stored limit).")
     itemsInOrder: List[Dict[str, Any]] = Field(default_factory=list, description="List of items in the current order.")
 
+# Model for the shared model server's prompt endpoints (API workers -> model server)
+class ModelPromptRequest(BaseModel):
+    incomingOrder: List[Dict[str, Any]] = Field(default_factory=list, description="Items of the order to analyze.")
+    additionalContext: str = Field("", description="Budget context appended to the prompt.")
+
+class ModelPurchasesRequest(BaseModel):
+    purchases: List[Tuple[str, Dict[str, Any]]] = Field(default_factory=list, description="Stored purchases as (row id, item).")
+    complete: bool = Field(True, description="True: these are all stored purchases (others are removed from the index); false: only newly recorded ones.")
+
 # Model for a single item in the purchase request (matches frontend structure)
 class RecordPurchaseItem(BaseModel):
     name: str = Field(..., description="Name of the item in the order.")
     price: float = Field(..., gt=0, description="Price of the item in the order.")
+    category: Optional[str] = Field(None, description="Optional spending category of the item.")
     # Add quantity or other fields if available/needed
 
 class RecordPurchaseRequest(BaseModel):
@@ -76,6 +115,9 @@ class RecordPurchaseRequest(BaseModel):
     itemsInOrder: List[RecordPurchaseItem] = Field(..., description="List of items included in the purchase.")
     timestamp: str = Field(..., description="ISO timestamp of when the record request was made.")
 
+class RecordPurchasesRequest(BaseModel):
+    orders: List[RecordPurchaseRequest] = Field(..., min_length=1, description="Completed orders to record in a single write.")
+
 class NewPurchaseRequest(BaseModel):
     name: str = Field(..., min_length=1, description="Name of the purchased item.")
     price: float = Field(..., gt=0, description="Price of the purchased item.")
@@ -88,19 +130,45 @@ class UpdateLimitRequest(BaseModel):
 class MonthlySpendingItem(BaseModel):
     name: str
     price: float
+    category: Optional[str] = None
 
 class MonthlySpendingResponse(BaseModel):
     limit: float
     currentSpending: float
+    items: List[MonthlySpendingItem] # Empty in summary mode; page through /spending/monthly/items instead
+    itemCount: Optional[int] = None
+    categoryTotals: Optional[Dict[str, float]] = None
+
+class MonthlyItemsResponse(BaseModel):
     items: List[MonthlySpendingItem]
+    nextCursor: Optional[str] = None # Pass as ?cursor= to get the next page; null on the last page
 
 class CheckOrderResponse(BaseModel):
     status: str # 'yes' or 'no'
     message: str
+    source: Optional[str] = None # Which stage answered: 'rules', 'cache' or 'llm'
+
+class CheckOrderStatsResponse(BaseModel):
+    answeredBy: Dict[str, int]
+    total: int
+    llmOffloadRate: float # Share of check-orders answered without running the LLM
+    cache: Dict[str, int] # Response cache hit/miss counters
+    batching: Optional[Dict[str, Any]] = None # Generation batch sizes and queue wait, prefix-cache hits/misses (once the model is loaded)
+
+class CheckOrderJobResponse(BaseModel):
+    jobId: str
+    status: str # 'queued', 'running', 'done' or 'failed'
+    result: Optional[CheckOrderResponse] = None
+    error: Optional[str] = None
 
 class RecordPurchaseResponse(BaseModel):
     message: str
 
+class RecordPurchasesResponse(BaseModel):
+    message: str
+    recorded: int
+    currentSpending: float
+
 class UpdateLimitResponse(BaseModel):
     limit: float
     message: str
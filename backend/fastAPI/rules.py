@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+# --- Constants ---
+RULES_DEFAULTS = {
+    "enabled": True,
+    # Orders keeping projected spending at or below this share of the limit are approved outright
+    "approve_below_ratio": 0.8,
+    # Orders pushing projected spending above this share of the limit are declined outright
+    "decline_above_ratio": 1.0,
+    # Items in these categories (or marked "essential": "no") are always left to the LLM unless declined
+    "non_essential_categories": ["Clothing", "Electronics", "Entertainment"],
+}
+
+APPROVE_MESSAGE = (
+    "Go ahead, babe! This ${amount:.2f} order keeps you at ${projected:.2f} of your ${limit:.2f} "
+    "monthly budget, so you still have ${remaining:.2f} left. I'm proud of you for staying on track!"
+)
+DECLINE_MESSAGE = (
+    "Oh no, babe, this ${amount:.2f} order would bring you to ${projected:.2f}, which is ${over:.2f} "
+    "over your ${limit:.2f} monthly budget. Let's hold off on it for now, okay?"
+)
+
+
+@dataclass
+class RuleDecision:
+    verdict: str  # 'approve' or 'decline'
+    rule: str  # Name of the rule that decided
+    message: str
+
+
+def is_non_essential(item: Dict[str, Any], non_essential_categories: List[str]) -> bool:
+    essential = item.get("essential")
+    if essential is False or str(essential).lower() == "no":
+        return True
+    return item.get("category") in non_essential_categories
+
+
+def evaluate(
+    order_amount: float,
+    current_spending: float,
+    monthly_limit: float,
+    items: List[Dict[str, Any]],
+    settings: Dict[str, Any],
+) -> Optional[RuleDecision]:
+    """Decides arithmetically clear orders without the LLM. Returns None when the order should be escalated."""
+    if not settings["enabled"]:
+        return None
+    projected = current_spending + order_amount
+    values = {
+        "amount": order_amount,
+        "projected": projected,
+        "limit": monthly_limit,
+        "remaining": monthly_limit - projected,
+        "over": projected - monthly_limit,
+    }
+    if projected > monthly_limit * settings["decline_above_ratio"]:
+        return RuleDecision("decline", "over_limit", DECLINE_MESSAGE.format(**values))
+    if projected <= monthly_limit * settings["approve_below_ratio"]:
+        if any(is_non_essential(item, settings["non_essential_categories"]) for item in items):
+            return None
+        return RuleDecision("approve", "well_under_limit", APPROVE_MESSAGE.format(**values))
+    return None  # Borderline band
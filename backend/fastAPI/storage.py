@@ -0,0 +1,679 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+import copy
+import datetime
+import glob
+import json
+import os
+import queue
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import config, models
+
+try:
+    import fcntl
+except ImportError:  # Windows: the single-process check below is skipped
+    fcntl = None
+
+# --- Constants ---
+WAL_FILE = os.path.join(models.DATA_DIR, "spending_data.wal")
+SQLITE_FILE = os.path.join(models.DATA_DIR, "spending_data.db")
+COMPACT_EVERY = 200  # Number of logged mutations before a background snapshot is taken
+UNCATEGORIZED = "Uncategorized"  # Aggregate bucket for items recorded without a category
+
+STORAGE_DEFAULTS = {
+    "backend": "json",  # 'json' (snapshot + write-ahead log) or 'sqlite'
+    "sqlite_file": SQLITE_FILE,
+    "sqlite_pool_size": 4,
+    "compact_every": COMPACT_EVERY,
+}
+
+# --- Storage Interface ---
+
+def _empty_month() -> Dict[str, Any]:
+    return {"current_spending": 0.00, "items_purchased": [], "spending_cents": 0, "category_cents": {}}
+
+def to_cents(amount: float) -> int:
+    """Converts a dollar amount to integer cents (half-up), so running totals never drift."""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def item_cents(item: Dict[str, Any]) -> int:
+    return to_cents(item["price"]) * int(item.get("quantity", 1))
+
+
+class SpendingStorage(ABC):
+    """Interface implemented by every spending storage backend.
+
+    Months are addressed by ``(year, month)``. Backends that only key by month (the JSON
+    document) ignore the year.
+    """
+
+    @property
+    @abstractmethod
+    def current_month(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def monthly_limit(self) -> float:
+        ...
+
+    @abstractmethod
+    def ensure_month(self, year: int, month: int) -> bool:
+        """Makes the month current and creates its entry if missing. Returns True if anything changed."""
+
+    @abstractmethod
+    def get_month(self, year: int, month: int) -> Dict[str, Any]:
+        """Returns ``{"current_spending", "items_purchased"}`` for a month (empty if it has no data)."""
+
+    @abstractmethod
+    def get_summary(self, year: int, month: int) -> Dict[str, Any]:
+        """Returns the month's running totals without its items.
+
+        ``{"spending_cents": int, "category_cents": {category: int}, "item_count": int}``;
+        uncategorized items are counted under ``UNCATEGORIZED``.
+        """
+
+    @abstractmethod
+    def get_items(self, year: int, month: int, cursor: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns up to ``limit`` of the month's items after ``cursor`` and the cursor of the next page (None at the end)."""
+
+    @abstractmethod
+    def iter_purchases(self, after: Optional[str] = None) -> Tuple[List[Tuple[str, Dict[str, Any]]], str]:
+        """Returns the items stored since cursor ``after`` (every stored item if None) and the cursor to pass next.
+
+        Items are ``(row id, item)``; a row id stays the same while its item is stored. Removed
+        items are not reported, so after a reset callers start again from None.
+        """
+
+    def get_category_totals(self, year: int, month: int) -> Dict[str, float]:
+        """Returns the month's spending per item category in dollars."""
+        category_cents = self.get_summary(year, month)["category_cents"]
+        return {category: cents / 100 for category, cents in category_cents.items()}
+
+    @abstractmethod
+    def record_purchases(self, year: int, month: int, orders: List[Tuple[List[Dict[str, Any]], float]]) -> float:
+        """Adds several ``(items, amount)`` orders to a month in one atomic write. Returns the month's new spending."""
+
+    def record_purchase(self, year: int, month: int, items: List[Dict[str, Any]], amount: float) -> float:
+        """Adds purchased items and the order amount to a month. Returns the month's new spending."""
+        return self.record_purchases(year, month, [(items, amount)])
+
+    @abstractmethod
+    def set_limit(self, limit: float):
+        ...
+
+    @abstractmethod
+    def reset_month(self, year: int, month: int):
+        ...
+
+    @abstractmethod
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the full data document (the format of ``data/spending_data.json``)."""
+
+    @abstractmethod
+    def replace(self, data: Dict[str, Any]):
+        """Replaces all stored data with the given document."""
+
+    def close(self):
+        pass
+
+
+# --- JSON Snapshot + Write-Ahead Log Backend ---
+
+def _add_order(month_data: Dict[str, Any], items: List[Dict[str, Any]], amount: float):
+    """Appends an order's items and keeps the month's integer-cent aggregates in step."""
+    month_data["items_purchased"].extend(items)
+    month_data["spending_cents"] += to_cents(amount)
+    category_cents = month_data["category_cents"]
+    for item in items:
+        category = item.get("category") or UNCATEGORIZED
+        category_cents[category] = category_cents.get(category, 0) + item_cents(item)
+    month_data["current_spending"] = month_data["spending_cents"] / 100
+
+def _ensure_aggregates(data: Dict[str, Any]):
+    """Backfills the cent aggregates for months stored before they were maintained."""
+    for month_data in data["monthly_data"].values():
+        if "spending_cents" in month_data:
+            continue
+        items = month_data["items_purchased"]
+        month_data["items_purchased"] = []
+        month_data["spending_cents"] = 0
+        month_data["category_cents"] = {}
+        _add_order(month_data, items, month_data["current_spending"])
+
+def apply_entry(data: Dict[str, Any], entry: Dict[str, Any]):
+    """Applies a single logged mutation to the in-memory data structure."""
+    op = entry["op"]
+    if op == "ensure_month":
+        data["current_month"] = entry["month"]
+        data["monthly_data"].setdefault(str(entry["month"]), _empty_month())
+    elif op == "record_purchase":  # Single-order entries written by earlier versions
+        month_data = data["monthly_data"].setdefault(str(entry["month"]), _empty_month())
+        _add_order(month_data, entry["items"], entry["amount"])
+    elif op == "record_purchases":
+        month_data = data["monthly_data"].setdefault(str(entry["month"]), _empty_month())
+        for order in entry["orders"]:
+            _add_order(month_data, order["items"], order["amount"])
+    elif op == "set_limit":
+        data["monthly_limit"] = entry["limit"]
+    elif op == "reset_month":
+        data["monthly_data"][str(entry["month"])] = _empty_month()
+    elif op == "replace":
+        data.clear()
+        data.update(copy.deepcopy(entry["data"]))
+        _ensure_aggregates(data)
+    else:
+        raise ValueError(f"Unknown log operation: {op}")
+    data["_wal_seq"] = entry["seq"]
+
+
+class JsonWalStorage(SpendingStorage):
+    """Keeps the spending data in memory and persists every mutation to an append-only log.
+
+    On startup the last snapshot (``spending_data.json``) is loaded and any log entries newer
+    than it are replayed. Once ``compact_every`` entries have been logged, the log is rotated
+    and a background thread folds it into a fresh snapshot.
+
+    The data, log sequence and write lock live in this process, so only one process may use the
+    files at a time (a second one, e.g. another ``uvicorn --workers`` worker, is refused).
+    """
+
+    def __init__(self, wal_file: str = WAL_FILE, compact_every: int = COMPACT_EVERY):
+        self.wal_file = wal_file
+        self.compact_every = compact_every
+        self._process_lock = self._lock_files()
+        self._lock = threading.RLock()
+        self._compaction = None
+        self._wal_entries = 0  # Entries in the active log, i.e. not yet rotated into a segment
+        self._data = self._recover()
+        self._seq = self._data.get("_wal_seq", 0)
+        self._wal = open(self.wal_file, "a", encoding="utf-8")
+
+    def _lock_files(self):
+        """Takes an exclusive lock on ``<wal>.lock`` for the life of the storage; raises RuntimeError if another process holds it."""
+        if fcntl is None:
+            return None
+        lock_file = open(f"{self.wal_file}.lock", "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                f"'{self.wal_file}' is in use by another process. The json storage backend supports a single "
+                "API process; set storage.backend: sqlite in rag-solution/config.yaml to run several workers."
+            )
+        return lock_file
+
+    # --- Recovery ---
+
+    def _segment_files(self) -> List[str]:
+        """Returns rotated log segments (``<wal>.<seq>``) oldest first."""
+        segments = glob.glob(f"{self.wal_file}.*")
+        segments = [path for path in segments if path.rsplit(".", 1)[-1].isdigit()]
+        return sorted(segments, key=lambda path: int(path.rsplit(".", 1)[-1]))
+
+    def _recover(self) -> Dict[str, Any]:
+        """Loads the snapshot and replays log entries that are not yet part of it.
+
+        A torn final line in the active log is cut off, so the next append starts on a clean line.
+        """
+        data = models.read_data_file()
+        _ensure_aggregates(data)
+        snapshot_seq = data.get("_wal_seq", 0)
+        replayed = 0
+        for path in self._segment_files() + [self.wal_file]:
+            if not os.path.exists(path):
+                continue
+            intact = 0  # Bytes of complete entries read so far
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("missing newline")
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-append; everything before it is intact.
+                        print(f"Ignoring incomplete log entry in '{path}'.")
+                        break
+                    intact += len(line)
+                    if path == self.wal_file:
+                        self._wal_entries += 1
+                    if entry["seq"] <= snapshot_seq:
+                        continue
+                    apply_entry(data, entry)
+                    replayed += 1
+            if path == self.wal_file and intact < os.path.getsize(path):
+                os.truncate(path, intact)
+        if replayed:
+            print(f"Replayed {replayed} logged mutation(s) on top of the snapshot.")
+        return data
+
+    # --- Writes ---
+
+    def _log(self, entry: Dict[str, Any]):
+        """Appends a mutation to the log (fsync'd), then applies it in memory."""
+        with self._lock:
+            self._seq += 1
+            entry["seq"] = self._seq
+            self._wal.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            apply_entry(self._data, entry)
+            self._wal_entries += 1
+            if self._wal_entries >= self.compact_every:
+                self._start_compaction()
+
+    def ensure_month(self, year: int, month: int) -> bool:
+        with self._lock:
+            if self._data.get("current_month") == month and str(month) in self._data["monthly_data"]:
+                return False
+            self._log({"op": "ensure_month", "month": month})
+            return True
+
+    def record_purchases(self, year: int, month: int, orders: List[Tuple[List[Dict[str, Any]], float]]) -> float:
+        with self._lock:
+            self._log({
+                "op": "record_purchases",
+                "month": month,
+                "orders": [{"items": items, "amount": amount} for items, amount in orders],
+            })
+            return self._data["monthly_data"][str(month)]["current_spending"]
+
+    def set_limit(self, limit: float):
+        self._log({"op": "set_limit", "limit": limit})
+
+    def reset_month(self, year: int, month: int):
+        self._log({"op": "reset_month", "month": month})
+
+    def replace(self, data: Dict[str, Any]):
+        self._log({"op": "replace", "data": data})
+
+    # --- Reads (served from memory) ---
+
+    @property
+    def current_month(self) -> int:
+        return self._data["current_month"]
+
+    @property
+    def monthly_limit(self) -> float:
+        return self._data["monthly_limit"]
+
+    def get_month(self, year: int, month: int) -> Dict[str, Any]:
+        with self._lock:
+            month_data = self._data["monthly_data"].get(str(month))
+            if month_data is None:
+                return {"current_spending": 0.00, "items_purchased": []}
+            return {
+                "current_spending": month_data["spending_cents"] / 100,
+                "items_purchased": list(month_data["items_purchased"]),
+            }
+
+    def get_summary(self, year: int, month: int) -> Dict[str, Any]:
+        with self._lock:
+            month_data = self._data["monthly_data"].get(str(month), _empty_month())
+            return {
+                "spending_cents": month_data["spending_cents"],
+                "category_cents": dict(month_data["category_cents"]),
+                "item_count": len(month_data["items_purchased"]),
+            }
+
+    def get_items(self, year: int, month: int, cursor: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Pages through the month's items; the cursor is the offset of the next item."""
+        start = int(cursor) if cursor else 0
+        with self._lock:
+            month_data = self._data["monthly_data"].get(str(month), _empty_month())
+            items = month_data["items_purchased"][start:start + limit]
+            end = start + len(items)
+            next_cursor = str(end) if end < len(month_data["items_purchased"]) else None
+        return items, next_cursor
+
+    def iter_purchases(self, after: Optional[str] = None) -> Tuple[List[Tuple[str, Dict[str, Any]]], str]:
+        """Row ids are ``month:position`` (the document has no item ids); the cursor holds each month's item count."""
+        seen = json.loads(after) if after else {}
+        with self._lock:
+            purchases = []
+            counts = {}
+            for month, month_data in self._data["monthly_data"].items():
+                items = month_data["items_purchased"]
+                start = seen.get(month, 0)
+                if start > len(items):
+                    start = 0  # The month was reset since; its positions were reused
+                purchases.extend((f"{month}:{position}", dict(items[position])) for position in range(start, len(items)))
+                counts[month] = len(items)
+        return purchases, json.dumps(counts, sort_keys=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            data = copy.deepcopy(self._data)
+        data.pop("_wal_seq", None)
+        for month_data in data["monthly_data"].values():
+            month_data.pop("spending_cents", None)
+            month_data.pop("category_cents", None)
+        return data
+
+    # --- Compaction ---
+
+    def _start_compaction(self):
+        """Rotates the active log and writes a snapshot of the current state in the background.
+
+        An empty log is not rotated: its segment name would be the last one's, which may still hold
+        entries a failed snapshot did not cover.
+        """
+        if self._compaction is not None and self._compaction.is_alive():
+            return  # Keep appending; the next write after it finishes will retry.
+        if self._wal_entries:
+            self._wal.close()
+            os.replace(self.wal_file, f"{self.wal_file}.{self._seq}")
+            self._wal = open(self.wal_file, "a", encoding="utf-8")
+            self._wal_entries = 0
+        data = copy.deepcopy(self._data)
+        self._compaction = threading.Thread(target=self._compact, args=(data,), daemon=True)
+        self._compaction.start()
+
+    def _compact(self, data: Dict[str, Any]):
+        snapshot_seq = data.get("_wal_seq", 0)
+        if not models.write_data_file(data):
+            return  # Keep the segments; they are replayed on the next start or compaction.
+        # Segments fully covered by the snapshot are no longer needed for recovery.
+        for path in self._segment_files():
+            if int(path.rsplit(".", 1)[-1]) <= snapshot_seq:
+                os.remove(path)
+
+    def compact(self):
+        """Synchronously folds the log into a snapshot (used on shutdown)."""
+        if self._compaction is not None:
+            self._compaction.join()
+        with self._lock:
+            self._start_compaction()
+            compaction = self._compaction
+        compaction.join()
+
+    def close(self):
+        self.compact()
+        with self._lock:
+            self._wal.close()
+        if self._process_lock is not None:
+            self._process_lock.close()
+
+# --- SQLite Backend ---
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS months (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    spending_cents INTEGER NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (year, month)
+);
+CREATE TABLE IF NOT EXISTS category_totals (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    total_cents INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (year, month, category)
+);
+CREATE TABLE IF NOT EXISTS purchases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    category TEXT,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_purchases_year_month_category ON purchases (year, month, category);
+CREATE INDEX IF NOT EXISTS idx_purchases_year_month_id ON purchases (year, month, id);
+"""
+
+
+class ConnectionPool:
+    """A fixed-size pool of SQLite connections shared across request threads."""
+
+    def __init__(self, db_file: str, size: int = 4):
+        self._connections: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=size)
+        for _ in range(size):
+            conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._connections.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Yields a pooled connection inside an immediate (write-locking) transaction."""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get().close()
+
+
+class SqliteStorage(SpendingStorage):
+    """Stores purchases as rows indexed by (year, month, category) in a WAL-mode SQLite database.
+
+    If the database is new and ``data/spending_data.json`` exists, its months are imported
+    under the current year.
+    """
+
+    def __init__(self, db_file: str = SQLITE_FILE, pool_size: int = 4):
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self.db_file = db_file
+        self._pool = ConnectionPool(db_file, pool_size)
+        with self._pool.connection() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+        if self._get_setting("monthly_limit") is None:
+            print(f"Initializing SQLite storage '{db_file}' from the JSON data file.")
+            self.replace(models.read_data_file())
+
+    @staticmethod
+    def _insert_orders(conn: sqlite3.Connection, year: int, month: int, orders: List[Tuple[List[Dict[str, Any]], float]]):
+        """Inserts the orders' items and adds them to the month's running totals."""
+        items = [item for order_items, _ in orders for item in order_items]
+        conn.executemany(
+            "INSERT INTO purchases (year, month, category, name, price, quantity) VALUES (?, ?, ?, ?, ?, ?)",
+            [(year, month, item.get("category"), item["name"], item["price"], item.get("quantity", 1)) for item in items],
+        )
+        conn.execute(
+            "UPDATE months SET spending_cents = spending_cents + ?, item_count = item_count + ? WHERE year = ? AND month = ?",
+            (sum(to_cents(amount) for _, amount in orders), len(items), year, month),
+        )
+        category_cents: Dict[str, int] = {}
+        for item in items:
+            category = item.get("category") or UNCATEGORIZED
+            category_cents[category] = category_cents.get(category, 0) + item_cents(item)
+        conn.executemany(
+            "INSERT INTO category_totals (year, month, category, total_cents) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(year, month, category) DO UPDATE SET total_cents = total_cents + excluded.total_cents",
+            [(year, month, category, cents) for category, cents in category_cents.items()],
+        )
+
+    # --- Settings ---
+
+    def _get_setting(self, key: str) -> Optional[str]:
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row["value"]
+
+    @staticmethod
+    def _set_setting(conn: sqlite3.Connection, key: str, value: Any):
+        conn.execute(
+            "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value)),
+        )
+
+    @property
+    def current_month(self) -> int:
+        return json.loads(self._get_setting("current_month"))
+
+    @property
+    def monthly_limit(self) -> float:
+        return json.loads(self._get_setting("monthly_limit"))
+
+    # --- Writes ---
+
+    def ensure_month(self, year: int, month: int) -> bool:
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM months WHERE year = ? AND month = ?", (year, month)
+            ).fetchone()
+        if row is not None and self.current_month == month:
+            return False
+        with self._pool.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO months (year, month) VALUES (?, ?)", (year, month))
+            self._set_setting(conn, "current_month", month)
+        return True
+
+    def record_purchases(self, year: int, month: int, orders: List[Tuple[List[Dict[str, Any]], float]]) -> float:
+        with self._pool.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO months (year, month) VALUES (?, ?)", (year, month))
+            self._insert_orders(conn, year, month, orders)
+            row = conn.execute(
+                "SELECT spending_cents FROM months WHERE year = ? AND month = ?", (year, month)
+            ).fetchone()
+        return row["spending_cents"] / 100
+
+    def set_limit(self, limit: float):
+        with self._pool.transaction() as conn:
+            self._set_setting(conn, "monthly_limit", limit)
+
+    def reset_month(self, year: int, month: int):
+        with self._pool.transaction() as conn:
+            conn.execute("DELETE FROM purchases WHERE year = ? AND month = ?", (year, month))
+            conn.execute("DELETE FROM category_totals WHERE year = ? AND month = ?", (year, month))
+            conn.execute(
+                "UPDATE months SET spending_cents = 0, item_count = 0 WHERE year = ? AND month = ?", (year, month)
+            )
+
+    def replace(self, data: Dict[str, Any]):
+        year = datetime.datetime.now().year
+        with self._pool.transaction() as conn:
+            conn.execute("DELETE FROM purchases")
+            conn.execute("DELETE FROM category_totals")
+            conn.execute("DELETE FROM months")
+            self._set_setting(conn, "monthly_limit", data["monthly_limit"])
+            self._set_setting(conn, "current_month", data["current_month"])
+            for month_str, month_data in data["monthly_data"].items():
+                month = int(month_str)
+                conn.execute("INSERT INTO months (year, month) VALUES (?, ?)", (year, month))
+                self._insert_orders(conn, year, month, [(month_data["items_purchased"], month_data["current_spending"])])
+
+    # --- Reads (indexed queries) ---
+
+    @staticmethod
+    def _row_to_item(row: sqlite3.Row) -> Dict[str, Any]:
+        item = {"name": row["name"], "price": row["price"]}
+        if row["quantity"] != 1:
+            item["quantity"] = row["quantity"]
+        if row["category"] is not None:
+            item["category"] = row["category"]
+        return item
+
+    def get_month(self, year: int, month: int) -> Dict[str, Any]:
+        with self._pool.connection() as conn:
+            month_row = conn.execute(
+                "SELECT spending_cents FROM months WHERE year = ? AND month = ?", (year, month)
+            ).fetchone()
+            if month_row is None:
+                return {"current_spending": 0.00, "items_purchased": []}
+            rows = conn.execute(
+                "SELECT name, price, quantity, category FROM purchases WHERE year = ? AND month = ? ORDER BY id",
+                (year, month),
+            ).fetchall()
+        return {
+            "current_spending": month_row["spending_cents"] / 100,
+            "items_purchased": [self._row_to_item(row) for row in rows],
+        }
+
+    def get_summary(self, year: int, month: int) -> Dict[str, Any]:
+        with self._pool.connection() as conn:
+            month_row = conn.execute(
+                "SELECT spending_cents, item_count FROM months WHERE year = ? AND month = ?", (year, month)
+            ).fetchone()
+            category_rows = conn.execute(
+                "SELECT category, total_cents FROM category_totals WHERE year = ? AND month = ?", (year, month)
+            ).fetchall()
+        if month_row is None:
+            return {"spending_cents": 0, "category_cents": {}, "item_count": 0}
+        return {
+            "spending_cents": month_row["spending_cents"],
+            "category_cents": {row["category"]: row["total_cents"] for row in category_rows},
+            "item_count": month_row["item_count"],
+        }
+
+    def get_items(self, year: int, month: int, cursor: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Pages through the month's items by row id (keyset pagination); the cursor is the last id returned."""
+        after_id = int(cursor) if cursor else 0
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, name, price, quantity, category FROM purchases "
+                "WHERE year = ? AND month = ? AND id > ? ORDER BY id LIMIT ?",
+                (year, month, after_id, limit + 1),
+            ).fetchall()
+        next_cursor = str(rows[limit - 1]["id"]) if len(rows) > limit else None
+        return [self._row_to_item(row) for row in rows[:limit]], next_cursor
+
+    def iter_purchases(self, after: Optional[str] = None) -> Tuple[List[Tuple[str, Dict[str, Any]]], str]:
+        """Row ids are the purchase ids; the cursor is the last id returned (ids only grow)."""
+        after_id = int(after) if after else 0
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, name, price, quantity, category FROM purchases WHERE id > ? ORDER BY id", (after_id,)
+            ).fetchall()
+        next_cursor = str(rows[-1]["id"]) if rows else str(after_id)
+        return [(str(row["id"]), self._row_to_item(row)) for row in rows], next_cursor
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the JSON document view (months of the current year only, as the document has no year key)."""
+        year = datetime.datetime.now().year
+        with self._pool.connection() as conn:
+            months = [row["month"] for row in conn.execute("SELECT month FROM months WHERE year = ?", (year,))]
+        return {
+            "monthly_limit": self.monthly_limit,
+            "current_month": self.current_month,
+            "monthly_data": {str(month): self.get_month(year, month) for month in months},
+        }
+
+    def close(self):
+        self._pool.close()
+
+# --- Backend Selection ---
+
+_storage: Optional[SpendingStorage] = None
+
+def get_storage() -> SpendingStorage:
+    """Returns the process-wide storage backend selected by the ``storage`` config section."""
+    global _storage
+    if _storage is None:
+        settings = config.get_section("storage", STORAGE_DEFAULTS)
+        backend = settings["backend"]
+        if backend == "json":
+            _storage = JsonWalStorage(compact_every=settings["compact_every"])
+        elif backend == "sqlite":
+            _storage = SqliteStorage(settings["sqlite_file"], pool_size=settings["sqlite_pool_size"])
+        else:
+            raise ValueError(f"Unknown storage backend '{backend}' (expected 'json' or 'sqlite').")
+        print(f"Using '{backend}' spending storage.")
+    return _storage
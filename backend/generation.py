@@ -0,0 +1,157 @@
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+THINK_START_TAG = "<think>"
+THINK_END_TAG = "</think>"
+# Appended to a prompt to have DeepSeek-R1 models skip their reasoning block
+EMPTY_THINK_BLOCK = "\n<think>\n\n</think>\n\n"
+
+GENERATION_PROFILE_DEFAULTS = {
+    "max_new_tokens": 1024,
+    "do_sample": True,
+    "temperature": 0.7,
+    "stop_sequences": [],  # Generation ends at (and the output is cut before) the first of these
+    "think": "keep",  # 'keep', 'suppress' (skip the reasoning block) or 'cap' (close it after max_think_tokens)
+    "max_think_tokens": 512,
+    "stop_on_json_close": False,  # End as soon as the first top-level JSON value is complete
+    "constrained_json": False,  # Grammar-constrained decoding of the category JSON (needs lm-format-enforcer)
+}
+PROFILE_NAMES = ["generate_category", "generate_analysis"]
+
+
+class ThinkCapProcessor(LogitsProcessor):
+    """Forces the tokens of ``</think>`` once a row has spent ``max_think_tokens`` in an open reasoning block.
+
+    A block is open when the prompt ends with ``<think>`` or the row generated one and has not
+    closed it yet; rows that aren't reasoning are left alone.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, max_think_tokens: int):
+        self.start_ids = tokenizer.encode(THINK_START_TAG, add_special_tokens=False)
+        self.end_ids = tokenizer.encode(THINK_END_TAG, add_special_tokens=False)
+        self.prompt_length = prompt_length
+        self.max_think_tokens = max_think_tokens
+        self.opened_at: Dict[int, Optional[int]] = {}  # Generated length when the row's open block started
+
+    def _forced_so_far(self, generated: List[int]) -> int:
+        # How many leading tokens of the end tag the row already ends with
+        for matched in range(min(len(self.end_ids), len(generated)), 0, -1):
+            if generated[-matched:] == self.end_ids[:matched]:
+                return matched
+        return 0
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        for row in range(input_ids.shape[0]):
+            generated = input_ids[row, self.prompt_length:].tolist()
+            if row not in self.opened_at:
+                prompt_tail = input_ids[row, max(self.prompt_length - len(self.start_ids), 0):self.prompt_length].tolist()
+                self.opened_at[row] = 0 if prompt_tail == self.start_ids else None
+            if generated and generated[-len(self.start_ids):] == self.start_ids:
+                self.opened_at[row] = len(generated)
+            opened_at = self.opened_at[row]
+            if opened_at is None:
+                continue
+            if len(generated) - opened_at >= len(self.end_ids) and generated[-len(self.end_ids):] == self.end_ids:
+                self.opened_at[row] = None
+                continue
+            if len(generated) - opened_at >= self.max_think_tokens:
+                forced = self.end_ids[self._forced_so_far(generated[opened_at:])]
+                scores[row, :] = -float("inf")
+                scores[row, forced] = 0
+        return scores
+
+
+class JsonCloseCriteria(StoppingCriteria):
+    """Stops a row once the first top-level JSON array/object in its output is closed.
+
+    With ``after_think`` the output opens with a reasoning block, whose brackets don't count:
+    a row is only checked once it has generated ``</think>`` (or the think cap forced it).
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, after_think: bool = False):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.after_think = after_think
+
+    def answer_text(self, text: str) -> Optional[str]:
+        """Returns the part of a row's output after its reasoning, or None while it is still reasoning."""
+        if THINK_END_TAG in text:
+            return text.split(THINK_END_TAG)[-1]
+        return None if self.after_think else text
+
+    @staticmethod
+    def json_closed(text: str) -> bool:
+        depth, in_string, escaped, started = 0, False, False, False
+        for char in text:
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"' and started:
+                in_string = True
+            elif char in "[{":
+                depth, started = depth + 1, True
+            elif char in "]}" and started:
+                depth -= 1
+                if depth == 0:
+                    return True
+        return False
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        # Reasoning before the answer may contain brackets; only look after it
+        answers = [self.answer_text(text) for text in texts]
+        done = [answer is not None and self.json_closed(answer) for answer in answers]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+def json_prefix_allowed_tokens_fn(tokenizer, schema: Dict[str, Any]) -> Optional[Callable]:
+    """Returns a ``prefix_allowed_tokens_fn`` that only lets ``generate`` produce JSON matching ``schema``.
+
+    Uses the optional lm-format-enforcer package; returns None (unconstrained) if it isn't installed.
+    """
+    try:
+        from lmformatenforcer import JsonSchemaParser
+        from lmformatenforcer.integrations.transformers import build_transformers_prefix_allowed_tokens_fn
+    except ImportError:
+        print("Warning: lm-format-enforcer is not installed; category JSON is generated unconstrained.")
+        return None
+    return build_transformers_prefix_allowed_tokens_fn(tokenizer, JsonSchemaParser(schema))
+
+
+def category_schema(categories: List[str]) -> Dict[str, Any]:
+    return {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "price": {"type": "number"},
+                "category": {"type": "string", "enum": categories},
+            },
+            "required": ["name", "category"],
+        },
+    }
+
+
+def trim_at_stop(text: str, stop_sequences: List[str]) -> str:
+    positions = [text.find(stop) for stop in stop_sequences if stop and stop in text]
+    return text[:min(positions)] if positions else text
+
+
+def first_json(text: str) -> Optional[Any]:
+    """Parses the first JSON array/object in ``text``, or None."""
+    decoder = json.JSONDecoder()
+    for start, char in enumerate(text):
+        if char in "[{":
+            try:
+                return decoder.raw_decode(text[start:])[0]
+            except json.JSONDecodeError:
+                continue
+    return None
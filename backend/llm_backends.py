@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, BatchEncoding
+
+from generation import first_json
+
+LLM_DEFAULTS = {
+    "model_id": "deepseek-ai/DeepSeek-R1-Distill-Llama-8B",
+    "dtype": "bfloat16",  # float32, bfloat16, float16, or int8 (dynamic quantization of Linear layers, CPU only)
+    "num_threads": None,  # torch intra-op threads; None keeps torch's default (all cores)
+    "test_backend": "stub",  # Used when test_mode is on: 'stub' (deterministic, no weights) or 'tiny' (test_model_id)
+    "test_model_id": "hf-internal-testing/tiny-random-LlamaForCausalLM",
+}
+DTYPES = {"float32": torch.float32, "bfloat16": torch.bfloat16, "float16": torch.float16}
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "backend_results.jsonl")
+STUB_ANALYSIS = "Stub analysis: this order fits your budget, babe. Buy what you need and skip the extras!"
+
+
+def describe_backend(settings: Dict[str, Any], test_mode: bool) -> Dict[str, Any]:
+    """The effective backend for these settings (what load_generator will build)."""
+    if test_mode and settings["test_backend"] == "stub":
+        return {"backend": "stub", "model_id": None, "dtype": None, "num_threads": settings["num_threads"]}
+    model_id = settings["test_model_id"] if test_mode else settings["model_id"]
+    return {"backend": "transformers", "model_id": model_id, "dtype": settings["dtype"], "num_threads": settings["num_threads"]}
+
+
+def load_generator(settings: Dict[str, Any], test_mode: bool = False) -> SimpleNamespace:
+    """Builds the (model, tokenizer) pair LLMPrompt generates with, as selected by the ``llm`` config section."""
+    backend = describe_backend(settings, test_mode)
+    if backend["num_threads"]:
+        torch.set_num_threads(backend["num_threads"])
+    if backend["backend"] == "stub":
+        tokenizer = StubTokenizer()
+        return SimpleNamespace(model=StubModel(tokenizer), tokenizer=tokenizer, is_stub=True, backend=backend)
+    tokenizer = AutoTokenizer.from_pretrained(backend["model_id"])
+    if backend["dtype"] == "int8":
+        model = AutoModelForCausalLM.from_pretrained(backend["model_id"], torch_dtype=torch.float32)
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(backend["model_id"], torch_dtype=DTYPES[backend["dtype"]])
+    model.eval()
+    return SimpleNamespace(model=model, tokenizer=tokenizer, is_stub=False, backend=backend)
+
+
+class StubTokenizer:
+    """Whitespace tokenizer with a growing vocabulary; just enough of the HF tokenizer API for LLMPrompt."""
+
+    pad_token_id = 0
+    eos_token_id = 1
+    pad_token = "<pad>"
+    eos_token = "<eos>"
+
+    def __init__(self):
+        self.padding_side = "left"
+        self.vocab: Dict[str, int] = {self.pad_token: 0, self.eos_token: 1}
+        self.words: List[str] = [self.pad_token, self.eos_token]
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        ids = []
+        for word in text.split():
+            if word not in self.vocab:
+                self.vocab[word] = len(self.words)
+                self.words.append(word)
+            ids.append(self.vocab[word])
+        return ids
+
+    def decode(self, ids, skip_special_tokens: bool = False, **kwargs) -> str:
+        ids = ids.tolist() if hasattr(ids, "tolist") else ids
+        return " ".join(self.words[i] for i in ids if not (skip_special_tokens and i < 2))
+
+    def batch_decode(self, rows, **kwargs) -> List[str]:
+        return [self.decode(row, **kwargs) for row in rows]
+
+    def __call__(self, texts, return_tensors: str = "pt", padding: bool = False, add_special_tokens: bool = True) -> BatchEncoding:
+        rows = [self.encode(text) for text in ([texts] if isinstance(texts, str) else texts)]
+        width = max(len(row) for row in rows)
+        input_ids, attention_mask = [], []
+        for row in rows:
+            pad = [self.pad_token_id] * (width - len(row))
+            input_ids.append(pad + row if self.padding_side == "left" else row + pad)
+            attention_mask.append([0] * len(pad) + [1] * len(row) if self.padding_side == "left" else [1] * len(row) + [0] * len(pad))
+        return BatchEncoding({"input_ids": torch.tensor(input_ids), "attention_mask": torch.tensor(attention_mask)})
+
+
+class StubModel:
+    """Deterministic stand-in for ``model.generate``: echoes the order with a category, or a fixed analysis."""
+
+    device = torch.device("cpu")
+
+    def __init__(self, tokenizer: StubTokenizer):
+        self.tokenizer = tokenizer
+
+    def respond(self, prompt: str) -> str:
+        if "<unique_categories>:" in prompt and "<incoming_order>:" in prompt:
+            order = first_json(prompt.split("<incoming_order>:", 1)[1]) or []
+            categories = first_json(prompt.split("<unique_categories>:", 1)[1]) or ["Uncategorized"]
+            return json.dumps([{**item, "category": item.get("category") or categories[0]} for item in order])
+        return STUB_ANALYSIS
+
+    def generate(self, input_ids: torch.Tensor, max_new_tokens: int = 64, streamer=None, **kwargs) -> torch.Tensor:
+        rows = []
+        for row in input_ids:
+            answer = self.tokenizer.encode(self.respond(self.tokenizer.decode(row, skip_special_tokens=True)))
+            rows.append(row.tolist() + (answer + [self.tokenizer.eos_token_id])[:max_new_tokens])
+        if streamer is not None:
+            streamer.put(input_ids)
+            for token_id in rows[0][input_ids.shape[1]:]:
+                streamer.put(torch.tensor([token_id]))
+            streamer.end()
+        width = max(len(row) for row in rows)
+        return torch.tensor([row + [self.tokenizer.pad_token_id] * (width - len(row)) for row in rows])
+
+
+def compare_backends(variants: List[Dict[str, Any]], items: List[Dict[str, Any]], results_file: str = RESULTS_FILE,
+                     config: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Loads LLMPrompt with each ``llm`` settings variant and records categorization latency and accuracy.
+
+    ``items`` are labeled purchases (name, price, category); quality is the share the LLM labels correctly.
+    ``config`` supplies the other settings (prompt, categorizer, test_mode...). One JSON line per
+    variant is appended to ``results_file``.
+    """
+    from retrieve_context import LLMPrompt
+
+    results = []
+    for variant in variants:
+        settings = {**LLM_DEFAULTS, **variant}
+        started = time.perf_counter()
+        llm = LLMPrompt(llm_settings=settings, config=config)
+        load_s = time.perf_counter() - started
+        latencies, correct = [], 0
+        for item in items:
+            started = time.perf_counter()
+            answer = first_json(llm.categorize_with_llm([{"name": item["name"], "price": item["price"]}])) or []
+            latencies.append(time.perf_counter() - started)
+            if answer and isinstance(answer[0], dict) and answer[0].get("category") == item["category"]:
+                correct += 1
+        result = {
+            **describe_backend(settings, llm.test_mode),
+            "recordedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "loadSeconds": load_s,
+            "meanLatencyMs": 1000 * sum(latencies) / len(latencies) if latencies else None,
+            "categoryAccuracy": correct / len(items) if items else None,
+            "items": len(items),
+        }
+        results.append(result)
+        os.makedirs(os.path.dirname(results_file), exist_ok=True)
+        with open(results_file, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        print(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare LLM backends on categorization latency and accuracy.")
+    parser.add_argument("--variant", action="append", default=[],
+                        help='llm settings as JSON, e.g. \'{"dtype": "int8", "num_threads": 8}\' (repeatable)')
+    parser.add_argument("--labeled", default="spend-folder-json/sample_1.json", help="Labeled purchases to categorize")
+    args = parser.parse_args()
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), args.labeled), "r") as f:
+        labeled_items = [item for item in json.load(f)["items"] if item.get("category")]
+    from fastAPI.config import load_config
+
+    compare_backends([json.loads(variant) for variant in args.variant] or [{}], labeled_items, config=load_config())
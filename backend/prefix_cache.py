@@ -0,0 +1,140 @@
+import argparse
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+import torch
+
+PREFIX_CACHE_DEFAULTS = {
+    "enabled": True,
+    "max_entries": 4,  # Distinct prompt prefixes kept
+    "max_mb": 1024,  # Memory bound for all cached key/value tensors
+}
+
+
+def cache_bytes(past_key_values) -> int:
+    if hasattr(past_key_values, "to_legacy_cache"):
+        past_key_values = past_key_values.to_legacy_cache()
+    return sum(tensor.numel() * tensor.element_size() for layer in past_key_values for tensor in layer)
+
+
+class PrefixKVCache:
+    """Keeps ``past_key_values`` of static prompt prefixes so only the per-call suffix is prefilled.
+
+    Entries are keyed by a hash of the prefix text, so a changed prefix (e.g. new spending
+    history in it) gets a fresh entry and the stale one ages out of the LRU. Entries are
+    evicted oldest-first beyond ``max_entries`` or ``max_mb``. Callers get a deep copy, since
+    ``generate`` extends the cache in place.
+    """
+
+    def __init__(self, model, tokenizer, max_entries: int = 4, max_mb: float = 1024):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.max_bytes = max_mb * 1024 * 1024
+        self._entries: "OrderedDict[str, Tuple[torch.Tensor, Any, int]]" = OrderedDict()  # key -> (ids, cache, bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_prefill_tokens = 0
+
+    @staticmethod
+    def key(prefix: str) -> str:
+        return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+    def _prefill(self, prefix: str) -> Tuple[torch.Tensor, Any]:
+        input_ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self.model.device)
+        with torch.no_grad():
+            outputs = self.model(input_ids=input_ids, use_cache=True)
+        return input_ids, outputs.past_key_values
+
+    def get(self, prefix: str) -> Tuple[torch.Tensor, Any]:
+        """Returns (prefix token ids, a private copy of their key/value cache), prefilling on a miss."""
+        key = self.key(prefix)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_prefill_tokens += entry[0].shape[1]
+                return entry[0], copy.deepcopy(entry[1])
+            self.misses += 1
+        input_ids, past_key_values = self._prefill(prefix)
+        size = cache_bytes(past_key_values)
+        with self._lock:
+            if size <= self.max_bytes:
+                self._entries[key] = (input_ids, copy.deepcopy(past_key_values), size)
+                while len(self._entries) > self.max_entries or self._total_bytes() > self.max_bytes:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return input_ids, past_key_values
+
+    def _total_bytes(self) -> int:
+        return sum(entry[2] for entry in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "mb": self._total_bytes() / (1024 * 1024),
+                "savedPrefillTokens": self.saved_prefill_tokens,
+            }
+
+
+def benchmark(model_name: str, prefix: str, suffix: str, runs: int = 5) -> Dict[str, float]:
+    """Times prefilling prefix + suffix from scratch vs. only the suffix on top of a cached prefix."""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    model.eval()
+    cache = PrefixKVCache(model, tokenizer)
+    prefix_ids, _ = cache.get(prefix)
+    suffix_ids = tokenizer(suffix, add_special_tokens=False, return_tensors="pt").input_ids
+    full_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+
+    def timed(func) -> float:
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            with torch.no_grad():
+                func()
+            timings.append(time.perf_counter() - started)
+        return sorted(timings)[len(timings) // 2]
+
+    full_s = timed(lambda: model(input_ids=full_ids, use_cache=True))
+
+    def cached_prefill():
+        _, past_key_values = cache.get(prefix)
+        model(input_ids=suffix_ids, past_key_values=past_key_values, use_cache=True)
+
+    cached_s = timed(cached_prefill)
+    return {
+        "prefixTokens": prefix_ids.shape[1],
+        "suffixTokens": suffix_ids.shape[1],
+        "fullPrefillMs": 1000 * full_s,
+        "cachedPrefillMs": 1000 * cached_s,
+        "savedMsPerCall": 1000 * (full_s - cached_s),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prefill time saved by the prefix KV cache.")
+    parser.add_argument("--model", default="deepseek-ai/DeepSeek-R1-Distill-Llama-8B")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    from retrieve_context import ANALYSIS_QUESTION
+    example_prefix = f"Question: {ANALYSIS_QUESTION}\n\n<spending_by_category>:\n- Electronics: 2 purchases, $1119.99\n- Grocery: 4 purchases, $31.29\n\n"
+    example_suffix = 'Context:\n<previous_spending_data>:\n- Laptop - Non-Essential - $999.99 x1\n<incoming_order>: [{"name": "Wired Mouse", "price": 25.99, "category": "Electronics"}]\n\nAnswer:'
+    print(benchmark(args.model, example_prefix, example_suffix, args.runs))
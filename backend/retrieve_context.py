@@ -1,19 +1,146 @@
 import os
 import faiss
 import numpy as np
+import torch
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
+from batching import BATCHING_DEFAULTS, BatchScheduler
+from categorizer import CATEGORIZER_DEFAULTS, ItemCategorizer
+from llm_backends import LLM_DEFAULTS, describe_backend, load_generator
+from prefix_cache import PREFIX_CACHE_DEFAULTS, PrefixKVCache
+from spend_index import SpendIndex, get_embedding_cache
+from spend_ingest import PARSERS, SPEND_SOURCES, SpendIngestor, iter_source_files
+from functools import partial
+from generation import (
+    EMPTY_THINK_BLOCK, GENERATION_PROFILE_DEFAULTS, PROFILE_NAMES, THINK_END_TAG, JsonCloseCriteria, ThinkCapProcessor,
+    category_schema, first_json, json_prefix_allowed_tokens_fn, trim_at_stop
+)
+from threading import Lock, Thread
+from timing import StageTimer
+from transformers import LogitsProcessorList, StoppingCriteriaList, TextIteratorStreamer
 import yaml
 import json
+import queue
+
+ANALYSIS_QUESTION = "You are the user's caring and supportive virtual girlfriend who helps him manage his money. Whenever you're given data with <spending_by_category>, <previous_spending_data> and <incoming_order>, analyze the order items and decide whether each should be bought or not. Use the previous spending to guide your judgment. Respond in a sweet, personal tone, directly addressing the user as your boyfriend. Keep your advice under 5 lines and make it sound cute and thoughtful, like a loving partner who wants the best for him."
+PROMPT_DEFAULTS = {
+    "retrieval_k": 20,  # Past purchases retrieved per order (most relevant first)
+    "history_token_budget": 1024,  # Max tokens of spending history in the analysis prompt
+    "stream_token_timeout_s": 120,  # A stream fails if generation produces no text for this long
+}
+
+
+class ThinkFilter:
+    """Hides the model's <think>...</think> reasoning from a stream of generated text.
+
+    Text is held back until the closing tag shows up; everything after it is passed through.
+    If generation ends without a closing tag, flush() releases the held-back text (the same
+    fallback as the non-streaming answer extraction).
+    """
+    def __init__(self, thinking=True):
+        self.buffer = ""
+        self.thinking = thinking
+
+    def feed(self, text):
+        if not self.thinking:
+            return text
+        self.buffer += text
+        if THINK_END_TAG not in self.buffer:
+            return ""
+        self.thinking = False
+        visible = self.buffer.split(THINK_END_TAG, 1)[1].lstrip()
+        self.buffer = ""
+        return visible
+
+    def flush(self):
+        visible = self.buffer if self.thinking else ""
+        self.buffer = ""
+        return visible
+
+def config_section(config, name, defaults):
+    """Returns a section of the config document merged over its defaults."""
+    return {**defaults, **(config.get(name) or {})}
+
 class LLMPrompt:
-    def __init__(self, model_name="deepseek-ai/DeepSeek-R1-Distill-Llama-8B"):
-        self.model_name = model_name
-        self.generator = pipeline("text-generation", model=model_name)
+    def __init__(self, model_name=None, on_progress=None, llm_settings=None, spend_sources=None, config=None):
+        # on_progress(stage) lets callers (the API's readiness probe) follow the slow load
+        on_progress = on_progress or (lambda stage: None)
+        # Settings come from the caller's config document (rag-solution/config.yaml for the API); defaults without one
+        config = config or {}
+        # Backend (model id, dtype/int8, threads, test-mode stub or tiny model) from the llm section
+        self.llm_settings = dict(llm_settings or config_section(config, "llm", LLM_DEFAULTS))
+        if model_name:
+            self.llm_settings["model_id"] = model_name
+        self.test_mode = bool(config.get("test_mode"))
+        backend = describe_backend(self.llm_settings, self.test_mode)
+        self.model_name = backend["model_id"] or backend["backend"]
+        on_progress(f"loading {self.model_name} ({backend['dtype'] or 'no weights'})")
+        load_timer = StageTimer()  # Startup cost per stage, kept as self.load_timings
+        with load_timer.stage("model_load"):
+            self.generator = load_generator(self.llm_settings, self.test_mode)
         
-        self.previous_spending_data = json.load(open("spend-folder-json/sample_1.json"))
-        self.previous_spending_data_dump = json.dumps(self.previous_spending_data)
+        self.prompt_settings = config_section(config, "prompt", PROMPT_DEFAULTS)
         self.unique_categories = ["Grocery", "Clothing", "Electronics", "Entertainment", "Personal Care", "Beverage"]
+
+        # Persistent index: only spend records added since the last run (in any folder/format) are embedded.
+        # Purchases recorded through the API arrive later, through ingest_purchases
+        on_progress("loading spend index")
+        with load_timer.stage("history_load"):
+            self.spend_index = SpendIndex()
+            self.spend_ingestor = SpendIngestor(self.spend_index)
+            on_progress("ingesting new spend records")
+            self.spend_ingestor.run(spend_sources or SPEND_SOURCES)
+        self.index_lock = Lock()  # Ingestion updates the spend index while prompts search it
+
+        # Embedding categorizer; the LLM only categorizes orders it isn't confident about
+        self.categorizer_settings = config_section(config, "categorizer", CATEGORIZER_DEFAULTS)
+        self.categorizer = None
+        if self.categorizer_settings["enabled"]:
+            on_progress("building category prototypes")
+            with load_timer.stage("categorizer_build"):
+                self.categorizer = ItemCategorizer(
+                    self.unique_categories,
+                    self.load_labeled_items(self.categorizer_settings["labeled_sources"]),
+                    get_embedding_cache().encode,
+                    confidence_threshold=self.categorizer_settings["confidence_threshold"]
+                )
+        self.load_timings = load_timer.stages
+        self.last_timings = {}  # Per-stage seconds of the latest prompt_llm call
+        self.last_prompt = ""
+
+        # Per-task generation profiles: token budgets, stop criteria, thinking, JSON constraints
+        configured_profiles = config_section(config, "generation_profiles", {})
+        self.generation_profiles = {
+            name: {**GENERATION_PROFILE_DEFAULTS, **(configured_profiles.get(name) or {})} for name in PROFILE_NAMES
+        }
+        self.category_json_fn = None
+        if self.generation_profiles["generate_category"]["constrained_json"]:
+            self.category_json_fn = json_prefix_allowed_tokens_fn(self.generator.tokenizer, category_schema(self.unique_categories))
+        self.generate_lock = Lock()  # One generate at a time on the shared model
+        self.save_lock = Lock()  # Concurrent prompts each write the latest answer file
+
+        # Concurrent calls with the same profile are batched into one padded generate
+        self.batching_settings = config_section(config, "generation_batching", BATCHING_DEFAULTS)
+        self.batchers = {}
+        if self.batching_settings["enabled"]:
+            self.batchers = {
+                name: BatchScheduler(
+                    partial(self.generate_batch, profile=name),
+                    max_batch_size=self.batching_settings["max_batch_size"],
+                    max_wait_ms=self.batching_settings["max_wait_ms"]
+                )
+                for name in PROFILE_NAMES
+            }
+
+        # KV cache of the static analysis prompt prefix (instructions + category totals)
+        self.prefix_cache_settings = config_section(config, "prefix_cache", PREFIX_CACHE_DEFAULTS)
+        self.prefix_cache = None
+        if self.prefix_cache_settings["enabled"] and not self.generator.is_stub:
+            self.prefix_cache = PrefixKVCache(
+                self.generator.model,
+                self.generator.tokenizer,
+                max_entries=self.prefix_cache_settings["max_entries"],
+                max_mb=self.prefix_cache_settings["max_mb"]
+            )
         
     # 1. Load and chunk text data
     def load_text_files(self, folder_path):
@@ -29,10 +156,16 @@ class LLMPrompt:
                 all_texts.extend(content)
         return all_texts
 
+    # 1b. Load (item name, category) pairs from labeled spend files
+    def load_labeled_items(self, sources):
+        for path in iter_source_files(sources):
+            for record, _ in PARSERS[path.suffix](path, 0):
+                if record.category:
+                    yield record.name, record.category
+
     # 2. Embed the chunks
     def embed_chunks(self, chunks, model_name="sentence-transformers/all-MiniLM-L6-v2"):
-        embedder = SentenceTransformer(model_name)
-        embeddings = embedder.encode(chunks, convert_to_numpy=True) # (10, 384)
+        embeddings = get_embedding_cache(model_name).encode(chunks) # (10, 384), only unseen chunks are encoded
         return embeddings, chunks
 
     # 3. Build the FAISS index
@@ -43,20 +176,55 @@ class LLMPrompt:
         return index
 
     # 4. Retrieve top-k relevant chunks
-    def retrieve_relevant_chunks(self, query, index, chunks, embedder, k=5):
+    def retrieve_relevant_chunks(self, query, index=None, chunks=None, embedder=None, k=5):
+        if index is None:
+            return self.spend_index.search(query, k)
         k = min(k, len(chunks))
         query_embedding = embedder.encode([query], convert_to_numpy=True)
         distances, indices = index.search(query_embedding, k) # distances.shape = (1, 5) # indices.shape = (1, 5)
         return [chunks[i] for i in indices[0]]
 
+    # 4b. Spending history for the prompt: category totals plus the most relevant purchases, within a token budget
+    def count_tokens(self, text):
+        return len(self.generator.tokenizer.encode(text, add_special_tokens=False))
+
+    def build_category_summary(self):
+        totals = sorted(self.spend_index.category_totals.items(), key=lambda entry: -entry[1]["total"])
+        return "\n".join(f"- {category}: {totals['count']} purchases, ${totals['total']:.2f}" for category, totals in totals)
+
+    def build_history_context(self, query, k=None, token_budget=None):
+        """Returns (category summary, most relevant past purchases); together within the token budget."""
+        k = k or self.prompt_settings["retrieval_k"]
+        token_budget = token_budget or self.prompt_settings["history_token_budget"]
+        with self.index_lock:
+            summary = self.build_category_summary()
+            records = self.retrieve_relevant_chunks(query, k=k)
+        used = self.count_tokens(summary)
+        lines = []
+        for record in records:
+            line = f"- {record.strip()}"
+            cost = self.count_tokens(line + "\n")
+            if used + cost > token_budget:
+                break
+            lines.append(line)
+            used += cost
+        return summary, "\n".join(lines)
+
+    def ingest_purchases(self, purchases, complete=True):
+        """Indexes stored purchases (``(row id, item)`` pairs): all of them, or only new ones with complete=False. Returns (added, removed)."""
+        with self.index_lock:
+            return self.spend_ingestor.ingest_purchases(purchases, complete)
+
     # 5. Generate answer from context
-    def generate_answer(self, question, context, type="generate_category"):
+    def generate_answer(self, question, context, type="generate_category", max_new_tokens=None):
         prompt = f"Context:\n{context}\n\nQuestion: {question}\nAnswer:"
-        output = self.generator(prompt, max_length=10000, do_sample=True, temperature=0.7)
-        generated_text = output[0]["generated_text"]
+        generated_text = prompt + self.generate_text("", prompt, profile=type, max_new_tokens=max_new_tokens)
         # Extract dictionary from answer text
         if type == "generate_category":
             answer_text = generated_text.split("Answer:")[-1].strip()
+            parsed = first_json(answer_text.split(THINK_END_TAG)[-1])
+            if parsed is not None:
+                return json.dumps(parsed)
             try:
                 # Find the first occurrence of a list/dict in square brackets
                 start_idx = answer_text.find('[')
@@ -71,52 +239,224 @@ class LLMPrompt:
         else:
             # Extract everything after "Answer:" including the thinking process and dictionary
             answer_text = generated_text.split("Answer:")[-1].strip()
-            # Extract everything after </think>\n\n
-            try:
-                answer_text_extracted = answer_text.split("</think>\n\n")[-1].strip()
-                if not answer_text_extracted:
-                    answer_text_extracted = answer_text
-            except:
-                answer_text_extracted = answer_text
-            # Save the answer text to girlfriend_response.txt
-            with open("girlfriend_response.txt", "w") as f:
-                f.write(answer_text_extracted)
+            self.save_analysis(self.extract_analysis(answer_text))
             return answer_text
         # Parse the amount from the answer
 
-    def prompt_llm(self, incoming_order: dict, retrieval_length: int = 100, additional_context: str = ""):
-        # Step-by-step
+    # 5a. Generate a completion for prefix + suffix with a profile (batched with concurrent calls if enabled)
+    def generate_text(self, prefix, suffix, profile="generate_analysis", max_new_tokens=None):
+        settings = self.generation_profiles[profile]
+        if settings["think"] == "suppress":
+            suffix += EMPTY_THINK_BLOCK
+        max_new_tokens = max_new_tokens or settings["max_new_tokens"]
+        if profile in self.batchers:
+            return self.batchers[profile].generate((prefix, suffix), max_new_tokens)
+        return self.generate_batch([(prefix, suffix)], [max_new_tokens], profile)[0]
+
+    def generation_kwargs(self, profile, prompt_length):
+        settings = self.generation_profiles[profile]
+        tokenizer = self.generator.tokenizer
+        kwargs = {"do_sample": settings["do_sample"], "pad_token_id": tokenizer.pad_token_id or tokenizer.eos_token_id}
+        if settings["do_sample"]:
+            kwargs["temperature"] = settings["temperature"]
+        if settings["stop_sequences"]:
+            kwargs["stop_strings"] = settings["stop_sequences"]
+            kwargs["tokenizer"] = tokenizer
+        if settings["think"] == "cap":
+            kwargs["logits_processor"] = LogitsProcessorList([ThinkCapProcessor(tokenizer, prompt_length, settings["max_think_tokens"])])
+        if settings["stop_on_json_close"]:
+            kwargs["stopping_criteria"] = StoppingCriteriaList([
+                JsonCloseCriteria(tokenizer, prompt_length, after_think=settings["think"] != "suppress")
+            ])
+        if settings["constrained_json"] and self.category_json_fn is not None:
+            kwargs["prefix_allowed_tokens_fn"] = self.category_json_fn
+        return kwargs
+
+    def generate_with_prefix(self, prefix, suffix, max_new_tokens, profile="generate_analysis", streamer=None):
+        """Generates with the prefix's cached key/values, so only the suffix is prefilled."""
+        tokenizer = self.generator.tokenizer
+        past_key_values = None
+        if self.prefix_cache is not None and prefix:
+            prefix_ids, past_key_values = self.prefix_cache.get(prefix)
+            suffix_ids = tokenizer(suffix, add_special_tokens=False, return_tensors="pt").input_ids.to(prefix_ids.device)
+            input_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+        else:
+            input_ids = tokenizer(prefix + suffix, return_tensors="pt").input_ids.to(self.generator.model.device)
+        with self.generate_lock:
+            outputs = self.generator.model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=past_key_values,
+                max_new_tokens=max_new_tokens,
+                streamer=streamer,
+                **self.generation_kwargs(profile, input_ids.shape[1])
+            )
+        text = tokenizer.decode(outputs[0, input_ids.shape[1]:], skip_special_tokens=True)
+        return trim_at_stop(text, self.generation_profiles[profile]["stop_sequences"])
+
+    # 5b. One padded generate for a batch of (prefix, suffix) prompts (called by the batch scheduler)
+    def generate_batch(self, prompts, max_new_tokens, profile="generate_analysis"):
+        if len(prompts) == 1:
+            # Alone in the batch: reuse the prefix KV cache (padding would shift a shared prefix)
+            return [self.generate_with_prefix(*prompts[0], max_new_tokens[0], profile)]
+        prompts = [prefix + suffix for prefix, suffix in prompts]
+        tokenizer = self.generator.tokenizer
+        tokenizer.padding_side = "left"  # Decoder-only: pad on the left so every prompt ends where generation starts
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(self.generator.model.device)
+        prompt_length = inputs["input_ids"].shape[1]
+        with self.generate_lock:
+            outputs = self.generator.model.generate(
+                **inputs,
+                max_new_tokens=max(max_new_tokens),
+                **self.generation_kwargs(profile, prompt_length)
+            )
+        new_tokens = outputs[:, prompt_length:]
+        # Rows that finished early are padded; each request keeps at most its own token limit
+        stop_sequences = self.generation_profiles[profile]["stop_sequences"]
+        return [
+            trim_at_stop(tokenizer.decode(row[:limit], skip_special_tokens=True), stop_sequences)
+            for row, limit in zip(new_tokens, max_new_tokens)
+        ]
+
+    def batching_stats(self):
+        """Batch scheduler metrics per profile and the prefix cache's counters (each only if enabled); None if neither is."""
+        stats = {name: batcher.stats() for name, batcher in self.batchers.items()}
+        if self.prefix_cache is not None:
+            stats["prefixCache"] = self.prefix_cache.stats()
+        return stats or None
+
+    def extract_analysis(self, answer_text):
+        # Extract everything after </think>\n\n
+        try:
+            answer_text_extracted = answer_text.split("</think>\n\n")[-1].strip()
+            if not answer_text_extracted:
+                answer_text_extracted = answer_text
+        except:
+            answer_text_extracted = answer_text
+        return answer_text_extracted
+
+    def save_analysis(self, answer_text_extracted):
+        # Save the answer text to girlfriend_response.txt (read by the TTS step)
+        with self.save_lock, open("girlfriend_response.txt", "w") as f:
+            f.write(answer_text_extracted)
+
+    # 5c. Stream the answer as it is generated
+    def stream_answer(self, prefix, suffix):
+        settings = self.generation_profiles["generate_analysis"]
+        if settings["think"] == "suppress":
+            suffix += EMPTY_THINK_BLOCK
+        streamer = TextIteratorStreamer(
+            self.generator.tokenizer, skip_prompt=True, skip_special_tokens=True,
+            timeout=self.prompt_settings["stream_token_timeout_s"]
+        )
+        errors = []
+
+        def generate():
+            try:
+                self.generate_with_prefix(prefix, suffix, settings["max_new_tokens"], "generate_analysis", streamer=streamer)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()  # Unblock the loop below; the error is re-raised there
+
+        generation = Thread(target=generate, daemon=True)
+        generation.start()
+        try:
+            for text in streamer:
+                if errors:
+                    break
+                yield text
+        except queue.Empty:
+            raise TimeoutError(f"No generated text for {self.prompt_settings['stream_token_timeout_s']}s")
+        generation.join()
+        if errors:
+            raise errors[0]
+
+    def prompt_llm(self, incoming_order: dict, retrieval_length: int = None, additional_context: str = ""):
+        # Step-by-step, timing each stage into self.last_timings
+        timer = StageTimer()
+        with timer.stage("categorization"):
+            incoming_order_with_category_str = self.categorize_order(incoming_order)
+        prefix, suffix = self.build_analysis_prompt(incoming_order_with_category_str, additional_context, retrieval_length, timer)
+        with timer.stage("generation"):
+            answer = self.generate_text(prefix, suffix, profile="generate_analysis")
+        with timer.stage("post_processing"):
+            answer = answer.strip()
+            answer_text_extracted = self.extract_analysis(answer)
+        with timer.stage("file_write"):
+            self.save_analysis(answer_text_extracted)
+        answer_dict = {
+            "status": "success",
+            "message": answer
+        }
+        self.last_timings = timer.stages
+        self.last_prompt = prefix + suffix
+        return answer_dict
+
+    def categorize_order(self, incoming_order):
+        if self.categorizer is not None:
+            order = [dict(item) for item in incoming_order]
+            uncategorized = [item for item in order if not item.get("category")]
+            categories = self.categorizer.categorize([str(item.get("name", "")) for item in uncategorized])
+            if categories is not None:
+                for item, category in zip(uncategorized, categories):
+                    item["category"] = category
+                return json.dumps(order)
+        return self.categorize_with_llm(incoming_order)
+
+    def categorize_with_llm(self, incoming_order):
         incoming_order_dump = json.dumps(incoming_order)
-        previous_order_dump = self.previous_spending_data_dump
         unique_categories = json.dumps(self.unique_categories)
         category_context = f"<incoming_order>: {incoming_order_dump}, <unique_categories>: {unique_categories}"
-        print(1)
-        incoming_order_with_category_str = self.generate_answer(
+        return self.generate_answer(
             context=category_context, 
             question="I have given the incoming order dictionary's dump as context under <incoming_order> and the unique categories as context under the key: <unique_categories>, get the category for each item in the order dictionary and map it to the category in the <unique_categories> and in the answer give the updated order dict with the category key. Make sure to give only the updated incoming dictionary as answer",
             type="generate_category"
         )
-        print(2)
+
+    def build_analysis_prompt(self, incoming_order_with_category_str, additional_context="", retrieval_length=None, timer=None):
+        """Returns (prefix, suffix) of the analysis prompt.
+
+        The prefix (instructions + category totals) only changes with the spending history, so its
+        KV cache is reused across orders; the suffix holds everything specific to this order.
+        """
+        timer = timer or StageTimer()
+        # Only the history relevant to this order (bounded in tokens), not the full dump, so prefill cost stays flat
+        with timer.stage("retrieval"):
+            category_summary, previous_order_dump = self.build_history_context(incoming_order_with_category_str, k=retrieval_length)
         # question = "you are a girlfriend who is helping your boyfriend to manage his money, for the items in the incoming order dictionary dump, give your analysis on if he should buy those items or not. The context consist of previous spending data under the key: <previous_spending_data> and the incoming order under the key: <incoming_order>. Since you are a girlfriend, give a caring advice to your boyfriend and make the analysis personal. The response should be in a way that girlfriend directly speaks to her boyfriend."
-        question = "You are the user's caring and supportive virtual girlfriend who helps him manage his money. Whenever you're given data with <previous_spending_data> and <incoming_order>, analyze the order items and decide whether each should be bought or not. Use the previous spending to guide your judgment. Respond in a sweet, personal tone, directly addressing the user as your boyfriend. Keep your advice under 5 lines and make it sound cute and thoughtful, like a loving partner who wants the best for him."
-        if additional_context:
-            new_context = f"<previous_spending_data>: {previous_order_dump}\n<incoming_order>: {incoming_order_with_category_str}\n<additional_context>: {additional_context}"
-        else:
-            new_context = f"<previous_spending_data>: {previous_order_dump}\nincoming order: {incoming_order_with_category_str}"
-        answer = self.generate_answer(
-            context=new_context, 
-            question=question,
-            type="generate_analysis"
-        )
-        answer_dict = {
-            "status": "success",
-            "message": answer
-        }
-        print(3)
-        return answer_dict
+        with timer.stage("prompt_build"):
+            prefix = f"Question: {ANALYSIS_QUESTION}\n\n<spending_by_category>:\n{category_summary}\n\n"
+            if additional_context:
+                new_context = f"<previous_spending_data>:\n{previous_order_dump}\n<incoming_order>: {incoming_order_with_category_str}\n<additional_context>: {additional_context}"
+            else:
+                new_context = f"<previous_spending_data>:\n{previous_order_dump}\nincoming order: {incoming_order_with_category_str}"
+            return prefix, f"Context:\n{new_context}\n\nAnswer:"
+
+    def prompt_llm_stream(self, incoming_order: dict, additional_context: str = ""):
+        """Same analysis as prompt_llm, but yields ("token", text) events while the answer is generated
+        (with the <think> block removed) and a final ("message", answer_dict) event."""
+        incoming_order_with_category_str = self.categorize_order(incoming_order)
+        prefix, suffix = self.build_analysis_prompt(incoming_order_with_category_str, additional_context)
+        think_filter = ThinkFilter(thinking=self.generation_profiles["generate_analysis"]["think"] != "suppress")
+        answer_text = ""
+        for text in self.stream_answer(prefix, suffix):
+            answer_text += text
+            visible = think_filter.feed(text)
+            if visible:
+                yield "token", visible
+        remaining = think_filter.flush()
+        if remaining:
+            yield "token", remaining
+        answer_text_extracted = self.extract_analysis(answer_text.strip())
+        self.save_analysis(answer_text_extracted)
+        yield "message", {"status": "success", "message": answer_text_extracted}
 
 if __name__ == "__main__":
-    llm = LLMPrompt()
+    from fastAPI.config import load_config
+
+    llm = LLMPrompt(config=load_config())
     print(
         llm.prompt_llm(
             incoming_order=[
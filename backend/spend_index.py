@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from embedding_cache import EmbeddingCache
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# SPEND_DATA_DIR relocates the index, embedding cache and ingestion state (e.g. for benchmarks)
+DATA_DIR = os.environ.get("SPEND_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+INDEX_DIR = os.path.join(DATA_DIR, "spend_index")
+EMBEDDING_CACHE_DIR = os.path.join(DATA_DIR, "embedding_cache")
+INDEX_FILE = "index.faiss"
+META_FILE = "meta.json"
+
+
+@lru_cache(maxsize=None)
+def get_embedder(model_name: str = EMBEDDING_MODEL) -> SentenceTransformer:
+    """Loads each sentence-transformers model once per process."""
+    return SentenceTransformer(model_name)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache(model_name: str = EMBEDDING_MODEL) -> EmbeddingCache:
+    """One on-disk embedding cache per model, shared by everything in the process that embeds text."""
+    embedder = get_embedder(model_name)
+    return EmbeddingCache(
+        os.path.join(EMBEDDING_CACHE_DIR, model_name.replace("/", "--")),
+        embedder.get_sentence_embedding_dimension(),
+        lambda texts: embedder.encode(texts, convert_to_numpy=True),
+    )
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SpendIndex:
+    """Persistent FAISS index of spend records that is updated incrementally.
+
+    Every record has a stable key (e.g. its content hash) mapped to a FAISS id. Upserting
+    only embeds records whose text changed; changed and deleted records are dropped with
+    ``remove_ids``. The index and its metadata are saved under ``index_dir`` and loaded
+    memory-mapped on startup; the first write after that loads it fully.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR, model_name: str = EMBEDDING_MODEL, mmap: bool = True):
+        self.index_dir = index_dir
+        self.model_name = model_name
+        self.records: Dict[str, Dict] = {}  # key -> {"id", "hash", "text", "data"}
+        self.texts_by_id: Dict[int, str] = {}
+        self.category_totals: Dict[str, Dict[str, float]] = {}  # category -> {"count", "total"}, from record payloads
+        self.next_id = 0
+        self.index = None
+        self.writable = True
+        self.load(mmap=mmap)
+
+    @property
+    def embedder(self) -> SentenceTransformer:
+        return get_embedder(self.model_name)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _new_index(self):
+        dim = self.embedder.get_sentence_embedding_dimension()
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+    def load(self, mmap: bool = True):
+        """Loads the saved index (memory-mapped if possible), or starts an empty one."""
+        try:
+            with open(self._path(META_FILE), "r") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            meta = None
+        if meta is None or meta.get("model_name") != self.model_name or not os.path.exists(self._path(INDEX_FILE)):
+            self.index = self._new_index()
+            self.records, self.next_id, self.writable = {}, 0, True
+        else:
+            self.index, self.writable = None, not mmap
+            if mmap:
+                try:
+                    self.index = faiss.read_index(self._path(INDEX_FILE), faiss.IO_FLAG_MMAP)
+                except RuntimeError:
+                    self.writable = True  # This faiss build can't mmap the index type
+            if self.index is None:
+                self.index = faiss.read_index(self._path(INDEX_FILE))
+            self.records, self.next_id = meta["records"], meta["next_id"]
+        self.texts_by_id = {record["id"]: record["text"] for record in self.records.values()}
+        self.category_totals = {}
+        for record in self.records.values():
+            self._count(record.get("data"), 1)
+
+    def _count(self, data: Optional[Dict], sign: int):
+        if not data:
+            return
+        totals = self.category_totals.setdefault(data.get("category") or "Uncategorized", {"count": 0, "total": 0.0})
+        totals["count"] += sign
+        totals["total"] += sign * data["price"] * data.get("quantity", 1)
+        if totals["count"] <= 0:
+            del self.category_totals[data.get("category") or "Uncategorized"]
+
+    def _ensure_writable(self):
+        # Memory-mapped indexes are read-only
+        if not self.writable:
+            self.index = faiss.read_index(self._path(INDEX_FILE))
+            self.writable = True
+
+    def save(self):
+        """Writes the index and metadata atomically (temp file + rename)."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_index = self._path(f"{INDEX_FILE}.tmp")
+        faiss.write_index(self.index, tmp_index)
+        tmp_meta = self._path(f"{META_FILE}.tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump({"model_name": self.model_name, "next_id": self.next_id, "records": self.records}, f)
+        os.replace(tmp_index, self._path(INDEX_FILE))
+        os.replace(tmp_meta, self._path(META_FILE))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return get_embedding_cache(self.model_name).encode(texts)
+
+    def remove(self, keys: Iterable[str]) -> int:
+        """Drops records by key. Returns how many were removed."""
+        removed = [self.records.pop(key) for key in list(keys) if key in self.records]
+        ids = [record["id"] for record in removed]
+        for record in removed:
+            self._count(record.get("data"), -1)
+        if ids:
+            self._ensure_writable()
+            self.index.remove_ids(np.asarray(ids, dtype="int64"))
+            for record_id in ids:
+                self.texts_by_id.pop(record_id, None)
+        return len(ids)
+
+    def upsert(self, records: Dict[str, str], embeddings: Optional[np.ndarray] = None,
+               payloads: Optional[Dict[str, Dict]] = None) -> int:
+        """Adds new records and replaces changed ones (``key -> text``). Returns how many were embedded.
+
+        ``embeddings`` may hold precomputed vectors for the changed records, in ``records`` order.
+        ``payloads`` optionally attaches structured data to records (kept in the metadata).
+        """
+        changed = [(key, text) for key, text in records.items()
+                   if key not in self.records or self.records[key]["hash"] != text_hash(text)]
+        if not changed:
+            return 0
+        self.remove(key for key, _ in changed)
+        if embeddings is None:
+            embeddings = self.encode([text for _, text in changed])
+        ids = np.arange(self.next_id, self.next_id + len(changed), dtype="int64")
+        self.next_id += len(changed)
+        self._ensure_writable()
+        self.index.add_with_ids(embeddings, ids)
+        for (key, text), record_id in zip(changed, ids.tolist()):
+            self.records[key] = {"id": record_id, "hash": text_hash(text), "text": text, "data": (payloads or {}).get(key)}
+            self._count(self.records[key]["data"], 1)
+            self.texts_by_id[record_id] = text
+        return len(changed)
+
+    def search(self, query: str, k: int = 5) -> List[str]:
+        """Returns the texts of the ``k`` records closest to ``query``."""
+        k = min(k, len(self.records))
+        if k == 0:
+            return []
+        _, ids = self.index.search(self.encode([query]), k)
+        return [self.texts_by_id[i] for i in ids[0] if i in self.texts_by_id]
+
+    def __len__(self) -> int:
+        return len(self.records)
@@ -0,0 +1,327 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from spend_index import DATA_DIR, SpendIndex
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(DATA_DIR, "ingest_state.json")
+# Relative sources are resolved against this directory. Purchases recorded through the API are
+# read from the configured storage instead (see SpendIngestor.ingest_purchases)
+SPEND_SOURCES = ["spend-folder-txt", "spend-folder-csv", "spend-folder-json"]
+BATCH_SIZE = 256
+SAVE_INTERVAL_S = 30  # New stored purchases are written to the index and state at most this often
+
+# e.g. "1. Milk - Essential - $3.50 x2 - Bought on 2025-04-10 08:12AM - Category: Grocery"
+TXT_RECORD = re.compile(
+    r"^\s*(?:\d+\.\s*)?(?P<name>.+?) - (?P<essential>Essential|Non-Essential) - \$(?P<price>[\d.,]+) x(?P<quantity>\d+)"
+    r"(?: - Bought on (?P<date_bought_on>.+?))?(?: - Category: (?P<category>.+?))?\s*$"
+)
+
+
+@dataclass(frozen=True)
+class SpendRecord:
+    """One purchase, normalized from any of the spend sources."""
+    name: str
+    price: float
+    quantity: int = 1
+    essential: Optional[bool] = None
+    category: Optional[str] = None
+    bought_on: Optional[str] = None
+    source_ref: Optional[str] = None  # Where the row is stored (file position or storage row id)
+
+    @property
+    def text(self) -> str:
+        """Canonical one-line form (the txt folder's format), used for embedding and prompts."""
+        parts = [self.name]
+        if self.essential is not None:
+            parts.append("Essential" if self.essential else "Non-Essential")
+        parts.append(f"${self.price:.2f} x{self.quantity}")
+        if self.bought_on:
+            parts.append(f"Bought on {self.bought_on}")
+        if self.category:
+            parts.append(f"Category: {self.category}")
+        return " - ".join(parts)
+
+    @property
+    def record_hash(self) -> str:
+        """Identity across formats: the same purchase in the txt, csv and json folders hashes the same.
+
+        Undated records can't be told apart from repeat purchases of the same item by content,
+        so their source row is part of their identity.
+        """
+        key = [self.name.strip().lower(), round(self.price, 2), self.quantity, self.bought_on, self.category]
+        if not self.bought_on:
+            key.append(self.source_ref)
+        return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def parse_price(value: Any) -> float:
+    return float(str(value).replace("$", "").replace(",", "").strip())
+
+
+def parse_essential(value: Any) -> Optional[bool]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("yes", "true", "essential")
+
+
+def record_from_item(item: Dict[str, Any]) -> Optional[SpendRecord]:
+    """Builds a record from a JSON/CSV/store item dict; None if it has no usable name and price."""
+    try:
+        return SpendRecord(
+            name=str(item["name"]).strip(),
+            price=parse_price(item["price"]),
+            quantity=int(item.get("quantity") or 1),
+            essential=parse_essential(item.get("essential")),
+            category=item.get("category") or None,
+            bought_on=item.get("date_bought_on") or item.get("bought_on") or None,
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def iter_lines(path: Path, offset: int) -> Iterator[Tuple[str, int]]:
+    """Yields (line, offset after it) from ``offset`` on. Lines are read one at a time."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw_line in iter(f.readline, b""):
+            if not raw_line.endswith(b"\n"):
+                break  # Partially written last line, picked up next run
+            yield raw_line.decode("utf-8"), f.tell()
+
+
+def parse_txt(path: Path, offset: int) -> Iterator[Tuple[SpendRecord, int]]:
+    for line, end in iter_lines(path, offset):
+        match = TXT_RECORD.match(line)
+        record = match and record_from_item(match.groupdict())
+        if record:
+            yield record, end
+
+
+def parse_csv(path: Path, offset: int) -> Iterator[Tuple[SpendRecord, int]]:
+    # Expects a header row with the JSON item keys (name, essential, price, quantity, date_bought_on, category)
+    header = None
+    for line, end in iter_lines(path, 0):
+        header = next(csv.reader([line]))
+        header_end = end
+        break
+    if header is None:
+        return
+    for line, end in iter_lines(path, max(offset, header_end)):
+        row = next(csv.reader([line]), None)
+        record = row and record_from_item(dict(zip(header, row)))
+        if record:
+            yield record, end
+
+
+def parse_jsonl(path: Path, offset: int) -> Iterator[Tuple[SpendRecord, int]]:
+    for line, end in iter_lines(path, offset):
+        try:
+            record = record_from_item(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+        if record:
+            yield record, end
+
+
+def parse_json(path: Path, offset: int) -> Iterator[Tuple[SpendRecord, int]]:
+    """A JSON document can't be resumed mid-way, so a changed file is parsed again (dedupe drops known records).
+
+    Accepts ``{"items": [...]}``, a bare list of items, or the API's spending_data.json.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        document = json.load(f)
+    if isinstance(document, dict) and "monthly_data" in document:
+        items = (item for month in document["monthly_data"].values() for item in month.get("items_purchased", []))
+    elif isinstance(document, dict):
+        items = document.get("items", [])
+    else:
+        items = document
+    size = path.stat().st_size
+    for item in items:
+        record = record_from_item(item)
+        if record:
+            yield record, size
+
+
+PARSERS = {".txt": parse_txt, ".csv": parse_csv, ".jsonl": parse_jsonl, ".json": parse_json}
+
+
+def with_source_ref(record: SpendRecord, ref: str) -> SpendRecord:
+    return record if record.bought_on else replace(record, source_ref=ref)
+
+
+def resolve_source(source: str) -> Path:
+    """Resolves a source relative to the backend directory (not the working directory)."""
+    return Path(BACKEND_DIR, source)
+
+
+def iter_source_files(sources: Iterable[str]) -> Iterator[Path]:
+    for source in sources:
+        path = resolve_source(source)
+        if path.is_file():
+            yield path
+        elif path.is_dir():
+            yield from sorted(p for p in path.rglob("*") if p.suffix in PARSERS)
+
+
+class SpendIngestor:
+    """Keeps a SpendIndex in step with the spend files and the purchases in storage, incrementally.
+
+    Files are streamed record by record. Per-file (mtime, size, offset) checkpoints skip
+    unchanged files and resume appended ones. Records are keyed by their content hash, so
+    a purchase already indexed (from any file or format) is not embedded again. New records
+    reach the embedding cache and index in batches of ``batch_size``.
+
+    Each file and the storage remember the keys they hold; indexed records no longer held by
+    any of them (deleted or changed purchases, keys of an older format) are removed.
+
+    Purchases recorded through the API arrive a few at a time; they are indexed right away, but
+    the index and checkpoints are saved at most every ``save_interval_s``. Unsaved ones are
+    indexed again from storage by the full sync on the next start.
+    """
+
+    def __init__(self, index: SpendIndex, state_file: str = STATE_FILE, batch_size: int = BATCH_SIZE,
+                 save_interval_s: float = SAVE_INTERVAL_S):
+        self.index = index
+        self.state_file = state_file
+        self.batch_size = batch_size
+        self.save_interval_s = save_interval_s
+        self.unsaved = False
+        self.saved_at = time.monotonic()
+        try:
+            with open(state_file, "r") as f:
+                self.state: Dict[str, Any] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.state = {}
+        if "files" not in self.state:
+            # No state, or one without per-source keys: everything is parsed again and reconciled
+            self.state = {"files": {}, "store": []}
+        self.store_keys: Set[str] = set(self.state["store"])
+
+    def _save_state(self):
+        self.state["store"] = sorted(self.store_keys)
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_file)
+
+    def _flush(self, batch: Dict[str, SpendRecord]) -> int:
+        if not batch:
+            return 0
+        added = self.index.upsert({key: record.text for key, record in batch.items()},
+                                  payloads={key: asdict(record) for key, record in batch.items()})
+        batch.clear()
+        return added
+
+    def ingest_records(self, records: Iterable[SpendRecord], keys: Optional[Set[str]] = None) -> int:
+        """Indexes records not seen before. Returns how many were added (the index is not saved).
+
+        ``keys``, when given, collects the key of every record, indexed before or not.
+        """
+        added = 0
+        batch: Dict[str, SpendRecord] = {}
+        for record in records:
+            key = record.record_hash
+            if keys is not None:
+                keys.add(key)
+            if key in self.index.records or key in batch:
+                continue
+            batch[key] = record
+            if len(batch) >= self.batch_size:
+                added += self._flush(batch)
+        return added + self._flush(batch)
+
+    def reconcile(self) -> int:
+        """Removes indexed records that no file or the storage holds any more. Returns how many were removed."""
+        held = set(self.store_keys)
+        for checkpoint in self.state["files"].values():
+            held.update(checkpoint["keys"])
+        return self.index.remove([key for key in self.index.records if key not in held])
+
+    def run(self, sources: Iterable[str] = SPEND_SOURCES) -> int:
+        """Ingests new data from the given files/folders, reconciles, then saves the index and checkpoints."""
+        added = 0
+        files = self.state["files"]
+        for path in iter_source_files(sources):
+            stat = path.stat()
+            checkpoint = files.get(str(path))
+            if checkpoint and checkpoint["mtime"] == stat.st_mtime and checkpoint["size"] == stat.st_size:
+                continue
+            # Resume appended files; start over if the file shrank (rewritten). A JSON document is always parsed whole
+            resume = checkpoint and path.suffix != ".json" and stat.st_size >= checkpoint["offset"]
+            offset = checkpoint["offset"] if resume else 0
+            keys = set(checkpoint["keys"]) if resume else set()
+            end = offset
+
+            def records():
+                nonlocal end
+                # Line offsets identify rows of appendable files; a JSON document's rows are numbered
+                for ordinal, (record, end) in enumerate(PARSERS[path.suffix](path, offset)):
+                    yield with_source_ref(record, f"{path.name}#{ordinal if path.suffix == '.json' else end}")
+
+            try:
+                file_added = self.ingest_records(records(), keys)
+            except (OSError, UnicodeDecodeError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not ingest {path}: {e}")
+                continue
+            if file_added:
+                self.index.save()
+                added += file_added
+            files[str(path)] = {"mtime": stat.st_mtime, "size": stat.st_size, "offset": end, "keys": sorted(keys)}
+            self._save_state()
+        for path in [path for path in files if not os.path.exists(path)]:
+            del files[path]
+        removed = self.reconcile()
+        if removed:
+            self.index.save()
+        self._save_state()
+        print(f"Spend ingestion: {added} new records, {removed} removed, {len(self.index)} indexed.")
+        return added
+
+    def save(self, index: bool = True):
+        """Writes the checkpoints and, with ``index``, the whole FAISS index."""
+        if index:
+            self.index.save()
+        self._save_state()
+        self.unsaved = False
+        self.saved_at = time.monotonic()
+
+    def save_if_due(self):
+        if self.unsaved and time.monotonic() - self.saved_at >= self.save_interval_s:
+            self.save()
+
+    def ingest_purchases(self, purchases: Iterable[Tuple[str, Dict[str, Any]]], complete: bool = True) -> Tuple[int, int]:
+        """Indexes stored purchases (``SpendingStorage.iter_purchases``). Returns (added, removed).
+
+        With ``complete`` these are all stored purchases: indexed ones no longer among them are
+        removed and everything is saved. Otherwise they are only the newly recorded ones: they
+        are added (in time proportional to their number) and saved on the ``save_interval_s`` debounce.
+        """
+        records = (
+            with_source_ref(record, f"store#{row_id}")
+            for row_id, item in purchases
+            for record in [record_from_item(item)] if record
+        )
+        if not complete:
+            held = len(self.store_keys)
+            added = self.ingest_records(records, self.store_keys)
+            self.unsaved = self.unsaved or bool(added) or len(self.store_keys) != held
+            self.save_if_due()
+            return added, 0
+        keys: Set[str] = set()
+        added = self.ingest_records(records, keys)
+        self.store_keys = keys
+        removed = self.reconcile()
+        self.save(index=bool(added or removed or self.unsaved))
+        return added, removed
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# The API reads its config and opens its storage at import time, so point both at a scratch
+# directory before any test imports fastAPI.main
+TEST_DIR = tempfile.mkdtemp(prefix="spending-tests-")
+TEST_CONFIG = os.path.join(TEST_DIR, "config.yaml")
+with open(TEST_CONFIG, "w") as f:
+    f.write(
+        "test_mode: true\n"
+        "storage:\n"
+        "  backend: sqlite\n"
+        f"  sqlite_file: {os.path.join(TEST_DIR, 'spending.db')}\n"
+        "check_order_cache:\n"
+        "  enabled: true\n"
+        "  disk_dir: null\n"
+    )
+os.environ["SPENDING_CONFIG_FILE"] = TEST_CONFIG
+
+from fastAPI import models  # noqa: E402
+
+models.DATA_FILE = os.path.join(TEST_DIR, "spending_data.json")
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from batching import BatchScheduler
+
+
+class RecordingGenerator:
+    """Answers each prompt with its upper-cased text, recording the batches it was given."""
+
+    def __init__(self, release=None):
+        self.batches = []
+        self.release = release
+
+    def __call__(self, prompts, max_new_tokens):
+        if self.release is not None:
+            self.release.wait(5)
+        self.batches.append((list(prompts), list(max_new_tokens)))
+        return [prompt.upper()[:limit] for prompt, limit in zip(prompts, max_new_tokens)]
+
+
+def test_concurrent_prompts_share_a_batch():
+    generator = RecordingGenerator()
+    scheduler = BatchScheduler(generator, max_batch_size=4, max_wait_ms=200)
+    futures = [scheduler.submit(prompt, 10) for prompt in ["milk", "eggs", "bread"]]
+    assert [future.result(5) for future in futures] == ["MILK", "EGGS", "BREAD"]
+    assert generator.batches == [(["milk", "eggs", "bread"], [10, 10, 10])]
+
+
+def test_batches_close_at_max_batch_size():
+    release = threading.Event()
+    generator = RecordingGenerator(release)
+    scheduler = BatchScheduler(generator, max_batch_size=2, max_wait_ms=200)
+    futures = [scheduler.submit(prompt, limit) for prompt, limit in [("milk", 2), ("eggs", 10), ("bread", 3)]]
+    release.set()
+    assert [future.result(5) for future in futures] == ["MI", "EGGS", "BRE"]
+    assert [prompts for prompts, _ in generator.batches] == [["milk", "eggs"], ["bread"]]
+
+
+def test_a_lone_prompt_waits_at_most_max_wait():
+    scheduler = BatchScheduler(RecordingGenerator(), max_batch_size=4, max_wait_ms=10)
+    assert scheduler.generate("milk", 10) == "MILK"
+    stats = scheduler.stats()
+    assert stats["batches"] == 1 and stats["batchSizes"] == {1: 1}
+    assert 5 <= stats["maxQueueWaitMs"] < 1000
+
+
+def test_a_failed_batch_fails_each_of_its_requests():
+    def generate_batch(prompts, max_new_tokens):
+        if "boom" in prompts:
+            raise RuntimeError("CUDA error")
+        return list(prompts)
+
+    scheduler = BatchScheduler(generate_batch, max_batch_size=4, max_wait_ms=200)
+    futures = [scheduler.submit(prompt, 10) for prompt in ["milk", "boom"]]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="CUDA error"):
+            future.result(5)
+    # The scheduler keeps serving later batches
+    assert scheduler.generate("eggs", 10) == "eggs"
+
+
+def test_stats_average_over_requests():
+    release = threading.Event()
+    scheduler = BatchScheduler(RecordingGenerator(release), max_batch_size=2, max_wait_ms=200)
+    futures = [scheduler.submit(prompt, 10) for prompt in ["a", "b", "c"]]
+    release.set()
+    for future in futures:
+        future.result(5)
+    stats = scheduler.stats()
+    assert stats["batches"] == 2 and stats["requests"] == 3
+    assert stats["avgBatchSize"] == 1.5
+    assert stats["batchSizes"] == {2: 1, 1: 1}
+    assert stats["queued"] == 0
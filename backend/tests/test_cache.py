@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastAPI.cache import ResponseCache, make_key
+
+ORDER = [{"name": "Milk", "price": 3.5}]
+ANSWER = {"status": "success", "message": "Go ahead", "source": "llm"}
+
+
+@pytest.fixture(scope="module")
+def api():
+    import fastAPI.main as api
+
+    return api
+
+
+@pytest.fixture
+def client(api):
+    api.response_cache.clear()
+    return TestClient(api.app)
+
+
+def test_clear_drops_memory_and_disk_entries(tmp_path):
+    cache = ResponseCache(disk_dir=str(tmp_path))
+    cache.put("key", ANSWER)
+    cache.clear()
+    assert cache.get("key") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = ResponseCache(ttl_s=60)
+    cache.put("key", ANSWER)
+    now = time.time()
+    monkeypatch.setattr("fastAPI.cache.time.time", lambda: now + 61)
+    assert cache.get("key") is None
+
+
+def test_key_follows_the_spending_bucket_and_limit():
+    key = make_key(ORDER, 3.5, 10.0, 100.0, 25.0)
+    assert make_key(ORDER, 3.5, 20.0, 100.0, 25.0) == key
+    assert make_key(ORDER, 3.5, 30.0, 100.0, 25.0) != key
+    assert make_key(ORDER, 3.5, 10.0, 200.0, 25.0) != key
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("post", "/spending/record-purchase", {"orderAmount": 3.5, "itemsInOrder": ORDER, "timestamp": "2025-04-10T08:12:00"}),
+    ("post", "/spending/record-purchases", {"orders": [{"orderAmount": 3.5, "itemsInOrder": ORDER, "timestamp": "2025-04-10T08:12:00"}]}),
+    ("put", "/spending/limit", {"limit": 750}),
+    ("post", "/spending/reset", None),
+])
+def test_budget_changes_clear_cached_answers(api, client, method, path, body):
+    api.response_cache.put("key", ANSWER)
+    response = getattr(client, method)(path, json=body)
+    assert response.status_code == 200, response.text
+    assert api.response_cache.get("key") is None
+
+
+def test_reads_keep_cached_answers(api, client):
+    api.response_cache.put("key", ANSWER)
+    assert client.get("/spending/monthly").status_code == 200
+    assert api.response_cache.get("key") == ANSWER
+
+
+def test_put_from_before_a_clear_is_dropped(tmp_path):
+    cache = ResponseCache(disk_dir=str(tmp_path))
+    generation = cache.generation
+    cache.clear()
+    cache.put("key", ANSWER, generation)
+    assert cache.get("key") is None
+    assert list(tmp_path.iterdir()) == []
+    cache.put("key", ANSWER, cache.generation)
+    assert cache.get("key") == ANSWER
+
+
+class BlockingModel:
+    """Holds its answer until released, so a write can land while the analysis runs."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def prompt_llm(self, incoming_order, additional_context=""):
+        self.started.set()
+        self.release.wait(5)
+        return {"status": "success", "message": "Go ahead"}
+
+
+def test_answer_computed_against_an_old_budget_is_not_cached(api, client, monkeypatch):
+    model = BlockingModel()
+    monkeypatch.setattr(api.model_loader, "model", model)
+    monkeypatch.setattr(api.model_loader, "state", "ready")
+    order = {"orderAmount": 5.0, "currentSpending": 0, "monthlyLimit": 500, "itemsInOrder": [{"name": "Game", "price": 5.0, "category": "Entertainment"}]}
+    job = client.post("/spending/check-order/jobs", json=order).json()
+    assert model.started.wait(5)
+    recorded = client.post("/spending/record-purchase", json={"orderAmount": 1.0, "itemsInOrder": ORDER, "timestamp": "2025-04-10T08:12:00"})
+    assert recorded.status_code == 200
+    model.release.set()
+    api.inference_worker.get(job["jobId"]).future.result(5)
+    assert api.response_cache.stats()["entries"] == 0
@@ -0,0 +1,46 @@
+import numpy as np
+
+from categorizer import ItemCategorizer
+
+KEYWORDS = {
+    "grocery": ["grocery", "milk", "eggs", "bread"],
+    "electronics": ["electronics", "cable", "headphones", "laptop"],
+    "clothing": ["clothing", "shirt", "jeans"],
+}
+
+
+class KeywordEncoder:
+    """Embeds a text as counts of each category's keywords (plus a constant axis for unknown words)."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[sum(word in text.lower() for word in words) for words in KEYWORDS.values()] + [0.5]
+                         for text in texts], dtype="float32")
+
+
+def make_categorizer(encoder=None, threshold=0.45):
+    labeled = [("Milk", "Grocery"), ("USB Cable", "Electronics"), ("Jeans", "Clothing"), ("Jeans", "Unknown category")]
+    return ItemCategorizer(["Grocery", "Electronics", "Clothing"], labeled, encoder or KeywordEncoder(), threshold)
+
+
+def test_items_get_the_closest_category():
+    assert make_categorizer().categorize(["Oat Milk", "Laptop Sleeve", "T-Shirt"]) == ["Grocery", "Electronics", "Clothing"]
+
+
+def test_low_confidence_leaves_the_order_to_the_llm():
+    categorizer = make_categorizer()
+    assert categorizer.categorize(["Milk", "Garden Gnome"]) is None
+    category, score = categorizer.classify(["Garden Gnome"])[0]
+    assert score < categorizer.confidence_threshold
+
+
+def test_names_are_embedded_once_in_a_single_batch():
+    encoder = KeywordEncoder()
+    categorizer = make_categorizer(encoder)
+    encoder.calls.clear()
+    categorizer.classify(["Milk", "EGGS", "milk", "Laptop"])
+    categorizer.classify(["Eggs", "laptop ", "Bread"])
+    assert encoder.calls == [["milk", "eggs", "laptop"], ["bread"]]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Non-essential, so the rules stage leaves it to the LLM
+ORDER = {"orderAmount": 5.0, "currentSpending": 0, "monthlyLimit": 500, "itemsInOrder": [{"name": "Headphones", "price": 5.0, "category": "Electronics"}]}
+ADVICE = "Treat yourself, babe!"
+
+
+class ReasoningModel:
+    """Answers like the real model: a reasoning block, then the advice."""
+
+    answer = f"<think>\nFive dollars is well within the budget.\n</think>\n\n{ADVICE}"
+
+    def prompt_llm(self, incoming_order, additional_context=""):
+        return {"status": "success", "message": self.answer}
+
+    def prompt_llm_stream(self, incoming_order, additional_context=""):
+        yield "token", ADVICE
+        yield "message", {"status": "success", "message": self.answer}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import fastAPI.main as api
+
+    monkeypatch.setattr(api.model_loader, "model", ReasoningModel())
+    monkeypatch.setattr(api.model_loader, "state", "ready")
+    api.response_cache.clear()
+    return TestClient(api.app)
+
+
+def events(response):
+    """Parses an SSE body into (event, data) pairs."""
+    parsed = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((lines["event"], json.loads(lines["data"])))
+    return parsed
+
+
+def test_check_order_answers_without_the_reasoning_block(client):
+    response = client.post("/spending/check-order", json=ORDER)
+    assert response.status_code == 200, response.text
+    assert response.json()["message"] == ADVICE
+
+
+def test_stream_ends_with_the_check_order_body(client):
+    streamed = events(client.post("/spending/check-order/stream", json=ORDER))
+    assert streamed == [("token", {"text": ADVICE}), ("message", {"status": "success", "message": ADVICE, "source": "llm"})]
+
+
+def test_stream_cache_hit_does_not_leak_the_reasoning_block(client):
+    assert client.post("/spending/check-order", json=ORDER).json()["source"] == "llm"
+    streamed = events(client.post("/spending/check-order/stream", json=ORDER))
+    assert streamed == [("message", {"status": "success", "message": ADVICE, "source": "cache"})]
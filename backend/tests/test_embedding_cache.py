@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+DIM = 4
+
+
+class Encoder:
+    """Deterministic stand-in for the sentence embedder that records what it was asked to encode."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text), sum(map(ord, text)), ord(text[0]), 1.0] for text in texts], dtype="float32")
+
+
+def open_cache(path, encoder=None):
+    return EmbeddingCache(str(path), DIM, encoder or Encoder())
+
+
+def test_torn_key_line_is_cut_with_its_row(tmp_path):
+    encoder = Encoder()
+    open_cache(tmp_path).encode(["milk", "bread"])
+    # Crash mid-way through the next append: its row is on disk, its key only partly
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.ones((1, DIM), dtype="float32").tobytes())
+    with open(tmp_path / "keys.txt", "a") as f:
+        f.write("0f3a9c")
+
+    cache = open_cache(tmp_path, encoder)
+    assert len(cache) == 2
+    assert (tmp_path / "keys.txt").read_bytes().endswith(b"\n")
+    assert (tmp_path / "vectors.f32").stat().st_size == 2 * DIM * 4
+    vectors = cache.encode(["eggs", "milk", "bread"])
+    reopened = open_cache(tmp_path, encoder)
+    assert np.array_equal(reopened.encode(["eggs", "milk", "bread"]), vectors)
+    assert np.array_equal(vectors, Encoder()(["eggs", "milk", "bread"]))
+
+
+def test_rows_without_keys_are_dropped(tmp_path):
+    open_cache(tmp_path).encode(["milk"])
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.ones((1, DIM), dtype="float32").tobytes())  # Crash after the row, before its key
+        f.write(b"\x00\x01")  # and a torn row
+
+    cache = open_cache(tmp_path)
+    assert len(cache) == 1
+    assert (tmp_path / "vectors.f32").stat().st_size == DIM * 4
+    assert np.array_equal(cache.encode(["bread"]), Encoder()(["bread"]))
+
+
+def test_keys_without_rows_are_dropped(tmp_path):
+    open_cache(tmp_path).encode(["milk", "bread"])
+    with open(tmp_path / "vectors.f32", "r+b") as f:
+        f.truncate(DIM * 4)
+
+    encoder = Encoder()
+    cache = open_cache(tmp_path, encoder)
+    assert len(cache) == 1
+    assert np.array_equal(cache.encode(["milk", "bread"]), Encoder()(["milk", "bread"]))
+    assert encoder.calls == [["bread"]]
+
+
+def test_failed_encode_leaves_the_files_aligned(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.encode(["milk"])
+
+    def failing(texts):
+        raise RuntimeError("out of memory")
+
+    cache.encode_fn = failing
+    with pytest.raises(RuntimeError):
+        cache.encode(["bread"])
+    cache.encode_fn = Encoder()
+    assert np.array_equal(cache.encode(["bread", "milk"]), Encoder()(["bread", "milk"]))
+    assert np.array_equal(open_cache(tmp_path).encode(["bread", "milk"]), Encoder()(["bread", "milk"]))
+
+
+def test_only_unseen_texts_are_encoded(tmp_path):
+    encoder = Encoder()
+    cache = open_cache(tmp_path, encoder)
+    first = cache.encode(["milk", "bread"])
+    second = cache.encode(["bread", "eggs", "milk", "eggs"])
+    assert encoder.calls == [["milk", "bread"], ["eggs"]]
+    assert np.array_equal(second, Encoder()(["bread", "eggs", "milk", "eggs"]))
+    assert np.array_equal(second[[2, 0]], first)
+    assert cache.stats() == {"hits": 3, "misses": 3, "hitRate": 0.5, "entries": 3}
+
+
+def test_case_and_spacing_share_an_entry(tmp_path):
+    encoder = Encoder()
+    cache = open_cache(tmp_path, encoder)
+    vectors = cache.encode(["Oat  Milk", "oat milk ", "OAT MILK"])
+    assert encoder.calls == [["oat milk"]]
+    assert len(cache) == 1 and (vectors == vectors[0]).all()
+
+
+def test_misses_are_encoded_in_batches(tmp_path):
+    encoder = Encoder()
+    cache = EmbeddingCache(str(tmp_path), DIM, encoder, batch_size=2)
+    cache.encode(["a", "b", "c", "d", "e"])
+    assert [len(batch) for batch in encoder.calls] == [2, 2, 1]
+
+
+def test_entries_persist_across_instances(tmp_path):
+    vectors = open_cache(tmp_path).encode(["milk", "bread"])
+    encoder = Encoder()
+    reopened = open_cache(tmp_path, encoder)
+    assert len(reopened) == 2
+    assert np.array_equal(reopened.encode(["milk", "bread"]), vectors)
+    assert encoder.calls == []
+
+
+def test_empty_input(tmp_path):
+    cache = open_cache(tmp_path)
+    assert cache.encode([]).shape == (0, DIM)
+    assert cache.stats()["hitRate"] == 0.0
@@ -0,0 +1,97 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from generation import (  # noqa: E402
+    GENERATION_PROFILE_DEFAULTS, JsonCloseCriteria, ThinkCapProcessor, first_json, trim_at_stop
+)
+
+
+class CharTokenizer:
+    """One token per character (its code point), enough to drive the processors without a model."""
+
+    def encode(self, text, add_special_tokens=False):
+        return [ord(char) for char in text]
+
+    def batch_decode(self, rows, skip_special_tokens=True):
+        return ["".join(chr(token) for token in row.tolist()) for row in rows]
+
+
+def ids(*texts, prompt="Answer:"):
+    """Rows of prompt + output token ids (outputs padded with spaces to the same length)."""
+    width = max(len(text) for text in texts)
+    return torch.tensor([[ord(char) for char in prompt + text.ljust(width)] for text in texts])
+
+
+def stopped(texts, after_think):
+    criteria = JsonCloseCriteria(CharTokenizer(), len("Answer:"), after_think=after_think)
+    return criteria(ids(*texts), None).tolist()
+
+
+def test_json_close_stops_at_the_first_closed_value():
+    assert stopped(['[{"name": "Milk"}] and more', '[{"name": "Mi'], after_think=False) == [True, False]
+
+
+def test_json_close_ignores_brackets_inside_the_reasoning_block():
+    reasoning = "The user bought {milk} and [bread]"
+    assert stopped([reasoning], after_think=True) == [False]
+    assert stopped([f"<think>{reasoning}"], after_think=True) == [False]
+    assert stopped([f"{reasoning}</think>[1"], after_think=True) == [False]
+    assert stopped([f"{reasoning}</think>[1]"], after_think=True) == [True]
+
+
+def generate(processor, prompt, steps, preferred="x"):
+    """Greedy decoding where the model always prefers ``preferred``, unless the processor forces a token."""
+    input_ids = torch.tensor([[ord(char) for char in prompt]])
+    for _ in range(steps):
+        scores = torch.zeros(1, 128)
+        scores[0, ord(preferred)] = 1
+        next_id = processor(input_ids, scores).argmax(dim=1, keepdim=True)
+        input_ids = torch.cat([input_ids, next_id], dim=1)
+    return "".join(chr(token) for token in input_ids[0, len(prompt):].tolist())
+
+
+def test_think_cap_closes_the_reasoning_block_after_its_budget():
+    prompt = "Answer:<think>"
+    processor = ThinkCapProcessor(CharTokenizer(), len(prompt), max_think_tokens=5)
+    assert generate(processor, prompt, 16) == "xxxxx</think>xxx"
+
+
+def test_think_cap_leaves_rows_without_reasoning_alone():
+    prompt = "Answer:"
+    processor = ThinkCapProcessor(CharTokenizer(), len(prompt), max_think_tokens=2)
+    assert generate(processor, prompt, 6) == "xxxxxx"
+
+
+def test_trim_at_stop_cuts_before_the_earliest_stop_sequence():
+    assert trim_at_stop("advice\n\nQuestion: more\nAnswer:", ["Answer:", "\nQuestion:"]) == "advice\n"
+    assert trim_at_stop("advice", ["Answer:"]) == "advice"
+    assert trim_at_stop("advice", []) == "advice"
+
+
+def test_first_json_skips_text_and_brackets_that_are_not_json():
+    assert first_json('Sure! [not json] here: [{"name": "Milk", "category": "Grocery"}] done') == [{"name": "Milk", "category": "Grocery"}]
+    assert first_json("no json at all") is None
+
+
+@pytest.mark.parametrize("profile, expected", [
+    ({"think": "cap", "stop_on_json_close": True}, {"logits_processor", "stopping_criteria"}),
+    ({"think": "suppress", "stop_on_json_close": False, "stop_sequences": ["\nQuestion:"]}, {"stop_strings", "tokenizer"}),
+    ({"do_sample": False}, set()),
+])
+def test_profiles_select_their_generate_arguments(profile, expected):
+    for module in ("faiss", "sentence_transformers"):
+        pytest.importorskip(module)
+    from types import SimpleNamespace
+
+    from retrieve_context import LLMPrompt
+
+    llm = LLMPrompt.__new__(LLMPrompt)
+    llm.generator = SimpleNamespace(tokenizer=SimpleNamespace(
+        pad_token_id=None, eos_token_id=0, encode=CharTokenizer().encode, batch_decode=CharTokenizer().batch_decode))
+    llm.category_json_fn = None
+    llm.generation_profiles = {"generate_category": {**GENERATION_PROFILE_DEFAULTS, **profile}}
+    kwargs = llm.generation_kwargs("generate_category", prompt_length=10)
+    assert set(kwargs) - {"do_sample", "pad_token_id", "temperature"} == expected
+    assert ("temperature" in kwargs) == llm.generation_profiles["generate_category"]["do_sample"]
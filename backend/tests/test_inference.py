@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from fastAPI.inference import InferenceWorker
+
+
+@pytest.fixture
+def worker():
+    worker = InferenceWorker(max_workers=2)
+    yield worker
+    worker.shutdown()
+
+
+def collect(worker, func):
+    """Consumes worker.stream(func); returns (items received, exception raised or None)."""
+    async def consume():
+        items = []
+        try:
+            async for item in worker.stream(func):
+                items.append(item)
+        except Exception as e:
+            return items, e
+        return items, None
+
+    return asyncio.run(consume())
+
+
+def test_stream_yields_every_item(worker):
+    items, error = collect(worker, lambda: iter(["a", "b", "c"]))
+    assert items == ["a", "b", "c"]
+    assert error is None
+
+
+def test_stream_reraises_the_generator_error_after_its_items(worker):
+    def produce():
+        yield "token"
+        raise ValueError("generation failed")
+
+    items, error = collect(worker, produce)
+    assert items == ["token"]
+    assert isinstance(error, ValueError) and str(error) == "generation failed"
+
+
+def test_stream_reraises_an_error_before_the_first_item(worker):
+    def produce():
+        raise RuntimeError("model crashed")
+        yield
+
+    items, error = collect(worker, produce)
+    assert items == []
+    assert isinstance(error, RuntimeError)
+
+
+def test_failed_stream_frees_its_queue_slot(worker):
+    def produce():
+        raise RuntimeError("model crashed")
+        yield
+
+    collect(worker, produce)
+    worker._executor.shutdown(wait=True)
+    assert worker.pending == 0
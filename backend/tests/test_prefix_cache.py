@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from prefix_cache import PrefixKVCache, cache_bytes  # noqa: E402
+
+LAYERS = 2
+
+
+class CharTokenizer:
+    def __call__(self, text, return_tensors="pt", add_special_tokens=True):
+        return SimpleNamespace(input_ids=torch.tensor([[ord(char) for char in text]]))
+
+
+class CountingModel:
+    """Returns one (key, value) pair per layer of shape (1, 1, tokens, 2) and counts prefills."""
+
+    device = torch.device("cpu")
+
+    def __init__(self):
+        self.prefilled = []
+
+    def __call__(self, input_ids, use_cache=True):
+        self.prefilled.append(input_ids.shape[1])
+        states = input_ids.float().reshape(1, 1, -1, 1).repeat(1, 1, 1, 2)
+        return SimpleNamespace(past_key_values=tuple((states.clone(), states.clone()) for _ in range(LAYERS)))
+
+
+def make_cache(**kwargs):
+    model = CountingModel()
+    return model, PrefixKVCache(model, CharTokenizer(), **kwargs)
+
+
+def test_a_repeated_prefix_is_prefilled_once():
+    model, cache = make_cache()
+    ids, first = cache.get("instructions")
+    again_ids, again = cache.get("instructions")
+    assert model.prefilled == [len("instructions")]
+    assert torch.equal(ids, again_ids)
+    assert all(torch.equal(a, b) for layer_a, layer_b in zip(first, again) for a, b in zip(layer_a, layer_b))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["savedPrefillTokens"] == len("instructions")
+
+
+def test_callers_get_a_private_copy():
+    _, cache = make_cache()
+    cache.get("instructions")
+    _, copy = cache.get("instructions")
+    copy[0][0].zero_()  # generate() extends and overwrites the cache it is given
+    _, fresh = cache.get("instructions")
+    assert fresh[0][0].abs().sum() > 0
+
+
+def test_a_changed_prefix_gets_its_own_entry_and_old_ones_age_out():
+    model, cache = make_cache(max_entries=2)
+    for prefix in ["history v1", "history v2", "history v3"]:
+        cache.get(prefix)
+    assert cache.stats()["evictions"] == 1
+    cache.get("history v3")
+    cache.get("history v1")
+    assert model.prefilled == [10, 10, 10, 10]
+
+
+def test_entries_are_bounded_in_memory():
+    _, cache = make_cache(max_mb=1 / 1024)  # 1 KiB
+    _, kv = cache.get("x" * 16)
+    assert cache_bytes(kv) == LAYERS * 2 * 16 * 2 * 4
+    cache.get("y" * 16)
+    assert cache.stats()["entries"] == 2
+    cache.get("z" * 200)  # Larger than the whole budget: used once, never stored
+    assert cache.stats()["entries"] == 2
+    cache.get("w" * 32)  # Fills the budget alone: both older entries are evicted
+    assert cache.stats()["entries"] == 1 and cache.stats()["evictions"] == 2
+
+
+def test_batching_stats_report_the_prefix_cache_without_batching():
+    for module in ("faiss", "sentence_transformers", "transformers"):
+        pytest.importorskip(module)
+    from retrieve_context import LLMPrompt
+
+    llm = LLMPrompt.__new__(LLMPrompt)
+    llm.batchers = {}
+    llm.prefix_cache = None
+    assert llm.batching_stats() is None
+    _, llm.prefix_cache = make_cache()
+    llm.prefix_cache.get("instructions")
+    assert llm.batching_stats() == {"prefixCache": llm.prefix_cache.stats()}
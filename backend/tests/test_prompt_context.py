@@ -0,0 +1,56 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+for module in ("faiss", "sentence_transformers", "torch", "transformers"):
+    pytest.importorskip(module)
+
+from retrieve_context import PROMPT_DEFAULTS, LLMPrompt  # noqa: E402
+from test_spend_ingest import HashedIndex  # noqa: E402
+
+
+class WordTokenizer:
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+
+@pytest.fixture
+def llm(tmp_path):
+    """An LLMPrompt with only what prompt building uses: the spend index and a tokenizer."""
+    llm = LLMPrompt.__new__(LLMPrompt)
+    llm.generator = SimpleNamespace(tokenizer=WordTokenizer())
+    llm.prompt_settings = dict(PROMPT_DEFAULTS)
+    llm.index_lock = threading.Lock()
+    llm.spend_index = HashedIndex(tmp_path, mmap=False)
+    history = {f"row-{i}": f"Item {i} - ${i}.00 x1 - Category: Grocery" for i in range(200)}
+    history["row-game"] = "Video Game - $59.99 x1 - Category: Entertainment"
+    llm.spend_index.upsert(history, payloads={key: {"price": 1.0, "category": text.rsplit(": ", 1)[1]} for key, text in history.items()})
+    return llm
+
+
+def test_history_stays_within_the_token_budget(llm):
+    summary, history = llm.build_history_context("Video Game", k=50, token_budget=60)
+    assert llm.count_tokens(summary) + sum(llm.count_tokens(line + "\n") for line in history.splitlines()) <= 60
+    assert 0 < len(history.splitlines()) < 50
+
+
+def test_history_holds_the_most_relevant_purchases_first(llm):
+    _, history = llm.build_history_context("Video Game - $59.99 x1 - Category: Entertainment", k=3)
+    assert history.splitlines()[0] == "- Video Game - $59.99 x1 - Category: Entertainment"
+    assert len(history.splitlines()) == 3
+
+
+def test_category_totals_cover_the_whole_history(llm):
+    summary, _ = llm.build_history_context("Milk", k=1)
+    assert "- Grocery: 200 purchases, $200.00" in summary
+    assert "- Entertainment: 1 purchases, $1.00" in summary
+
+
+def test_analysis_prompt_does_not_grow_with_the_history(llm):
+    prefix, suffix = llm.build_analysis_prompt('[{"name": "Video Game", "price": 59.99}]', retrieval_length=5)
+    llm.spend_index.upsert({f"more-{i}": f"Extra {i} - $1.00 x1" for i in range(500)})
+    _, longer_suffix = llm.build_analysis_prompt('[{"name": "Video Game", "price": 59.99}]', retrieval_length=5)
+    assert len(suffix.splitlines()) == len(longer_suffix.splitlines())
+    assert sum(line.startswith("- ") for line in suffix.splitlines()) == 5
+    assert prefix.count("purchases, $") == 2
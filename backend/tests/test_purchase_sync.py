@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastAPI.inference import InferenceWorker
+from fastAPI.model_loader import ModelLoader
+
+
+class IndexingModel:
+    """Records the purchases the API sends to the spend index."""
+
+    def __init__(self):
+        self.calls = []
+        self.synced = threading.Condition()
+
+    def ingest_purchases(self, purchases, complete=True):
+        with self.synced:
+            self.calls.append(([item["name"] for _, item in purchases], complete))
+            self.synced.notify_all()
+        return len(purchases), 0
+
+    def wait_for(self, count):
+        with self.synced:
+            assert self.synced.wait_for(lambda: len(self.calls) >= count, timeout=5), self.calls
+        return self.calls[count - 1]
+
+
+def order(*names):
+    return {"orderAmount": 1.0, "itemsInOrder": [{"name": name, "price": 1.0} for name in names], "timestamp": "2025-04-10T08:12:00"}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    import fastAPI.main as api
+
+    model = IndexingModel()
+    monkeypatch.setattr(api, "model_loader", ModelLoader(lambda on_progress: model))
+    monkeypatch.setattr(api, "purchase_sync", {"task": None, "pending": False, "full": True, "cursor": None})
+    # The lifespan shuts these down on exit; keep the ones other tests share
+    monkeypatch.setattr(api, "inference_worker", InferenceWorker())
+    monkeypatch.setattr(api.store, "close", lambda: None)
+    api.model = model
+    return api
+
+
+def test_recorded_purchases_are_synced_incrementally(api):
+    with TestClient(api.app) as client:
+        names, complete = api.model.wait_for(1)
+        assert complete  # Startup: every stored purchase, so removed ones leave the index
+
+        client.post("/spending/record-purchase", json=order("Milk"))
+        assert api.model.wait_for(2) == (["Milk"], False)
+        client.post("/spending/record-purchases", json={"orders": [order("Eggs"), order("Bread", "Jam")]})
+        assert api.model.wait_for(3) == (["Eggs", "Bread", "Jam"], False)
+
+
+def test_reset_resyncs_every_stored_purchase(api):
+    with TestClient(api.app) as client:
+        api.model.wait_for(1)
+        client.post("/spending/record-purchase", json=order("Milk"))
+        api.model.wait_for(2)
+        client.post("/spending/reset")
+        names, complete = api.model.wait_for(3)
+        assert complete and "Milk" not in names
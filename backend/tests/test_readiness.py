@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastAPI.inference import InferenceWorker
+from fastAPI.model_loader import ModelLoader
+
+# Non-essential, so the rules stage leaves it to the LLM
+LLM_ORDER = {"orderAmount": 5.0, "currentSpending": 0, "monthlyLimit": 500, "itemsInOrder": [{"name": "Game", "price": 5.0, "category": "Entertainment"}]}
+
+
+@pytest.fixture
+def api():
+    import fastAPI.main as api
+
+    return api
+
+
+@pytest.fixture
+def loader(api, monkeypatch):
+    """A model loader whose factory blocks until released, so tests can observe it mid-load."""
+    release = threading.Event()
+
+    def factory(on_progress):
+        on_progress("loading weights")
+        release.wait(1)
+        return object()
+
+    loader = ModelLoader(factory)
+    loader.release = release
+    monkeypatch.setattr(api, "model_loader", loader)
+    yield loader
+    release.set()
+
+
+def test_shutdown_cancels_the_model_warmup(api, loader, monkeypatch):
+    # The lifespan shuts these down on exit; keep the ones other tests share
+    monkeypatch.setattr(api, "inference_worker", InferenceWorker())
+    monkeypatch.setattr(api.store, "close", lambda: None)
+    with TestClient(api.app):
+        task = api.model_warmup["task"]
+        assert task is not None and not task.done()
+    assert task.cancelled()
+
+
+@pytest.fixture
+def client(api):
+    api.response_cache.clear()
+    return TestClient(api.app)
+
+
+def start_loading(loader):
+    thread = threading.Thread(target=loader.load)
+    thread.start()
+    while loader.stage != "loading weights":
+        thread.join(0.01)
+    return thread
+
+
+def test_probes_follow_the_model_load(client, loader):
+    thread = start_loading(loader)
+    assert client.get("/healthz").status_code == 200
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["state"] == "loading" and response.json()["stage"] == "loading weights"
+
+    loader.release.set()
+    thread.join()
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json()["state"] == "ready" and response.json()["loadSeconds"] is not None
+
+
+def test_check_order_answers_503_while_the_model_warms_up(client, loader):
+    thread = start_loading(loader)
+    response = client.post("/spending/check-order", json=LLM_ORDER)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "10"
+    assert client.post("/spending/check-order/jobs", json=LLM_ORDER).status_code == 503
+    assert client.post("/spending/check-order/stream", json=LLM_ORDER).status_code == 503
+    loader.release.set()
+    thread.join()
+
+
+def test_rules_still_answer_while_the_model_warms_up(client, loader):
+    thread = start_loading(loader)
+    order = {"orderAmount": 1.0, "currentSpending": 0, "monthlyLimit": 500, "itemsInOrder": [{"name": "Milk", "price": 1.0, "category": "Grocery"}]}
+    response = client.post("/spending/check-order", json=order)
+    assert response.status_code == 200
+    assert response.json()["source"] == "rules"
+    loader.release.set()
+    thread.join()
+
+
+def test_a_failed_load_is_reported(api, client, monkeypatch):
+    def factory(on_progress):
+        raise RuntimeError("weights not found")
+
+    loader = ModelLoader(factory)
+    loader.load()
+    monkeypatch.setattr(api, "model_loader", loader)
+    response = client.get("/readyz")
+    assert response.status_code == 503 and response.json()["error"] == "weights not found"
+    response = client.post("/spending/check-order", json=LLM_ORDER)
+    assert response.status_code == 503 and "weights not found" in response.json()["detail"]
@@ -0,0 +1,38 @@
+import pytest
+
+from fastAPI.rules import RULES_DEFAULTS, evaluate
+
+ESSENTIAL = [{"name": "Milk", "category": "Grocery"}]
+
+
+def verdict(order_amount, current_spending, items=ESSENTIAL, **settings):
+    decision = evaluate(order_amount, current_spending, 100.0, items, {**RULES_DEFAULTS, **settings})
+    return decision and decision.verdict
+
+
+@pytest.mark.parametrize("order_amount, expected", [
+    (20.0, "approve"),  # Projected 80: exactly the approve ratio
+    (20.01, None),  # Just past it: borderline, left to the LLM
+    (40.0, None),  # Projected 100: at the limit is not over it
+    (40.01, "decline"),  # Just over the limit
+])
+def test_ratio_boundaries(order_amount, expected):
+    assert verdict(order_amount, 60.0) == expected
+
+
+def test_non_essential_items_are_never_approved_outright():
+    assert verdict(5.0, 0.0, [{"name": "Headphones", "category": "Electronics"}]) is None
+    assert verdict(5.0, 0.0, [{"name": "Candy", "essential": "no"}]) is None
+
+
+def test_non_essential_items_are_still_declined():
+    assert verdict(50.0, 60.0, [{"name": "Headphones", "category": "Electronics"}]) == "decline"
+
+
+def test_disabled_rules_leave_everything_to_the_llm():
+    assert verdict(500.0, 60.0, enabled=False) is None
+
+
+def test_messages_use_the_numbers_they_decided_on():
+    decision = evaluate(50.0, 60.0, 100.0, ESSENTIAL, RULES_DEFAULTS)
+    assert "$110.00" in decision.message and "$10.00 over" in decision.message
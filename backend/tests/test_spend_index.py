@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from test_spend_ingest import HashedIndex  # noqa: E402
+
+
+def records(*texts):
+    return {f"key-{text}": text for text in texts}
+
+
+def test_upsert_embeds_only_new_and_changed_records(tmp_path):
+    index = HashedIndex(tmp_path, mmap=False)
+    assert index.upsert(records("Milk", "Eggs")) == 2
+    assert index.upsert(records("Milk", "Eggs")) == 0
+    assert index.upsert({"key-Milk": "Oat Milk", "key-Eggs": "Eggs"}) == 1
+    assert index.encoded == ["Milk", "Eggs", "Oat Milk"]
+    assert len(index) == 2 and index.index.ntotal == 2
+
+
+def test_remove_drops_records_from_the_index_and_search(tmp_path):
+    index = HashedIndex(tmp_path, mmap=False)
+    index.upsert(records("Milk", "Eggs", "Bread"))
+    assert index.remove(["key-Eggs", "key-missing"]) == 1
+    assert index.index.ntotal == 2
+    assert sorted(index.search("Eggs", k=5)) == ["Bread", "Milk"]
+
+
+def test_search_returns_the_closest_records(tmp_path):
+    index = HashedIndex(tmp_path, mmap=False)
+    index.upsert(records("aaaa", "abab", "zzzz"))
+    assert index.search("aaaa", k=2) == ["aaaa", "abab"]
+    assert HashedIndex(tmp_path / "empty", mmap=False).search("aaaa") == []
+
+
+def test_category_totals_follow_payloads(tmp_path):
+    index = HashedIndex(tmp_path, mmap=False)
+    index.upsert(records("Milk", "Game"), payloads={
+        "key-Milk": {"name": "Milk", "price": 3.5, "quantity": 2, "category": "Grocery"},
+        "key-Game": {"name": "Game", "price": 40.0},
+    })
+    assert index.category_totals == {"Grocery": {"count": 1, "total": 7.0}, "Uncategorized": {"count": 1, "total": 40.0}}
+    index.remove(["key-Game"])
+    assert index.category_totals == {"Grocery": {"count": 1, "total": 7.0}}
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_saved_index_is_reloaded_and_stays_writable(tmp_path, mmap):
+    index = HashedIndex(tmp_path, mmap=False)
+    index.upsert(records("Milk", "Eggs"))
+    index.save()
+
+    reloaded = HashedIndex(tmp_path, mmap=mmap)
+    assert len(reloaded) == 2 and reloaded.encoded == []
+    assert reloaded.search("Milk", k=1) == ["Milk"]
+    # The first write after a memory-mapped load reads the index in full
+    assert reloaded.upsert(records("Bread")) == 1
+    assert reloaded.writable and reloaded.index.ntotal == 3
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+import faiss  # noqa: E402
+
+from spend_index import SpendIndex  # noqa: E402
+from spend_ingest import SpendIngestor  # noqa: E402
+
+DIM = 8
+
+
+class HashedIndex(SpendIndex):
+    """A SpendIndex with a deterministic bag-of-characters embedder instead of the sentence model."""
+
+    def __init__(self, index_dir, **kwargs):
+        self.encoded = []
+        super().__init__(index_dir=str(index_dir), **kwargs)
+
+    def _new_index(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(DIM))
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), DIM), dtype="float32")
+        for row, text in enumerate(texts):
+            for char in text.lower():
+                vectors[row, ord(char) % DIM] += 1
+        return vectors
+
+
+@pytest.fixture
+def ingestor(tmp_path):
+    index = HashedIndex(tmp_path / "index", mmap=False)
+    return SpendIngestor(index, state_file=str(tmp_path / "state.json"), save_interval_s=3600)
+
+
+def purchase(row_id, name, price=1.0):
+    return str(row_id), {"name": name, "price": price, "category": "Grocery"}
+
+
+def test_new_purchases_are_indexed_without_a_full_pass(ingestor, tmp_path):
+    ingestor.ingest_purchases([purchase(1, "Milk"), purchase(2, "Eggs")])
+    saved = (tmp_path / "index" / "meta.json").stat().st_mtime_ns
+
+    assert ingestor.ingest_purchases([purchase(3, "Bread")], complete=False) == (1, 0)
+    assert ingestor.index.encoded[-1:] == ["Bread - $1.00 x1 - Category: Grocery"]
+    assert len(ingestor.index) == 3
+    # Earlier purchases stay indexed, and nothing is written until the save interval passes
+    assert (tmp_path / "index" / "meta.json").stat().st_mtime_ns == saved
+    assert ingestor.unsaved
+
+
+def test_incremental_purchases_are_saved_once_due(ingestor, tmp_path):
+    ingestor.save_interval_s = 0
+    ingestor.ingest_purchases([purchase(1, "Milk")], complete=False)
+    assert not ingestor.unsaved
+    reloaded = SpendIngestor(HashedIndex(tmp_path / "index", mmap=False), state_file=str(tmp_path / "state.json"))
+    assert len(reloaded.index) == 1 and len(reloaded.store_keys) == 1
+
+
+def test_complete_sync_removes_purchases_gone_from_storage(ingestor):
+    ingestor.ingest_purchases([purchase(1, "Milk"), purchase(2, "Eggs")])
+    ingestor.ingest_purchases([purchase(3, "Bread")], complete=False)
+    assert ingestor.ingest_purchases([purchase(3, "Bread")]) == (0, 2)
+    assert [record["data"]["name"] for record in ingestor.index.records.values()] == ["Bread"]
+
+
+def test_parsers_read_the_same_purchase_from_every_format(tmp_path):
+    from spend_ingest import PARSERS
+
+    (tmp_path / "history.txt").write_text(
+        "1. Milk - Essential - $3.50 x2 - Bought on 2025-04-10 08:12AM - Category: Grocery\nnot a record\n")
+    (tmp_path / "history.csv").write_text(
+        "name,essential,price,quantity,date_bought_on,category\nMilk,Yes,$3.50,2,2025-04-10 08:12AM,Grocery\n")
+    (tmp_path / "history.jsonl").write_text(
+        '{"name": "Milk", "essential": true, "price": 3.5, "quantity": 2, "date_bought_on": "2025-04-10 08:12AM", "category": "Grocery"}\n{broken\n')
+    (tmp_path / "history.json").write_text(
+        '{"items": [{"name": "Milk", "essential": "yes", "price": "3.50", "quantity": 2, "date_bought_on": "2025-04-10 08:12AM", "category": "Grocery"}]}')
+
+    parsed = {path.suffix: [record for record, _ in PARSERS[path.suffix](path, 0)] for path in tmp_path.iterdir()}
+    assert all(len(records) == 1 for records in parsed.values())
+    assert len({records[0].record_hash for records in parsed.values()}) == 1
+    assert parsed[".txt"][0].text == "Milk - Essential - $3.50 x2 - Bought on 2025-04-10 08:12AM - Category: Grocery"
+
+
+def test_run_resumes_appended_files_and_skips_unchanged_ones(ingestor, tmp_path):
+    history = tmp_path / "spend" / "history.txt"
+    history.parent.mkdir()
+    history.write_text("1. Milk - Essential - $3.50 x1 - Bought on 2025-04-10 08:12AM\n")
+    assert ingestor.run([str(history.parent)]) == 1
+
+    with open(history, "a") as f:
+        f.write("2. Eggs - Essential - $2.99 x1 - Bought on 2025-04-11 09:00AM\n3. Bread - Ess")  # Last line still being written
+    ingestor.index.encoded.clear()
+    assert ingestor.run([str(history.parent)]) == 1
+    assert ingestor.index.encoded == ["Eggs - Essential - $2.99 x1 - Bought on 2025-04-11 09:00AM"]
+    assert ingestor.run([str(history.parent)]) == 0
+
+
+def test_run_removes_records_of_deleted_files(ingestor, tmp_path):
+    folder = tmp_path / "spend"
+    folder.mkdir()
+    (folder / "a.txt").write_text("1. Milk - Essential - $3.50 x1 - Bought on 2025-04-10 08:12AM\n")
+    (folder / "b.txt").write_text("1. Eggs - Essential - $2.99 x1 - Bought on 2025-04-11 09:00AM\n")
+    ingestor.run([str(folder)])
+    (folder / "b.txt").unlink()
+    ingestor.run([str(folder)])
+    assert [record["data"]["name"] for record in ingestor.index.records.values()] == ["Milk"]
@@ -0,0 +1,78 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+def order(amount, *items):
+    return {"orderAmount": amount, "timestamp": "2025-04-10T08:12:00",
+            "itemsInOrder": [{"name": name, "price": price, **({"category": category} if category else {})}
+                             for name, price, category in items]}
+
+
+@pytest.fixture
+def client():
+    import fastAPI.main as api
+
+    client = TestClient(api.app)
+    client.post("/spending/reset").raise_for_status()
+    return client
+
+
+def test_record_purchases_records_every_order_in_one_write(client):
+    response = client.post("/spending/record-purchases", json={"orders": [
+        order(3.5, ("Milk", 3.5, "Grocery")),
+        order(45.0, ("Game", 40.0, "Entertainment"), ("Snack", 5.0, None)),
+    ]})
+    assert response.status_code == 200
+    assert response.json()["recorded"] == 2
+    assert response.json()["currentSpending"] == 48.5
+
+    monthly = client.get("/spending/monthly").json()
+    assert monthly["currentSpending"] == 48.5
+    assert [item["name"] for item in monthly["items"]] == ["Milk", "Game", "Snack"]
+    assert monthly["categoryTotals"] == {"Grocery": 3.5, "Entertainment": 40.0, "Uncategorized": 5.0}
+
+
+def test_record_purchases_adds_to_single_records(client):
+    client.post("/spending/record-purchase", json=order(2.0, ("Eggs", 2.0, "Grocery"))).raise_for_status()
+    response = client.post("/spending/record-purchases", json={"orders": [order(3.5, ("Milk", 3.5, "Grocery"))]})
+    assert response.json()["currentSpending"] == 5.5
+    assert client.get("/spending/monthly?summary=true").json()["itemCount"] == 2
+
+
+@pytest.mark.parametrize("orders", [
+    [],
+    [{"orderAmount": 3.5, "timestamp": "2025-04-10T08:12:00", "itemsInOrder": [{"name": "Milk", "price": 3.5}]},
+     {"orderAmount": 2.0, "timestamp": "2025-04-10T08:12:00", "itemsInOrder": [{"name": "Eggs", "price": -2.0}]}],
+])
+def test_record_purchases_rejects_the_whole_batch(client, orders):
+    response = client.post("/spending/record-purchases", json={"orders": orders})
+    assert response.status_code == 422
+    # Nothing of the batch is recorded, not even its valid orders
+    summary = client.get("/spending/monthly?summary=true").json()
+    assert summary["currentSpending"] == 0 and summary["itemCount"] == 0
+
+
+def test_record_purchases_invalidates_cached_advice(client):
+    import fastAPI.main as api
+
+    generation = api.response_cache.generation
+    client.post("/spending/record-purchases", json={"orders": [order(3.5, ("Milk", 3.5, "Grocery"))]}).raise_for_status()
+    assert api.response_cache.generation > generation
+
+
+def test_items_are_paged_with_a_cursor(client):
+    client.post("/spending/record-purchases", json={"orders": [order(1.0, (f"Item {i}", 1.0, None)) for i in range(5)]}).raise_for_status()
+    first = client.get("/spending/monthly/items?limit=2").json()
+    assert [item["name"] for item in first["items"]] == ["Item 0", "Item 1"]
+    second = client.get(f"/spending/monthly/items?limit=2&cursor={first['nextCursor']}").json()
+    assert [item["name"] for item in second["items"]] == ["Item 2", "Item 3"]
+    last = client.get(f"/spending/monthly/items?limit=2&cursor={second['nextCursor']}").json()
+    assert [item["name"] for item in last["items"]] == ["Item 4"] and last["nextCursor"] is None
+    # Summary mode leaves the items to the paged endpoint
+    summary = client.get("/spending/monthly?summary=true").json()
+    assert summary["items"] == [] and summary["itemCount"] == 5
+
+
+@pytest.mark.parametrize("query, status", [("cursor=abc", 400), ("cursor=-1", 400), ("limit=0", 422), ("limit=501", 422)])
+def test_items_rejects_invalid_paging(client, query, status):
+    assert client.get(f"/spending/monthly/items?{query}").status_code == status
@@ -0,0 +1,236 @@
+import datetime
+import glob
+import json
+import os
+
+import pytest
+
+from fastAPI import models
+from fastAPI.storage import JsonWalStorage, SqliteStorage
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, "DATA_FILE", str(tmp_path / "spending_data.json"))
+    return tmp_path
+
+
+def crash(storage: JsonWalStorage):
+    """Drops the storage without the compaction close() would run, as a killed process would."""
+    storage._wal.close()
+    if storage._process_lock is not None:
+        storage._process_lock.close()
+
+
+def test_replays_logged_writes_after_a_crash(data_dir):
+    wal_file = str(data_dir / "spending_data.wal")
+    storage = JsonWalStorage(wal_file, compact_every=100)
+    storage.ensure_month(2025, 4)
+    storage.set_limit(500)
+    storage.record_purchases(2025, 4, [([{"name": "Milk", "price": 3.5, "category": "Grocery"}], 3.5)])
+    storage.record_purchase(2025, 4, [{"name": "Game", "price": 40}], 40)
+    crash(storage)
+
+    recovered = JsonWalStorage(wal_file, compact_every=100)
+    summary = recovered.get_summary(2025, 4)
+    assert recovered.monthly_limit == 500
+    assert summary["spending_cents"] == 4350
+    assert summary["category_cents"] == {"Grocery": 350, "Uncategorized": 4000}
+    assert [item["name"] for item in recovered.get_month(2025, 4)["items_purchased"]] == ["Milk", "Game"]
+    recovered.close()
+
+
+def test_ignores_a_torn_last_log_line(data_dir):
+    wal_file = str(data_dir / "spending_data.wal")
+    storage = JsonWalStorage(wal_file, compact_every=100)
+    storage.record_purchase(2025, 4, [{"name": "Milk", "price": 3.5}], 3.5)
+    crash(storage)
+    with open(wal_file, "a") as f:
+        f.write('{"op": "set_limit", "limit": 9')
+
+    recovered = JsonWalStorage(wal_file, compact_every=100)
+    assert recovered.get_summary(2025, 4)["spending_cents"] == 350
+    assert recovered.monthly_limit != 9
+    recovered.close()
+
+
+def test_compaction_snapshots_and_drops_covered_segments(data_dir):
+    wal_file = str(data_dir / "spending_data.wal")
+    storage = JsonWalStorage(wal_file, compact_every=3)
+    for _ in range(4):
+        storage.record_purchase(2025, 4, [{"name": "Milk", "price": 1}], 1)
+    storage.compact()
+
+    assert glob.glob(f"{wal_file}.*[0-9]") == []
+    with open(models.DATA_FILE) as f:
+        snapshot = json.load(f)
+    assert snapshot["_wal_seq"] == 4
+    assert len(snapshot["monthly_data"]["4"]["items_purchased"]) == 4
+    storage.record_purchase(2025, 4, [{"name": "Bread", "price": 2}], 2)
+    crash(storage)
+
+    # The snapshot covers the first four writes; only the fifth is replayed on top of it
+    recovered = JsonWalStorage(wal_file, compact_every=3)
+    assert recovered.get_summary(2025, 4)["spending_cents"] == 600
+    assert recovered.get_summary(2025, 4)["item_count"] == 5
+    recovered.close()
+
+
+def test_refuses_a_second_process_on_the_same_files(data_dir):
+    wal_file = str(data_dir / "spending_data.wal")
+    storage = JsonWalStorage(wal_file)
+    if storage._process_lock is None:
+        pytest.skip("file locking is unavailable on this platform")
+    with pytest.raises(RuntimeError, match="sqlite"):
+        JsonWalStorage(wal_file)
+    storage.close()
+    assert os.path.exists(models.DATA_FILE)
+
+
+def test_compaction_after_a_failed_snapshot_keeps_its_segment(data_dir, monkeypatch):
+    wal_file = str(data_dir / "spending_data.wal")
+    storage = JsonWalStorage(wal_file, compact_every=100)
+    storage.record_purchase(2025, 4, [{"name": "Milk", "price": 3.5}], 3.5)
+    with monkeypatch.context() as m:
+        m.setattr(models, "write_data_file", lambda data: False)
+        storage.compact()
+    assert os.path.exists(f"{wal_file}.{storage._seq}")
+
+    # No writes since: the empty active log must not be rotated over the kept segment
+    with monkeypatch.context() as m:
+        m.setattr(models, "write_data_file", lambda data: False)
+        storage.compact()
+    crash(storage)
+
+    recovered = JsonWalStorage(wal_file, compact_every=100)
+    assert recovered.get_summary(2025, 4)["spending_cents"] == 350
+    recovered.close()
+
+
+def test_appends_after_a_torn_line_are_replayed(data_dir):
+    wal_file = str(data_dir / "spending_data.wal")
+    storage = JsonWalStorage(wal_file, compact_every=100)
+    storage.record_purchase(2025, 4, [{"name": "Milk", "price": 3.5}], 3.5)
+    crash(storage)
+    with open(wal_file, "a") as f:
+        f.write('{"op": "set_limit", "limit": 9')
+
+    restarted = JsonWalStorage(wal_file, compact_every=100)
+    restarted.record_purchase(2025, 4, [{"name": "Bread", "price": 2}], 2)
+    crash(restarted)
+
+    recovered = JsonWalStorage(wal_file, compact_every=100)
+    assert recovered.get_summary(2025, 4)["spending_cents"] == 550
+    recovered.close()
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, data_dir):
+    if request.param == "json":
+        storage = JsonWalStorage(str(data_dir / "spending_data.wal"))
+    else:
+        storage = SqliteStorage(str(data_dir / "spending.db"))
+    yield storage
+    storage.close()
+
+
+def names(purchases):
+    return [item["name"] for _, item in purchases]
+
+
+def test_iter_purchases_resumes_after_its_cursor(storage):
+    storage.reset_month(2025, 4)
+    storage.record_purchases(2025, 4, [([{"name": "Milk", "price": 3.5}], 3.5), ([{"name": "Eggs", "price": 2}], 2)])
+    everything, cursor = storage.iter_purchases()
+    assert names(everything) == ["Milk", "Eggs"]
+    assert storage.iter_purchases(cursor) == ([], cursor)
+
+    storage.record_purchase(2025, 4, [{"name": "Bread", "price": 2.5}], 2.5)
+    storage.record_purchase(2025, 5, [{"name": "Jam", "price": 4}], 4)
+    new, _ = storage.iter_purchases(cursor)
+    assert sorted(names(new)) == ["Bread", "Jam"]
+    # Row ids stay the same whether an item is read in full or after a cursor
+    all_rows = dict(storage.iter_purchases()[0])
+    assert all(all_rows[row_id] == item for row_id, item in new)
+
+
+def test_aggregates_follow_recorded_purchases(storage):
+    storage.reset_month(2025, 4)
+    total = storage.record_purchases(2025, 4, [
+        ([{"name": "Milk", "price": 0.1, "quantity": 3, "category": "Grocery"}, {"name": "Game", "price": 40}], 40.3),
+        ([{"name": "Bread", "price": 0.2, "category": "Grocery"}], 0.2),
+    ])
+    assert total == 40.5
+    summary = storage.get_summary(2025, 4)
+    # Totals are kept in integer cents, so repeated small prices don't drift
+    assert summary == {"spending_cents": 4050, "category_cents": {"Grocery": 50, "Uncategorized": 4000}, "item_count": 3}
+    assert storage.get_category_totals(2025, 4) == {"Grocery": 0.5, "Uncategorized": 40.0}
+    assert storage.get_month(2025, 4)["current_spending"] == 40.5
+
+    storage.reset_month(2025, 4)
+    assert storage.get_summary(2025, 4) == {"spending_cents": 0, "category_cents": {}, "item_count": 0}
+    assert storage.get_month(2025, 4)["items_purchased"] == []
+
+
+def test_replace_round_trips_the_data_document(storage):
+    document = {
+        "monthly_limit": 250.0,
+        "current_month": 4,
+        "monthly_data": {"4": {"current_spending": 5.5, "items_purchased": [
+            {"name": "Milk", "price": 3.5, "category": "Grocery"}, {"name": "Pen", "price": 1, "quantity": 2},
+        ]}},
+    }
+    storage.replace(document)
+    assert storage.monthly_limit == 250.0 and storage.current_month == 4
+    assert storage.snapshot()["monthly_data"]["4"] == document["monthly_data"]["4"]
+    year = datetime.datetime.now().year
+    assert storage.get_summary(year, 4)["category_cents"] == {"Grocery": 350, "Uncategorized": 200}
+
+
+def test_sqlite_imports_the_json_data_file_once_and_persists(data_dir):
+    models.write_data_file({
+        "monthly_limit": 300.0,
+        "current_month": 4,
+        "monthly_data": {"4": {"current_spending": 3.5, "items_purchased": [{"name": "Milk", "price": 3.5}]}},
+    })
+    db_file = str(data_dir / "spending.db")
+    storage = SqliteStorage(db_file)
+    assert storage.monthly_limit == 300.0
+    year = datetime.datetime.now().year
+    storage.record_purchase(year, 4, [{"name": "Eggs", "price": 2, "category": "Grocery"}], 2)
+    storage.set_limit(400)
+    storage.close()
+
+    # Reopening keeps the database's rows rather than importing the JSON file again
+    models.write_data_file(models.get_default_data())
+    reopened = SqliteStorage(db_file)
+    assert reopened.monthly_limit == 400
+    assert [item["name"] for item in reopened.get_month(year, 4)["items_purchased"]] == ["Milk", "Eggs"]
+    assert reopened.get_summary(year, 4)["spending_cents"] == 550
+    reopened.close()
+
+
+def test_sqlite_keeps_years_apart(data_dir):
+    storage = SqliteStorage(str(data_dir / "spending.db"))
+    storage.record_purchase(2024, 4, [{"name": "Milk", "price": 3.5}], 3.5)
+    storage.record_purchase(2025, 4, [{"name": "Eggs", "price": 2}], 2)
+    assert storage.get_summary(2024, 4)["spending_cents"] == 350
+    assert storage.get_summary(2025, 4)["spending_cents"] == 200
+    storage.reset_month(2024, 4)
+    assert storage.get_summary(2025, 4)["item_count"] == 1
+    storage.close()
+
+
+def test_get_items_pages_through_the_month_in_order(storage):
+    storage.reset_month(2025, 4)
+    storage.record_purchases(2025, 4, [([{"name": f"Item {i}", "price": 1}], 1) for i in range(7)])
+    storage.record_purchase(2025, 5, [{"name": "Other month", "price": 1}], 1)
+
+    pages, cursor = [], None
+    while True:
+        items, cursor = storage.get_items(2025, 4, cursor, 3)
+        pages.append([item["name"] for item in items])
+        if cursor is None:
+            break
+    assert pages == [["Item 0", "Item 1", "Item 2"], ["Item 3", "Item 4", "Item 5"], ["Item 6"]]
+    assert storage.get_items(2025, 6, None, 3) == ([], None)
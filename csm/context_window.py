@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+
+
+@dataclass(frozen=True)
+class SegmentSpan:
+    """Token layout of one context segment: its text rows, then audio frames and the EOS frame."""
+
+    text_len: int
+    length: int
+    pinned: bool = False
+
+    @property
+    def audio_frames(self) -> int:
+        return self.length - self.text_len - 1
+
+
+def plan_context_trim(spans: List[SegmentSpan], overflow: int, min_frames: int = 1) -> List[Tuple[int, int, int]]:
+    """Chooses what to drop so the context shrinks by at least overflow tokens.
+
+    Oldest non-pinned segments go first. When dropping a whole segment would free more than
+    needed, only its leading audio frames are cut (keeping its text and at least min_frames
+    frames), so the window keeps as much recent context as fits.
+
+    Returns:
+        (segment index, start within the segment, token count) ranges, oldest segment first
+    """
+    cuts = []
+    for index, span in enumerate(spans):
+        if overflow <= 0:
+            break
+        if span.pinned:
+            continue
+        if overflow <= span.audio_frames - min_frames:
+            cuts.append((index, span.text_len, overflow))
+            overflow = 0
+        else:
+            cuts.append((index, 0, span.length))
+            overflow -= span.length
+    if overflow > 0:
+        raise ValueError(f"Context does not fit: pinned segments and the new text exceed the budget by {overflow} tokens")
+    return cuts
@@ -1,11 +1,13 @@
-from dataclasses import dataclass
-from typing import List, Tuple
+from dataclasses import dataclass, replace
+from typing import Iterator, List, Optional, Tuple
 
 import torch
 import torchaudio
+from context_window import SegmentSpan, plan_context_trim
 from huggingface_hub import hf_hub_download
 from models import Model
 from moshi.models import loaders
+from segment_cache import SegmentTokenCache, segment_key
 from tokenizers.processors import TemplateProcessing
 from transformers import AutoTokenizer
 from watermarking import CSM_1B_GH_WATERMARK, load_watermarker, watermark
@@ -17,6 +19,8 @@ class Segment:
     text: str
     # (num_samples,), sample_rate = 24_000
     audio: torch.Tensor
+    # Pinned segments (e.g. speaker reference prompts) are never evicted to fit the context window
+    pinned: bool = False
 
 
 def load_llama3_tokenizer():
@@ -40,9 +44,14 @@ class Generator:
     def __init__(
         self,
         model: Model,
+        segment_cache: Optional[SegmentTokenCache] = None,
     ):
         self._model = model
         self._model.setup_caches(1)
+        self._cache_batch_size = 1
+
+        # Tokenized context segments, so repeated context (e.g. speaker prompts) isn't re-encoded
+        self._segment_cache = segment_cache or SegmentTokenCache()
 
         self._text_tokenizer = load_llama3_tokenizer()
 
@@ -57,6 +66,9 @@ class Generator:
         self.sample_rate = mimi.sample_rate
         self.device = device
 
+        # Conversation whose history is in the model's backbone cache
+        self._active_conversation = None
+
     def _tokenize_text_segment(self, text: str, speaker: int) -> Tuple[torch.Tensor, torch.Tensor]:
         frame_tokens = []
         frame_masks = []
@@ -100,24 +112,36 @@ class Generator:
         Returns:
             (seq_len, 33), (seq_len, 33)
         """
+        key = segment_key(segment.speaker, segment.text, segment.audio)
+        cached = self._segment_cache.get(key, self.device)
+        if cached is not None:
+            return cached
+
         text_tokens, text_masks = self._tokenize_text_segment(segment.text, segment.speaker)
         audio_tokens, audio_masks = self._tokenize_audio(segment.audio)
 
-        return torch.cat([text_tokens, audio_tokens], dim=0), torch.cat([text_masks, audio_masks], dim=0)
+        tokens, masks = torch.cat([text_tokens, audio_tokens], dim=0), torch.cat([text_masks, audio_masks], dim=0)
+        self._segment_cache.put(key, tokens, masks)
+        return tokens, masks
 
     @torch.inference_mode()
-    def generate(
-        self,
-        text: str,
-        speaker: int,
-        context: List[Segment],
-        max_audio_length_ms: float = 90_000,
-        temperature: float = 0.9,
-        topk: int = 50,
-    ) -> torch.Tensor:
-        self._model.reset_caches()
-
-        max_generation_len = int(max_audio_length_ms / 80)
+    def save_segment_tokens(self, segments: List[Segment], path: str):
+        """Tokenizes segments (e.g. speaker prompts) into one compact file for load_segment_tokens."""
+        for segment in segments:
+            self._tokenize_segment(segment)
+        self._segment_cache.save(path, [segment_key(s.speaker, s.text, s.audio) for s in segments])
+
+    def load_segment_tokens(self, path: str) -> int:
+        """Loads a file written by save_segment_tokens; those segments then never hit the Mimi encoder."""
+        return self._segment_cache.load(path, self.device)
+
+    def _prepare_prompt(
+        self, text: str, speaker: int, context: List[Segment], max_generation_len: int
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Returns:
+            (seq_len, 33), (seq_len, 33) tokens and mask of the context followed by the text to speak
+        """
         tokens, tokens_mask = [], []
         for segment in context:
             segment_tokens, segment_tokens_mask = self._tokenize_segment(segment)
@@ -125,30 +149,51 @@ class Generator:
             tokens_mask.append(segment_tokens_mask)
 
         gen_segment_tokens, gen_segment_tokens_mask = self._tokenize_text_segment(text, speaker)
+
+        # Past the budget, the oldest non-pinned context is dropped (whole segments or leading audio frames)
+        max_seq_len = self._model.backbone.max_seq_len
+        max_context_len = max_seq_len - max_generation_len
+        overflow = sum(t.size(0) for t in tokens) + gen_segment_tokens.size(0) - (max_context_len - 1)
+        if overflow > 0:
+            spans = [
+                SegmentSpan(int(mask[:, -1].sum()), mask.size(0), segment.pinned)
+                for segment, mask in zip(context, tokens_mask)
+            ]
+            for index, start, count in plan_context_trim(spans, overflow):
+                tokens[index] = torch.cat([tokens[index][:start], tokens[index][start + count:]], dim=0)
+                tokens_mask[index] = torch.cat([tokens_mask[index][:start], tokens_mask[index][start + count:]], dim=0)
+
         tokens.append(gen_segment_tokens)
         tokens_mask.append(gen_segment_tokens_mask)
 
         prompt_tokens = torch.cat(tokens, dim=0).long().to(self.device)
         prompt_tokens_mask = torch.cat(tokens_mask, dim=0).bool().to(self.device)
 
-        samples = []
+        return prompt_tokens, prompt_tokens_mask
+
+    def _generate_frames(
+        self,
+        prompt_tokens: torch.Tensor,
+        prompt_tokens_mask: torch.Tensor,
+        max_generation_len: int,
+        temperature: float,
+        topk: int,
+        start_pos: int = 0,
+    ) -> Iterator[torch.Tensor]:
+        """Yields (1, 32) audio frames until EOS or max_generation_len.
+
+        The prompt is placed at start_pos, after whatever the backbone cache already holds.
+        """
         curr_tokens = prompt_tokens.unsqueeze(0)
         curr_tokens_mask = prompt_tokens_mask.unsqueeze(0)
-        curr_pos = torch.arange(0, prompt_tokens.size(0)).unsqueeze(0).long().to(self.device)
-
-        max_seq_len = 2048
-        max_context_len = max_seq_len - max_generation_len
-        if curr_tokens.size(1) >= max_context_len:
-            raise ValueError(
-                f"Inputs too long, must be below max_seq_len - max_generation_len: {max_context_len}"
-            )
+        curr_pos = torch.arange(start_pos, start_pos + prompt_tokens.size(0)).unsqueeze(0).long().to(self.device)
 
         for _ in range(max_generation_len):
             sample = self._model.generate_frame(curr_tokens, curr_tokens_mask, curr_pos, temperature, topk)
             if torch.all(sample == 0):
                 break  # eos
 
-            samples.append(sample)
+            yield sample
 
             curr_tokens = torch.cat([sample, torch.zeros(1, 1).long().to(self.device)], dim=1).unsqueeze(1)
             curr_tokens_mask = torch.cat(
@@ -156,21 +201,384 @@ class Generator:
             ).unsqueeze(1)
             curr_pos = curr_pos[:, -1:] + 1
 
-        audio = self._audio_tokenizer.decode(torch.stack(samples).permute(1, 2, 0)).squeeze(0).squeeze(0)
-
+    def _watermark(self, audio: torch.Tensor) -> torch.Tensor:
         # This applies an imperceptible watermark to identify audio as AI-generated.
         # Watermarking ensures transparency, dissuades misuse, and enables traceability.
         # Please be a responsible AI citizen and keep the watermarking in place.
         # If using CSM 1B in another application, use your own private key and keep it secret.
         audio, wm_sample_rate = watermark(self._watermarker, audio, self.sample_rate, CSM_1B_GH_WATERMARK)
-        audio = torchaudio.functional.resample(audio, orig_freq=wm_sample_rate, new_freq=self.sample_rate)
+        return torchaudio.functional.resample(audio, orig_freq=wm_sample_rate, new_freq=self.sample_rate)
 
-        return audio
+    @torch.inference_mode()
+    def generate(
+        self,
+        text: str,
+        speaker: int,
+        context: List[Segment],
+        max_audio_length_ms: float = 90_000,
+        temperature: float = 0.9,
+        topk: int = 50,
+    ) -> torch.Tensor:
+        self._activate(None)
+
+        max_generation_len = int(max_audio_length_ms / 80)
+        prompt_tokens, prompt_tokens_mask = self._prepare_prompt(text, speaker, context, max_generation_len)
+        samples = list(self._generate_frames(prompt_tokens, prompt_tokens_mask, max_generation_len, temperature, topk))
+
+        audio = self._audio_tokenizer.decode(torch.stack(samples).permute(1, 2, 0)).squeeze(0).squeeze(0)
+
+        return self._watermark(audio)
+
+    @torch.inference_mode()
+    def generate_stream(
+        self,
+        text: str,
+        speaker: int,
+        context: List[Segment],
+        max_audio_length_ms: float = 90_000,
+        temperature: float = 0.9,
+        topk: int = 50,
+        chunk_frames: int = 6,
+        watermark_context_frames: int = 25,
+    ) -> Iterator[torch.Tensor]:
+        """Like generate, but yields watermarked PCM chunks (num_samples,) as the audio is produced.
+
+        Every chunk_frames frames (80 ms each) are decoded with Mimi's streaming state, so the
+        decoder carries its convolution state across chunks instead of re-decoding the whole
+        sequence. Each chunk is watermarked together with the preceding watermark_context_frames
+        of audio, and consecutive chunks are crossfaded over a few milliseconds, so chunk edges
+        don't click and every watermark pass sees seconds of audio rather than a short chunk.
+        The samples differ from generate's (whose watermark covers the whole utterance). Memory
+        stays flat however long the utterance is. Frames are only generated as chunks are
+        consumed; the model's caches are in use until the iterator is exhausted or closed, so
+        don't interleave other generate calls.
+        """
+        if chunk_frames < 1:
+            raise ValueError("chunk_frames must be at least 1")
+        self._activate(None)
+
+        max_generation_len = int(max_audio_length_ms / 80)
+        prompt_tokens, prompt_tokens_mask = self._prepare_prompt(text, speaker, context, max_generation_len)
+
+        def decoded_chunks() -> Iterator[torch.Tensor]:
+            pending = []
+            with self._audio_tokenizer.streaming(batch_size=1):
+                for sample in self._generate_frames(prompt_tokens, prompt_tokens_mask, max_generation_len, temperature, topk):
+                    pending.append(sample)
+                    if len(pending) == chunk_frames:
+                        yield self._decode_chunk(pending)
+                        pending = []
+                if pending:
+                    yield self._decode_chunk(pending)
+
+        yield from self._watermark_stream(decoded_chunks(), watermark_context_frames * 1920)
+
+    @torch.inference_mode()
+    def generate_batch(
+        self,
+        texts: List[str],
+        speakers: List[int],
+        contexts: Optional[List[List[Segment]]] = None,
+        max_audio_length_ms: float = 90_000,
+        temperature: float = 0.9,
+        topk: int = 50,
+    ) -> List[torch.Tensor]:
+        """Generates one utterance per text in a single batch; returns their audio in order.
+
+        Prompts of different lengths are left-padded: each row keeps its own positions, and its
+        attention mask hides the padding. A row that reaches EOS is dropped from the caches, so
+        finished rows stop costing compute. Each row is decoded and watermarked on its own.
+        """
+        contexts = contexts if contexts is not None else [[] for _ in texts]
+        if not len(texts) == len(speakers) == len(contexts):
+            raise ValueError("texts, speakers and contexts must have the same length")
+        if not texts:
+            return []
+
+        max_generation_len = int(max_audio_length_ms / 80)
+        prompts = [
+            self._prepare_prompt(text, speaker, context, max_generation_len)
+            for text, speaker, context in zip(texts, speakers, contexts)
+        ]
+        batch_size = len(prompts)
+        self._activate(None, batch_size=batch_size)
+
+        prompt_len = max(prompt_tokens.size(0) for prompt_tokens, _ in prompts)
+        curr_tokens = torch.zeros(batch_size, prompt_len, 33).long().to(self.device)
+        curr_tokens_mask = torch.zeros(batch_size, prompt_len, 33).bool().to(self.device)
+        for row, (prompt_tokens, prompt_tokens_mask) in enumerate(prompts):
+            curr_tokens[row, prompt_len - prompt_tokens.size(0):] = prompt_tokens
+            curr_tokens_mask[row, prompt_len - prompt_tokens_mask.size(0):] = prompt_tokens_mask
+        pad = torch.tensor([prompt_len - prompt_tokens.size(0) for prompt_tokens, _ in prompts], device=self.device)
+
+        # Cache slot t of a row holds its position t - pad. Queries see the row's slots from pad up
+        # to their own; padding only sees itself, so its hidden states stay finite
+        slots = torch.arange(self._model.backbone.max_seq_len, device=self.device)
+        query_slots = torch.arange(prompt_len, device=self.device)
+        mask = (slots[None, None, :] <= query_slots[None, :, None]) & (slots[None, None, :] >= pad[:, None, None])
+        mask |= slots[None, None, :] == query_slots[None, :, None]
+        curr_pos = (query_slots[None, :] - pad[:, None]).clamp(min=0)
+
+        rows = list(range(batch_size))  # Original index of each row still generating
+        samples: List[List[torch.Tensor]] = [[] for _ in range(batch_size)]
+        for step in range(max_generation_len):
+            sample = self._model.generate_frame(curr_tokens, curr_tokens_mask, curr_pos, temperature, topk, mask=mask)
+            eos = torch.all(sample == 0, dim=1)
+            for live_row, row in enumerate(rows):
+                if not eos[live_row]:
+                    samples[row].append(sample[live_row:live_row + 1])
+            if eos.any():
+                keep = (~eos).nonzero().squeeze(1)
+                if keep.numel() == 0:
+                    break
+                self._model.keep_cache_rows(keep)
+                self._cache_batch_size = keep.numel()
+                rows = [rows[i] for i in keep.tolist()]
+                sample, pad, curr_pos = sample[keep], pad[keep], curr_pos[keep]
+
+            curr_tokens = torch.cat([sample, torch.zeros(len(rows), 1).long().to(self.device)], dim=1).unsqueeze(1)
+            curr_tokens_mask = torch.cat(
+                [torch.ones_like(sample).bool(), torch.zeros(len(rows), 1).bool().to(self.device)], dim=1
+            ).unsqueeze(1)
+            curr_pos = curr_pos[:, -1:] + 1
+            mask = ((slots[None, :] <= prompt_len + step) & (slots[None, :] >= pad[:, None])).unsqueeze(1)
+
+        audios = []
+        for row_samples in samples:
+            if not row_samples:
+                audios.append(torch.zeros(0, device=self.device))
+                continue
+            audio = self._audio_tokenizer.decode(torch.stack(row_samples).permute(1, 2, 0)).squeeze(0).squeeze(0)
+            audios.append(self._watermark(audio))
+        return audios
+
+    def start_conversation(self, context: Optional[List[Segment]] = None) -> "Conversation":
+        """Starts a multi-turn session that keeps the backbone KV cache between turns."""
+        conversation = Conversation(self)
+        if context:
+            conversation.add_context(context)
+        return conversation
+
+    def _activate(self, conversation: Optional["Conversation"], batch_size: int = 1):
+        """Puts conversation's history in the model's backbone cache (None: empty caches for batch_size rows).
+
+        The previously active conversation's cache is saved first, so it resumes without a re-prefill.
+        """
+        active = self._active_conversation
+        if active is not None and active is conversation:
+            return
+        if active is not None:
+            active._cache_state = self._model.save_backbone_cache(active.position)
+        if self._cache_batch_size != batch_size:
+            self._model.setup_caches(batch_size)
+            self._cache_batch_size = batch_size
+        else:
+            self._model.reset_caches()
+        if conversation is not None and conversation._cache_state is not None:
+            self._model.load_backbone_cache(conversation._cache_state, conversation.position)
+            conversation._cache_state = None
+        self._active_conversation = conversation
+
+    def _frames_to_tokens(self, samples: List[torch.Tensor]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Generated frames plus the EOS frame, laid out like a tokenized context segment's audio."""
+        audio_frame = torch.zeros(len(samples) + 1, 33).long().to(self.device)
+        audio_frame_mask = torch.zeros(len(samples) + 1, 33).bool().to(self.device)
+        if samples:
+            audio_frame[:-1, :-1] = torch.cat(samples, dim=0)
+        audio_frame_mask[:, :-1] = True
+        return audio_frame, audio_frame_mask
+
+    def _decode_chunk(self, samples: List[torch.Tensor]) -> torch.Tensor:
+        # (1, 32, len(samples)) -> (len(samples) * 1920,), continuing the streaming decoder state
+        return self._audio_tokenizer.decode(torch.stack(samples).permute(1, 2, 0)).squeeze(0).squeeze(0)
 
+    def _watermark_stream(self, chunks: Iterator[torch.Tensor], context_samples: int) -> Iterator[torch.Tensor]:
+        """Watermarks each chunk within a rolling window of the audio before it.
+
+        The last fade_samples of every output are held back and crossfaded with the next window's
+        version of them, which smooths the seams between separately watermarked windows.
+        """
+        fade_samples = self.sample_rate // 100  # 10 ms
+        context_samples = max(context_samples, fade_samples)
+        history = torch.zeros(0, device=self.device)  # Unwatermarked audio before the next chunk
+        held = torch.zeros(0, device=self.device)  # Watermarked tail not yet yielded
+        for chunk in chunks:
+            window = torch.cat([history, chunk])
+            marked = self._watermark(window)[:window.size(0)]
+            # Resampling can lose a trailing sample; keep the window length
+            marked = torch.nn.functional.pad(marked, (0, window.size(0) - marked.size(0)))
+            fresh = marked[history.size(0) - held.size(0):].clone()
+            if held.numel():
+                ramp = torch.linspace(0, 1, held.size(0), device=fresh.device)
+                fresh[:held.size(0)] = held * (1 - ramp) + fresh[:held.size(0)] * ramp
+            held = fresh[-fade_samples:]
+            yield fresh[:-fade_samples]
+            history = window[-context_samples:]
+        if held.numel():
+            yield held
+
+
+@dataclass(frozen=True)
+class ConversationCheckpoint:
+    position: int
+    num_segments: int
+    num_turns: int
+    evictions: int
+
+
+class Conversation:
+    """Multi-turn session over one Generator that keeps the backbone KV cache across turns.
+
+    Each turn prefills only what is new (added context and the text to speak); earlier turns are
+    already in the cache, so the cost of a turn no longer grows with the conversation. Generated
+    utterances stay in the cache as their sampled audio tokens plus an EOS frame, the same layout
+    as a context segment, so they aren't re-encoded with Mimi either.
+
+    When a turn would not fit in max_seq_len, the oldest non-pinned segments (or their leading
+    audio frames) are evicted from the cache in place: later entries move down and their keys are
+    re-rotated to the new positions, so nothing is re-prefilled and long sessions keep bounded
+    latency and memory.
+
+    Several conversations can share a Generator; switching saves the previous one's cache and
+    restores this one's instead of re-prefilling. Use checkpoint/rollback to undo turns and fork
+    to branch.
+    """
+
+    def __init__(self, generator: Generator):
+        self._generator = generator
+        self._cache_state = None  # Saved backbone cache while another conversation uses the model
+        self.position = 0  # Tokens of the conversation in the backbone cache
+        self.segments: List[Segment] = []
+        self._spans: List[SegmentSpan] = []  # Cache layout of each segment, in order
+        self.evictions = 0
+        # Per generated turn: prefilledTokens (new this turn), savedPrefillTokens (reused from the cache),
+        # evictedTokens (dropped to make room) and frames
+        self.turns: List[dict] = []
+
+    def _make_room(self, num_tokens: int) -> int:
+        """Evicts old context until num_tokens more fit in the cache; returns the evicted token count."""
+        overflow = self.position + num_tokens - self._generator._model.backbone.max_seq_len
+        if overflow <= 0:
+            return 0
+        cuts = plan_context_trim(self._spans, overflow)
+        starts = [sum(span.length for span in self._spans[:index]) for index in range(len(self._spans))]
+        evicted = 0
+        # Last cut first, so the slots of earlier segments don't move underneath us
+        for index, start, count in reversed(cuts):
+            slot = starts[index] + start
+            self._generator._model.evict_backbone_cache(slot, slot + count)
+            self.position -= count
+            evicted += count
+            if count == self._spans[index].length:
+                del self._spans[index]
+                del self.segments[index]
+            else:
+                self._spans[index] = replace(self._spans[index], length=self._spans[index].length - count)
+        self.evictions += 1
+        return evicted
+
+    def _prefill(self, tokens: torch.Tensor, tokens_mask: torch.Tensor):
+        generator = self._generator
+        pos = torch.arange(self.position, self.position + tokens.size(0)).unsqueeze(0).long().to(generator.device)
+        generator._model.prefill(tokens.unsqueeze(0), tokens_mask.unsqueeze(0), pos)
+        self.position += tokens.size(0)
+
+    @torch.inference_mode()
+    def add_context(self, segments: List[Segment]) -> int:
+        """Prefills segments (e.g. speaker prompts or the other side's audio); returns their token count."""
+        generator = self._generator
+        generator._activate(self)
+        tokens, tokens_mask = [], []
+        for segment in segments:
+            segment_tokens, segment_tokens_mask = generator._tokenize_segment(segment)
+            tokens.append(segment_tokens)
+            tokens_mask.append(segment_tokens_mask)
+        if not tokens:
+            return 0
+        self._make_room(sum(t.size(0) for t in tokens))
+        self._prefill(torch.cat(tokens, dim=0), torch.cat(tokens_mask, dim=0))
+        self.segments.extend(segments)
+        self._spans.extend(
+            SegmentSpan(int(mask[:, -1].sum()), mask.size(0), segment.pinned) for segment, mask in zip(segments, tokens_mask)
+        )
+        return sum(t.size(0) for t in tokens)
+
+    @torch.inference_mode()
+    def generate(
+        self,
+        text: str,
+        speaker: int,
+        max_audio_length_ms: float = 90_000,
+        temperature: float = 0.9,
+        topk: int = 50,
+    ) -> torch.Tensor:
+        """Speaks text as speaker, given everything so far in the conversation, and adds it to the history."""
+        generator = self._generator
+        generator._activate(self)
+
+        max_generation_len = int(max_audio_length_ms / 80)
+        text_tokens, text_tokens_mask = generator._tokenize_text_segment(text, speaker)
+        evicted_tokens = self._make_room(text_tokens.size(0) + max_generation_len + 1)
+
+        turn_start = saved_prefill_tokens = self.position
+        samples = list(
+            generator._generate_frames(
+                text_tokens, text_tokens_mask, max_generation_len, temperature, topk, start_pos=self.position
+            )
+        )
+        # The backbone has seen the text and every frame but the last one when max_generation_len cut it off
+        self.position = generator._model.backbone_cache_len()
+        fed_frames = self.position - saved_prefill_tokens - text_tokens.size(0)
+        self._prefill(*generator._frames_to_tokens(samples[fed_frames:]))
+        self.turns.append({
+            "prefilledTokens": text_tokens.size(0),
+            "savedPrefillTokens": saved_prefill_tokens,
+            "evictedTokens": evicted_tokens,
+            "frames": len(samples),
+        })
+
+        audio = generator._audio_tokenizer.decode(torch.stack(samples).permute(1, 2, 0)).squeeze(0).squeeze(0)
+        audio = generator._watermark(audio)
+        self.segments.append(Segment(speaker=speaker, text=text, audio=audio))
+        self._spans.append(SegmentSpan(text_tokens.size(0), self.position - turn_start))
+        return audio
 
-def load_csm_1b(device: str = "cuda") -> Generator:
+    def checkpoint(self) -> ConversationCheckpoint:
+        return ConversationCheckpoint(self.position, len(self.segments), len(self.turns), self.evictions)
+
+    def rollback(self, checkpoint: ConversationCheckpoint):
+        """Forgets everything after checkpoint; nothing is re-prefilled."""
+        if checkpoint.position > self.position or checkpoint.num_segments > len(self.segments):
+            raise ValueError("Checkpoint is ahead of this conversation")
+        if checkpoint.evictions != self.evictions:
+            raise ValueError("Context was evicted since the checkpoint, so it can no longer be restored")
+        self.position = checkpoint.position
+        del self.segments[checkpoint.num_segments:]
+        del self._spans[checkpoint.num_segments:]
+        del self.turns[checkpoint.num_turns:]
+        if self._generator._active_conversation is self:
+            self._generator._model.truncate_backbone_cache(self.position)
+
+    def fork(self) -> "Conversation":
+        """Branches off a copy of this conversation (its cache is copied, not re-prefilled)."""
+        generator = self._generator
+        child = Conversation(generator)
+        child.position = self.position
+        child.segments = list(self.segments)
+        child._spans = list(self._spans)
+        child.evictions = self.evictions
+        child.turns = list(self.turns)
+        if generator._active_conversation is self:
+            child._cache_state = generator._model.save_backbone_cache(self.position)
+        else:
+            # Saved states are never modified in place, so the branches can share one
+            child._cache_state = self._cache_state
+        return child
+
+
+def load_csm_1b(device: str = "cuda", segment_cache_dir: Optional[str] = None) -> Generator:
     model = Model.from_pretrained("sesame/csm-1b")
     model.to(device=device, dtype=torch.bfloat16)
 
-    generator = Generator(model)
+    generator = Generator(model, SegmentTokenCache(disk_dir=segment_cache_dir))
     return generator
\ No newline at end of file
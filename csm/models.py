@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List, Optional, Tuple
 
 import torch
 import torch.nn as nn
@@ -69,6 +70,23 @@ def _index_causal_mask(mask: torch.Tensor, input_pos: torch.Tensor):
     return r
 
 
+def _rotate_keys(k: torch.Tensor, theta: torch.Tensor, offset: int) -> torch.Tensor:
+    """
+    Moves RoPE-rotated keys by offset positions (rotations compose, so R(p + offset) = R(offset) R(p)).
+
+    Args:
+        k: (batch_size, num_kv_heads, seq_len, head_dim) keys as stored in the KV cache
+        theta: (head_dim // 2,) rotary frequencies of the RoPE module
+    """
+    angle = offset * theta.float()
+    cos, sin = angle.cos(), angle.sin()
+    k_pairs = k.float().reshape(*k.shape[:-1], -1, 2)
+    rotated = torch.stack(
+        [k_pairs[..., 0] * cos - k_pairs[..., 1] * sin, k_pairs[..., 1] * cos + k_pairs[..., 0] * sin], dim=-1
+    )
+    return rotated.flatten(-2).type_as(k)
+
+
 def _multinomial_sample_one_no_sync(probs):  # Does multinomial sampling without a cuda synchronization
     q = torch.empty_like(probs).exponential_(1)
     return torch.argmax(probs / q, dim=-1, keepdim=True).to(dtype=torch.int)
@@ -122,6 +140,10 @@ class Model(
         dtype = next(self.parameters()).dtype
         device = next(self.parameters()).device
 
+        # torchtune skips setup when caches exist; drop them so the batch size can change
+        for layer in [*self.backbone.layers, *self.decoder.layers]:
+            layer.attn.kv_cache = None
+
         with device:
             self.backbone.setup_caches(max_batch_size, dtype)
             self.decoder.setup_caches(max_batch_size, dtype, decoder_max_seq_len=self.config.audio_num_codebooks)
@@ -136,13 +158,15 @@ class Model(
         input_pos: torch.Tensor,
         temperature: float,
         topk: int,
+        mask: Optional[torch.Tensor] = None,
     ) -> torch.Tensor:
         """
         Args:
             tokens: (batch_size, seq_len, audio_num_codebooks+1)
             tokens_mask: (batch_size, seq_len, audio_num_codebooks+1)
             input_pos: (batch_size, seq_len) positions for each token
-            mask: (batch_size, seq_len, max_seq_len
+            mask: (batch_size, seq_len, max_seq_len) backbone attention over cache slots; defaults to
+                causal by position, which is only right when every row's positions match its slots
 
         Returns:
             (batch_size, audio_num_codebooks) sampled tokens
@@ -151,7 +175,7 @@ class Model(
         b, s, _ = tokens.size()
 
         assert self.backbone.caches_are_enabled(), "backbone caches are not enabled"
-        curr_backbone_mask = _index_causal_mask(self.backbone_causal_mask, input_pos)
+        curr_backbone_mask = mask if mask is not None else _index_causal_mask(self.backbone_causal_mask, input_pos)
         embeds = self._embed_tokens(tokens)
         masked_embeds = embeds * tokens_mask.unsqueeze(-1)
         h = masked_embeds.sum(dim=2)
@@ -183,10 +207,73 @@ class Model(
 
         return curr_sample
 
+    def prefill(self, tokens: torch.Tensor, tokens_mask: torch.Tensor, input_pos: torch.Tensor):
+        """
+        Runs the backbone over tokens only to extend its KV cache (no sampling).
+
+        Args:
+            tokens: (batch_size, seq_len, audio_num_codebooks+1)
+            tokens_mask: (batch_size, seq_len, audio_num_codebooks+1)
+            input_pos: (batch_size, seq_len) positions for each token
+        """
+        assert self.backbone.caches_are_enabled(), "backbone caches are not enabled"
+        curr_backbone_mask = _index_causal_mask(self.backbone_causal_mask, input_pos)
+        h = (self._embed_tokens(tokens) * tokens_mask.unsqueeze(-1)).sum(dim=2)
+        self.backbone(h, input_pos=input_pos, mask=curr_backbone_mask)
+
     def reset_caches(self):
         self.backbone.reset_caches()
         self.decoder.reset_caches()
 
+    def keep_cache_rows(self, rows: torch.Tensor):
+        """Keeps only the given batch rows of every KV cache, e.g. to drop finished generations."""
+        for layer in [*self.backbone.layers, *self.decoder.layers]:
+            cache = layer.attn.kv_cache
+            cache.k_cache = cache.k_cache[rows]
+            cache.v_cache = cache.v_cache[rows]
+            cache.batch_size = rows.numel()
+
+    def _backbone_kv_caches(self):
+        return [layer.attn.kv_cache for layer in self.backbone.layers]
+
+    def backbone_cache_len(self) -> int:
+        """Number of positions filled in the backbone KV cache."""
+        return self._backbone_kv_caches()[0].size
+
+    def truncate_backbone_cache(self, length: int):
+        """Forgets cached positions >= length. Their stale entries are masked out and overwritten by the next forward."""
+        for cache in self._backbone_kv_caches():
+            cache.cache_pos.sub_(cache.size - length)
+
+    def evict_backbone_cache(self, start: int, end: int):
+        """
+        Removes cache slots [start, end). Later slots move down by end - start, and their keys are
+        re-rotated to the lower positions, so the cache matches a prefill without the removed tokens.
+        """
+        shift = end - start
+        length = self.backbone_cache_len()
+        for layer in self.backbone.layers:
+            cache = layer.attn.kv_cache
+            moved_k = _rotate_keys(cache.k_cache[:, :, end:length], layer.attn.pos_embeddings.theta, -shift)
+            moved_v = cache.v_cache[:, :, end:length].clone()
+            cache.k_cache[:, :, start:length - shift] = moved_k
+            cache.v_cache[:, :, start:length - shift] = moved_v
+            cache.cache_pos.sub_(shift)
+
+    def save_backbone_cache(self, length: int) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+        """Copies the first length positions of every backbone layer's keys and values."""
+        return [
+            (cache.k_cache[:, :, :length].clone(), cache.v_cache[:, :, :length].clone())
+            for cache in self._backbone_kv_caches()
+        ]
+
+    def load_backbone_cache(self, state: List[Tuple[torch.Tensor, torch.Tensor]], length: int):
+        """Restores the first length positions saved by save_backbone_cache."""
+        for cache, (k, v) in zip(self._backbone_kv_caches(), state):
+            cache.k_cache[:, :, :length].copy_(k[:, :, :length])
+            cache.v_cache[:, :, :length].copy_(v[:, :, :length])
+            cache.cache_pos.add_(length - cache.size)
+
     def _embed_audio(self, codebook: int, tokens: torch.Tensor) -> torch.Tensor:
         return self.audio_embeddings(tokens + codebook * self.config.audio_vocab_size)
 
@@ -43,6 +43,8 @@ SPEAKER_PROMPTS = {
     }
 }
 
+SPEAKER_PROMPT_TOKENS = "speaker_prompt_tokens.pt"
+
 def load_prompt_audio(audio_path: str, target_sample_rate: int) -> torch.Tensor:
     audio_tensor, sample_rate = torchaudio.load(audio_path)
     audio_tensor = audio_tensor.squeeze(0)
@@ -54,7 +56,8 @@ def load_prompt_audio(audio_path: str, target_sample_rate: int) -> torch.Tensor:
 
 def prepare_prompt(text: str, speaker: int, audio_path: str, sample_rate: int) -> Segment:
     audio_tensor = load_prompt_audio(audio_path, sample_rate)
-    return Segment(text=text, speaker=speaker, audio=audio_tensor)
+    # Speaker reference prompts stay in the context window however long the conversation gets
+    return Segment(text=text, speaker=speaker, audio=audio_tensor, pinned=True)
 
 def main():
     # Select the best available device, skipping MPS due to float64 limitations
@@ -82,6 +85,12 @@ def main():
         generator.sample_rate
     )
 
+    # Speaker prompts are Mimi-encoded once and reused from this file on later runs
+    if os.path.exists(SPEAKER_PROMPT_TOKENS):
+        generator.load_segment_tokens(SPEAKER_PROMPT_TOKENS)
+    else:
+        generator.save_segment_tokens([prompt_a, prompt_b], SPEAKER_PROMPT_TOKENS)
+
     # Generate conversation
     conversation = [
         {"text": "Hey how are you doing?", "speaker_id": 0},
@@ -90,18 +99,18 @@ def main():
         {"text": "Me too! This is some cool stuff, isn't it?", "speaker_id": 1}
     ]
 
-    # Generate each utterance
+    # Generate each utterance; the session keeps the prompts and earlier turns in the KV cache
     generated_segments = []
-    prompt_segments = [prompt_a, prompt_b]
+    session = generator.start_conversation(context=[prompt_a, prompt_b])
 
     for utterance in conversation:
         print(f"Generating: {utterance['text']}")
-        audio_tensor = generator.generate(
+        audio_tensor = session.generate(
             text=utterance['text'],
             speaker=utterance['speaker_id'],
-            context=prompt_segments + generated_segments,
             max_audio_length_ms=10_000,
         )
+        print(f"Reused {session.turns[-1]['savedPrefillTokens']} cached context tokens")
         generated_segments.append(Segment(text=utterance['text'], speaker=utterance['speaker_id'], audio=audio_tensor))
 
     # Concatenate all generations
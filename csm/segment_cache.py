@@ -0,0 +1,114 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import torch
+
+
+def segment_key(speaker: int, text: str, audio: torch.Tensor) -> str:
+    """Hash of what a tokenized segment depends on: the audio samples, the text and the speaker."""
+    audio = audio.detach().to("cpu", torch.float32).contiguous()
+    digest = hashlib.sha256()
+    digest.update(f"{speaker}\0{text}\0{tuple(audio.shape)}\0".encode("utf-8"))
+    digest.update(audio.numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _pack(tokens: torch.Tensor, tokens_mask: torch.Tensor) -> Dict[str, torch.Tensor]:
+    # The mask is implied by the layout (text rows use the last column, audio rows the others),
+    # so only the tokens are stored, as int32
+    text_len = int(tokens_mask[:, -1].sum())
+    return {"tokens": tokens.to("cpu", torch.int32), "text_len": torch.tensor(text_len)}
+
+
+def _unpack(packed: Dict[str, torch.Tensor], device) -> Tuple[torch.Tensor, torch.Tensor]:
+    tokens = packed["tokens"].long()
+    text_len = int(packed["text_len"])
+    tokens_mask = torch.zeros_like(tokens, dtype=torch.bool)
+    tokens_mask[:text_len, -1] = True
+    tokens_mask[text_len:, :-1] = True
+    return tokens.to(device), tokens_mask.to(device)
+
+
+class SegmentTokenCache:
+    """Tokenized context segments (tokens, mask), so repeated context costs no Mimi encode.
+
+    An in-memory LRU of max_entries segments, backed by one file per segment in disk_dir when
+    given. Pinned entries (e.g. speaker prompts loaded with load) are never evicted.
+    """
+
+    def __init__(self, max_entries: int = 64, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, Tuple[torch.Tensor, torch.Tensor]]" = OrderedDict()
+        self._pinned: Dict[str, Tuple[torch.Tensor, torch.Tensor]] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pt")
+
+    def get(self, key: str, device) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+        entry = self._pinned.get(key)
+        if entry is None:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            entry = _unpack(torch.load(self._disk_path(key)), device)
+            self.disk_hits += 1
+            self._remember(key, entry)
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, tokens: torch.Tensor, tokens_mask: torch.Tensor):
+        self._remember(key, (tokens, tokens_mask))
+        if self.disk_dir and not os.path.exists(self._disk_path(key)):
+            tmp_path = self._disk_path(key) + ".tmp"
+            torch.save(_pack(tokens, tokens_mask), tmp_path)
+            os.replace(tmp_path, self._disk_path(key))
+
+    def _remember(self, key: str, entry: Tuple[torch.Tensor, torch.Tensor]):
+        if key in self._pinned:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self, path: str, keys):
+        """Writes the given cached segments (e.g. speaker prompts) into one compact file."""
+        packed = {}
+        for key in keys:
+            entry = self._pinned.get(key) or self._entries.get(key)
+            if entry is None:
+                raise KeyError(f"Segment {key} is not cached")
+            packed[key] = _pack(*entry)
+        tmp_path = path + ".tmp"
+        torch.save(packed, tmp_path)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str, device) -> int:
+        """Pins the segments of a file written by save; returns how many were loaded."""
+        packed = torch.load(path)
+        for key, entry in packed.items():
+            self._pinned[key] = _unpack(entry, device)
+            self._entries.pop(key, None)
+        return len(packed)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "diskHits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "pinned": len(self._pinned),
+        }
@@ -0,0 +1,31 @@
+import pytest
+
+from context_window import SegmentSpan, plan_context_trim
+
+# A pinned 100-token speaker prompt, then two turns: 4 text tokens + 45 frames + EOS, 3 text tokens + 26 frames + EOS
+SPANS = [SegmentSpan(5, 100, pinned=True), SegmentSpan(4, 50), SegmentSpan(3, 30)]
+
+
+def test_nothing_is_cut_without_overflow():
+    assert plan_context_trim(SPANS, 0) == []
+
+
+def test_small_overflow_trims_leading_audio_frames_of_the_oldest_turn():
+    assert plan_context_trim(SPANS, 10) == [(1, 4, 10)]
+
+
+def test_trim_keeps_the_text_and_min_frames():
+    # 45 frames: cutting 44 leaves one, cutting 45 would leave none, so the segment goes whole
+    assert plan_context_trim(SPANS, 44) == [(1, 4, 44)]
+    assert plan_context_trim(SPANS, 45) == [(1, 0, 50)]
+    assert plan_context_trim(SPANS, 40, min_frames=10) == [(1, 0, 50)]
+
+
+def test_larger_overflow_drops_whole_segments_then_trims_the_next():
+    assert plan_context_trim(SPANS, 60) == [(1, 0, 50), (2, 3, 10)]
+
+
+def test_pinned_segments_are_never_cut():
+    with pytest.raises(ValueError, match="pinned"):
+        plan_context_trim(SPANS, 81)
+    assert all(index != 0 for index, _, _ in plan_context_trim(SPANS, 80))
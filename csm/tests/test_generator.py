@@ -0,0 +1,272 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+for module in ("torchaudio", "torchtune", "moshi", "silentcipher", "huggingface_hub", "transformers"):
+    pytest.importorskip(module)
+
+from generator import Generator, Segment  # noqa: E402
+from segment_cache import SegmentTokenCache  # noqa: E402
+
+FRAME_SAMPLES = 1920  # Mimi: 80 ms at 24 kHz
+
+
+class ScriptedModel:
+    """Stands in for the CSM model: frames come from a script per batch row, and the backbone
+    cache is a list holding the token row written at each position."""
+
+    def __init__(self, scripts, max_seq_len=2048):
+        self.scripts = scripts  # Per row, the first channel of each frame to sample; past the end is EOS
+        self.backbone = SimpleNamespace(max_seq_len=max_seq_len)
+        self.rows = [0]  # Script of each live batch row
+        self.cache = []
+        self.step = 0
+        self.frame_calls = 0
+        self.prompt = None  # (tokens, mask, positions) of the latest prompt
+
+    def _write(self, tokens, input_pos):
+        if tokens.size(0) != 1:
+            return  # Batched generation isn't cache-tracked
+        for pos, row in zip(input_pos[0].tolist(), tokens[0].tolist()):
+            assert pos <= len(self.cache), "positions must be contiguous with the cache"
+            self.cache[pos:pos + 1] = [row]
+
+    def setup_caches(self, batch_size):
+        self.rows = list(range(batch_size))
+        self.cache = []
+
+    def reset_caches(self):
+        self.rows = list(range(len(self.rows)))
+        self.cache = []
+
+    def generate_frame(self, tokens, tokens_mask, input_pos, temperature, topk, mask=None):
+        if tokens.size(1) > 1:
+            self.step = 0  # A new prompt
+            self.prompt = (tokens, tokens_mask, input_pos)
+        self._write(tokens, input_pos)
+        values = [self.scripts[row][self.step] if self.step < len(self.scripts[row]) else 0 for row in self.rows]
+        self.step += 1
+        self.frame_calls += 1
+        return torch.tensor([[value] * 32 for value in values])
+
+    def prefill(self, tokens, tokens_mask, input_pos):
+        self._write(tokens, input_pos)
+
+    def keep_cache_rows(self, rows):
+        self.rows = [self.rows[row] for row in rows.tolist()]
+
+    def backbone_cache_len(self):
+        return len(self.cache)
+
+    def truncate_backbone_cache(self, length):
+        del self.cache[length:]
+
+    def evict_backbone_cache(self, start, end):
+        del self.cache[start:end]
+
+    def save_backbone_cache(self, length):
+        return list(self.cache[:length])
+
+    def load_backbone_cache(self, state, length):
+        self.cache = list(state[:length])
+
+
+class FakeMimi:
+    """Audio tokenizer with one frame per 1920 samples; frame f of an input encodes as f + 1 and
+    decodes to its first channel's value repeated over the frame."""
+
+    sample_rate = 24_000
+
+    def __init__(self):
+        self.encoded = 0
+        self.decoded = []
+        self.streaming_batches = []
+
+    def encode(self, audio):
+        self.encoded += 1
+        frames = audio.shape[-1] // FRAME_SAMPLES
+        return torch.arange(1, frames + 1).repeat(1, 32, 1)
+
+    def decode(self, codes):
+        self.decoded.append(codes)
+        return codes[:, :1, :].float().repeat_interleave(FRAME_SAMPLES, dim=2)
+
+    @contextmanager
+    def streaming(self, batch_size):
+        self.streaming_batches.append(batch_size)
+        yield
+
+
+class CharTokenizer:
+    def encode(self, text):
+        return [ord(char) for char in text]
+
+
+def make_generator(scripts, max_seq_len=2048):
+    """A Generator around the fakes (its __init__ downloads the Mimi and watermarker weights)."""
+    generator = Generator.__new__(Generator)
+    generator._model = ScriptedModel(scripts, max_seq_len)
+    generator._cache_batch_size = 1
+    generator._segment_cache = SegmentTokenCache()
+    generator._text_tokenizer = CharTokenizer()
+    generator._audio_tokenizer = FakeMimi()
+    generator._watermark = lambda audio: audio  # Keeps samples comparable across generate paths
+    generator.sample_rate = FakeMimi.sample_rate
+    generator.device = torch.device("cpu")
+    generator._active_conversation = None
+    return generator
+
+
+def test_stream_yields_the_same_audio_as_generate():
+    generator = make_generator([[1, 2, 3, 4, 5, 6, 7]])
+    audio = generator.generate("hello", 0, [])
+    chunks = list(generator.generate_stream("hello", 0, [], chunk_frames=3))
+    assert audio.numel() == 7 * FRAME_SAMPLES
+    assert torch.allclose(torch.cat(chunks), audio)
+
+
+def test_stream_decodes_each_chunk_with_the_streaming_decoder():
+    generator = make_generator([[1, 2, 3, 4, 5, 6, 7]])
+    chunks = list(generator.generate_stream("hello", 0, [], chunk_frames=3))
+    mimi = generator._audio_tokenizer
+    assert mimi.streaming_batches == [1]
+    assert [codes.shape[-1] for codes in mimi.decoded] == [3, 3, 1]
+    assert len(chunks) == 4  # One per chunk, then the held-back crossfade tail
+
+
+def test_stream_generates_frames_only_as_chunks_are_consumed():
+    generator = make_generator([list(range(1, 13))])
+    stream = generator.generate_stream("hello", 0, [], chunk_frames=4)
+    next(stream)
+    assert generator._model.frame_calls == 4
+    stream.close()
+
+
+def test_stream_rejects_empty_chunks():
+    with pytest.raises(ValueError, match="chunk_frames"):
+        next(make_generator([[1]]).generate_stream("hello", 0, [], chunk_frames=0))
+
+
+def speech(frames):
+    return torch.zeros(frames * FRAME_SAMPLES)
+
+
+def test_conversation_turns_only_prefill_what_is_new():
+    generator = make_generator([[1, 2, 3]])
+    conversation = generator.start_conversation()
+    # "[0]ref" is 6 text rows, then 2 audio frames and the EOS frame
+    assert conversation.add_context([Segment(0, "ref", speech(2), pinned=True)]) == 9
+    conversation.generate("hi", 0)
+    history = list(generator._model.cache)
+    conversation.generate("ok", 1)
+
+    # Each turn holds its 5 text rows, 3 frames and an EOS frame; earlier turns stay cached as they were
+    assert conversation.position == 9 + 9 + 9 == len(generator._model.cache)
+    assert generator._model.cache[:len(history)] == history
+    assert conversation.turns == [
+        {"prefilledTokens": 5, "savedPrefillTokens": 9, "evictedTokens": 0, "frames": 3},
+        {"prefilledTokens": 5, "savedPrefillTokens": 18, "evictedTokens": 0, "frames": 3},
+    ]
+    assert [segment.text for segment in conversation.segments] == ["ref", "hi", "ok"]
+
+
+def test_switching_conversations_restores_their_caches():
+    generator = make_generator([[1, 2, 3]])
+    first, second = generator.start_conversation(), generator.start_conversation()
+    first.generate("hi", 0)
+    first_history = list(generator._model.cache)
+    second.generate("hello there", 1)
+    generator.generate("one-off", 0, [])
+    first.generate("again", 0)
+    assert generator._model.cache[:len(first_history)] == first_history
+    assert first.turns[-1]["savedPrefillTokens"] == len(first_history)
+
+
+def test_rollback_forgets_turns_without_a_prefill():
+    generator = make_generator([[1, 2, 3]])
+    conversation = generator.start_conversation()
+    conversation.generate("hi", 0)
+    checkpoint = conversation.checkpoint()
+    conversation.generate("bad answer", 1)
+    conversation.rollback(checkpoint)
+    assert conversation.position == len(generator._model.cache) == 9
+    assert len(conversation.segments) == len(conversation.turns) == 1
+    conversation.generate("good answer", 1)
+    assert conversation.turns[-1]["savedPrefillTokens"] == 9
+    with pytest.raises(ValueError, match="ahead"):
+        generator.start_conversation().rollback(conversation.checkpoint())
+
+
+def test_fork_branches_from_the_same_cache():
+    generator = make_generator([[1, 2, 3]])
+    parent = generator.start_conversation()
+    parent.generate("hi", 0)
+    shared = list(generator._model.cache)
+    child = parent.fork()
+    child.generate("branch", 1)
+    parent.generate("main", 1)
+    assert generator._model.cache[:len(shared)] == shared
+    assert child.turns[-1]["savedPrefillTokens"] == parent.turns[-1]["savedPrefillTokens"] == len(shared)
+    assert [segment.text for segment in child.segments] == ["hi", "branch"]
+    assert [segment.text for segment in parent.segments] == ["hi", "main"]
+
+
+def test_repeated_context_is_encoded_once():
+    generator = make_generator([[1, 2]])
+    prompt = Segment(0, "ref", speech(2))
+    generator.generate("hi", 0, [prompt])
+    generator.generate("again", 0, [Segment(0, "ref", speech(2))])
+    assert generator._audio_tokenizer.encoded == 1
+    assert generator._segment_cache.stats()["hits"] == 1
+
+
+def test_saved_segment_tokens_skip_the_encoder_after_a_restart(tmp_path):
+    prompt = Segment(0, "ref", speech(2))
+    make_generator([[1]]).save_segment_tokens([prompt], str(tmp_path / "prompts.pt"))
+
+    generator = make_generator([[1, 2]])
+    assert generator.load_segment_tokens(str(tmp_path / "prompts.pt")) == 1
+    generator.generate("hi", 0, [prompt])
+    assert generator._audio_tokenizer.encoded == 0
+
+
+def frames_audio(*values):
+    return torch.tensor(values, dtype=torch.float32).repeat_interleave(FRAME_SAMPLES)
+
+
+def test_batch_generates_each_utterance_in_order():
+    generator = make_generator([[1, 2, 3], [4], []])
+    audios = generator.generate_batch(["hi", "hello", "bye"], [0, 1, 0])
+    assert torch.equal(audios[0], frames_audio(1, 2, 3))
+    assert torch.equal(audios[1], frames_audio(4))
+    assert audios[2].numel() == 0  # EOS straight away
+
+
+def test_batch_left_pads_shorter_prompts():
+    generator = make_generator([[1], [1]])
+    generator.generate_batch(["hi", "hello"], [0, 1])
+    tokens, mask, positions = generator._model.prompt
+    # "[0]hi" is 5 rows and "[1]hello" 8: the first row gets 3 rows of padding in front
+    assert tokens.shape[:2] == (2, 8)
+    assert not mask[0, :3].any() and mask[0, 3:].any(dim=1).all()
+    assert positions[0].tolist() == [0, 0, 0, 0, 1, 2, 3, 4]
+    assert positions[1].tolist() == list(range(8))
+
+
+def test_finished_rows_leave_the_batch():
+    generator = make_generator([[1, 2, 3, 4], [5]])
+    generator.generate_batch(["hi", "hello"], [0, 1])
+    # Both rows for two frames (the second row's EOS included), then the first row alone for three
+    assert generator._model.frame_calls == 5
+    assert generator._model.rows == [0]
+    # A single generate afterwards runs with one cache row again
+    assert torch.equal(generator.generate("hi", 0, []), frames_audio(1, 2, 3, 4))
+
+
+def test_batch_arguments_must_line_up():
+    generator = make_generator([[1]])
+    assert generator.generate_batch([], []) == []
+    with pytest.raises(ValueError, match="same length"):
+        generator.generate_batch(["hi", "hello"], [0])
@@ -0,0 +1,65 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from segment_cache import SegmentTokenCache, segment_key  # noqa: E402
+
+CPU = torch.device("cpu")
+
+
+def segment_tokens(text_len=3, frames=4, offset=0):
+    """Tokens and mask in the tokenized-segment layout: text rows, then audio frames."""
+    tokens = torch.arange(offset, offset + (text_len + frames) * 33).reshape(-1, 33)
+    mask = torch.zeros_like(tokens, dtype=torch.bool)
+    mask[:text_len, -1] = True
+    mask[text_len:, :-1] = True
+    return tokens, mask
+
+
+def same(entry, expected):
+    return all(torch.equal(a, b) for a, b in zip(entry, expected))
+
+
+def test_keys_depend_on_speaker_text_and_audio():
+    audio = torch.linspace(-1, 1, 4800)
+    key = segment_key(0, "hello", audio)
+    assert segment_key(0, "hello", audio.clone()) == key
+    assert len({key, segment_key(1, "hello", audio), segment_key(0, "hello!", audio), segment_key(0, "hello", audio * 0.5)}) == 4
+
+
+def test_memory_entries_are_least_recently_used_first_out():
+    cache = SegmentTokenCache(max_entries=2)
+    entries = {key: segment_tokens(offset=i * 1000) for i, key in enumerate("abc")}
+    cache.put("a", *entries["a"])
+    cache.put("b", *entries["b"])
+    assert same(cache.get("a", CPU), entries["a"])
+    cache.put("c", *entries["c"])
+    assert cache.get("b", CPU) is None
+    assert same(cache.get("a", CPU), entries["a"]) and same(cache.get("c", CPU), entries["c"])
+    assert cache.stats() == {"hits": 3, "diskHits": 0, "misses": 1, "entries": 2, "pinned": 0}
+
+
+def test_disk_entries_survive_a_restart(tmp_path):
+    expected = segment_tokens()
+    SegmentTokenCache(disk_dir=str(tmp_path)).put("a", *expected)
+
+    reopened = SegmentTokenCache(disk_dir=str(tmp_path))
+    assert same(reopened.get("a", CPU), expected)  # The mask is rebuilt from the stored text length
+    assert reopened.get("a", CPU) is not None
+    assert reopened.stats()["diskHits"] == 1 and reopened.stats()["hits"] == 1
+
+
+def test_saved_segments_load_pinned(tmp_path):
+    prompt = segment_tokens(offset=5000)
+    cache = SegmentTokenCache()
+    cache.put("prompt", *prompt)
+    cache.save(str(tmp_path / "prompts.pt"), ["prompt"])
+    with pytest.raises(KeyError):
+        cache.save(str(tmp_path / "missing.pt"), ["unknown"])
+
+    fresh = SegmentTokenCache(max_entries=1)
+    assert fresh.load(str(tmp_path / "prompts.pt"), CPU) == 1
+    for i in range(3):
+        fresh.put(f"turn {i}", *segment_tokens(offset=i))
+    assert same(fresh.get("prompt", CPU), prompt)
+    assert fresh.stats()["pinned"] == 1 and fresh.stats()["entries"] == 1
@@ -155,7 +155,7 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
         console.log(`Popup requested data, providing data associated with tab ${relevantTabId}`);
         const dataToSend = temporaryOrderData[relevantTabId];
         console.log("Bernett: ", dataToSend);
-        const apiUrl = 'http://localhost:8000/spending/monthly'; // Define API URL
+        const apiUrl = 'http://localhost:8000/spending/monthly?summary=true'; // Totals only; items come from chrome.storage
 
         // Fetch budget data from the API
         fetch(apiUrl)
@@ -21,7 +21,7 @@ function updateStatus(message) {
 // Load current settings from the backend
 async function loadSettings() {
     try {
-        const response = await fetch(`${BASE_URL}/spending/monthly`);
+        const response = await fetch(`${BASE_URL}/spending/monthly?summary=true`);
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({ message: `HTTP error ${response.status}` }));
             throw new Error(errorData.detail || errorData.message || `HTTP error ${response.status}`);
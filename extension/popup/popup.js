@@ -163,12 +163,15 @@ confirmButton.addEventListener('click', () => {
     confirmButton.textContent = 'Processing...';
 
     // --- Step 1: Record purchase with backend --- 
-    const recordApiUrl = 'http://localhost:8000/spending/record-purchase'; 
+    // The batch endpoint records the whole order (all of its items) in one write
+    const recordApiUrl = 'http://localhost:8000/spending/record-purchases'; 
     const purchaseData = {
-        orderAmount: currentOrderData.orderTotal,
-        itemsInOrder: currentOrderData.currentOrderItems || [],
-        // Add any other relevant data you want to record
-        timestamp: new Date().toISOString()
+        orders: [{
+            orderAmount: currentOrderData.orderTotal,
+            itemsInOrder: currentOrderData.currentOrderItems || [],
+            // Add any other relevant data you want to record
+            timestamp: new Date().toISOString()
+        }]
     };
 
     console.log('Sending record request to:', recordApiUrl, 'with body:', purchaseData);
@@ -242,9 +245,11 @@ reviewButton.addEventListener('click', () => {
     reviewResultDiv.textContent = '';
     reviewResultDiv.className = 'review-result'; // Reset classes
 
-    const apiUrl = 'http://localhost:8000/spending/check-order';
+    const apiUrl = 'http://localhost:8000/spending/check-order/stream';
     const requestBody = {
         orderAmount: currentOrderData.orderTotal,
+        currentSpending: currentOrderData.currentSpending || 0,
+        monthlyLimit: currentOrderData.limit || 0,
         itemsInOrder: currentOrderData.currentOrderItems || []
     };
 
@@ -264,7 +269,7 @@ reviewButton.addEventListener('click', () => {
                 throw new Error(`API request failed with status ${response.status}. ${errBody?.detail || ''}`);
             });
         }
-        return response.json();
+        return readReviewStream(response); // Show advice as it is generated
     })
     .then(data => {
         console.log('Received review response:', data);
@@ -287,6 +292,45 @@ reviewButton.addEventListener('click', () => {
     });
 });
 
+// Reads the Server-Sent Events of /spending/check-order/stream, appending each `token` event's text
+// to the review box. Resolves with the terminal `message` event's data ({ status, message }).
+async function readReviewStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    reviewResultDiv.style.display = 'block';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            throw new Error('Review stream ended without a result.');
+        }
+        buffer += decoder.decode(value, { stream: true });
+
+        let separatorIndex;
+        while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, separatorIndex);
+            buffer = buffer.slice(separatorIndex + 2);
+
+            let eventName = 'message';
+            let eventData = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) eventName = line.slice(7);
+                else if (line.startsWith('data: ')) eventData += line.slice(6);
+            });
+            const data = JSON.parse(eventData);
+
+            if (eventName === 'token') {
+                reviewResultDiv.textContent += data.text;
+            } else if (eventName === 'message') {
+                return data;
+            } else if (eventName === 'error') {
+                throw new Error(data.message);
+            }
+        }
+    }
+}
+
 function showReviewResult(result) {
     const reviewResult = document.getElementById('reviewResult');
     reviewResult.style.display = 'block';